@@ -0,0 +1,369 @@
+import asyncio
+import gzip
+import hashlib
+import inspect
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Awaitable, Callable
+
+import brotli
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import DDL, event, text
+from sqlmodel import SQLModel
+from starlette.concurrency import run_in_threadpool
+
+from app.db import engine
+from app.metrics import timed_serialization
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# tables whose content makes up the read-only catalogue served by the api
+CATALOGUE_TABLES = (
+    "citations",
+    "function_type",
+    "link_process_perceptual",
+    "locations",
+    "model_type",
+    "perceptual_model",
+    "process_alt_names",
+    "process_taxonomy",
+    "spatial_zone_type",
+    "temporal_zone_type",
+)
+# bulk ingests are recorded in the same transaction as the rows they load, so every ingest yields a new version
+# right after it commits
+VERSIONED_TABLES = CATALOGUE_TABLES + ("ingest_runs",)
+
+# the version of the catalogue, bumped by every statement writing to a versioned table, and the latest version
+# the derived data kept in the db (e.g. the materialized views) was brought up to date with. The epoch tells
+# apart the versions counted before and after the table is recreated.
+VERSION_TABLE = "catalogue_version"
+VERSION_DDL = [
+    DDL(
+        f"""
+        CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+            singleton boolean PRIMARY KEY DEFAULT true CHECK (singleton),
+            epoch uuid NOT NULL DEFAULT gen_random_uuid(),
+            -- one version ahead, so that the derived data is prepared once for the catalogue found in place
+            version bigint NOT NULL DEFAULT 1,
+            prepared bigint NOT NULL DEFAULT 0
+        )
+        """
+    ),
+    DDL(f"INSERT INTO {VERSION_TABLE} DEFAULT VALUES ON CONFLICT DO NOTHING"),
+    DDL(
+        f"""
+        CREATE OR REPLACE FUNCTION bump_{VERSION_TABLE}() RETURNS trigger AS $$
+        BEGIN
+            UPDATE {VERSION_TABLE} SET version = version + 1;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    ),
+    *(
+        DDL(
+            f"CREATE OR REPLACE TRIGGER bump_{VERSION_TABLE} AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION bump_{VERSION_TABLE}()"
+        )
+        for table in VERSIONED_TABLES
+    ),
+]
+
+for statement in VERSION_DDL:
+    event.listen(SQLModel.metadata, "after_create", statement)
+
+# advisory lock held by the worker bringing the derived data of the db up to date
+PREPARE_LOCK = int.from_bytes(hashlib.md5(VERSION_TABLE.encode("utf-8")).digest()[:8], "big", signed=True)
+
+
+class DatasetVersion:
+    """
+    Version of the catalogue tables, used to key and invalidate anything derived from them.
+
+    Every statement writing to a catalogue table bumps the version counter of the db, from a trigger. The
+    derived data kept in the db is brought up to date with a new version by a single worker, the one holding an
+    advisory lock, while the other workers keep publishing the previous version until it is done: the published
+    version is the one the derived data was last prepared for. It is read at startup and then polled in the
+    background, so request handlers can read it without touching the db.
+    """
+
+    def __init__(self):
+        self.value: str | None = None
+        self._database_preparers: list[Callable[[], Awaitable[Any]]] = []
+        self._preparers: list[Callable[[str], Any]] = []
+        self._listeners: list[Callable[[str], Any]] = []
+
+    def prepare_database(self, preparer: Callable[[], Awaitable[Any]]):
+        """
+        Register a coroutine function bringing data derived from the catalogue inside the db up to date, e.g.
+        refreshing a materialized view. It runs in a single worker before the new version is published.
+        """
+        self._database_preparers.append(preparer)
+        return preparer
+
+    def before_change(self, listener: Callable[[str], Any]):
+        """
+        Register a callable (sync or async) that is invoked with the new version before it is published, to bring
+        up to date anything read under that version in this worker.
+        """
+        self._preparers.append(listener)
+        return listener
+
+    def on_change(self, listener: Callable[[str], Any]):
+        """
+        Register a callable (sync or async) that is invoked with the new version whenever it changes.
+        """
+        self._listeners.append(listener)
+        return listener
+
+    async def compute(self, wait: bool = False) -> str:
+        """
+        Get the latest version the derived data of the db was prepared for, preparing it first when the catalogue
+        changed since, unless another worker already is.
+
+        Parameters:
+        - wait: Wait for the worker preparing the derived data rather than return the previous version.
+        """
+        async with engine.connect() as connection:
+            epoch, version, prepared = (
+                await connection.execute(text(f"SELECT epoch, version, prepared FROM {VERSION_TABLE}"))
+            ).one()
+        if prepared < version:
+            prepared = await self._prepare_database(wait) or prepared
+        return f"{epoch}:{prepared}"
+
+    async def _prepare_database(self, wait: bool) -> int | None:
+        async with engine.begin() as connection:
+            if wait:
+                await connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PREPARE_LOCK})
+            elif not (
+                await connection.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": PREPARE_LOCK})
+            ).scalar_one():
+                return None
+            # read again under the lock, the worker that held it may have prepared this version already
+            version, prepared = (await connection.execute(text(f"SELECT version, prepared FROM {VERSION_TABLE}"))).one()
+            if prepared >= version:
+                return prepared
+            await self._notify(self._database_preparers)
+            await connection.execute(text(f"UPDATE {VERSION_TABLE} SET prepared = :version"), {"version": version})
+            logger.info("Prepared the derived data of the db for catalogue version %d", version)
+            return version
+
+    async def refresh(self, wait: bool = False) -> bool:
+        """
+        Recompute the version and notify the listeners if it changed.
+
+        Parameters:
+        - wait: Wait for another worker preparing the derived data of a new version, rather than keep the
+          previous version until the next poll. Always the case until a first version is published.
+
+        Returns:
+        - Whether the version changed.
+        """
+        version = await self.compute(wait=wait or self.value is None)
+        if version == self.value:
+            return False
+        await self._notify(self._preparers, version)
+        logger.info("Dataset version changed from %s to %s", self.value, version)
+        self.value = version
+        await self._notify(self._listeners, version)
+        return True
+
+    @staticmethod
+    async def _notify(listeners: list[Callable[..., Any]], *args):
+        for listener in listeners:
+            result = listener(*args)
+            if inspect.isawaitable(result):
+                await result
+
+    async def watch(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Failed to refresh the dataset version")
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache of pre-serialized response bodies, keyed on the dataset version.
+
+    Every entry holds the identity body and, once a client has asked for them, its gzip and brotli encodings,
+    so each variant is compressed at most once per dataset version.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple[str, str], dict[str, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.not_modified = 0
+
+    async def get(self, version: str, key: str, encoding: str, build: Callable[[], Awaitable[bytes]]) -> bytes:
+        """
+        Get the body stored under `key` in the requested content encoding, building and compressing it on a miss.
+
+        Compression runs in the threadpool so that large bodies do not stall the event loop.
+        """
+        with self._lock:
+            variants = self._entries.get((version, key))
+            if variants is not None:
+                self._entries.move_to_end((version, key))
+                self.hits += 1
+                if encoding in variants:
+                    return variants[encoding]
+            else:
+                self.misses += 1
+        if variants is None:
+            variants = {"identity": await build()}
+        if encoding not in variants:
+            variants = {**variants, encoding: await run_in_threadpool(ENCODERS[encoding], variants["identity"])}
+        self._store(version, key, variants)
+        return variants[encoding]
+
+    def _store(self, version: str, key: str, variants: dict[str, bytes]):
+        size = sum(len(content) for content in variants.values())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop((version, key), None)
+            if previous is not None:
+                self.size -= sum(len(content) for content in previous.values())
+            self._entries[(version, key)] = variants
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= sum(len(content) for content in evicted.values())
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+ENCODERS: dict[str, Callable[[bytes], bytes]] = {
+    "br": lambda content: brotli.compress(content, quality=get_settings().brotli_quality),
+    "gzip": lambda content: gzip.compress(content, compresslevel=get_settings().gzip_level, mtime=0),
+}
+
+
+dataset_version = DatasetVersion()
+response_cache = ResponseCache(max_bytes=get_settings().response_cache_max_bytes)
+
+
+@dataset_version.on_change
+def _drop_stale_responses(version: str):
+    response_cache.clear()
+
+
+@lru_cache()
+def _type_adapter(response_model: Any) -> TypeAdapter:
+    return TypeAdapter(response_model)
+
+
+def dump_json(response_model: Any, content: Any) -> bytes:
+    """
+    Serialize `content` the way FastAPI would for an endpoint declaring `response_model`.
+    """
+    adapter = _type_adapter(response_model)
+    with timed_serialization():
+        return adapter.dump_json(adapter.validate_python(content, from_attributes=True))
+
+
+def _negotiate_encoding(accept_encoding: str) -> str:
+    """
+    Pick the preferred content encoding we have a variant for, honouring q-values in Accept-Encoding.
+    """
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip()] = quality
+    for encoding in ENCODERS:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+
+def _etag(version: str, key: str) -> str:
+    return hashlib.md5(f"{version}:{key}".encode("utf-8")).hexdigest()
+
+
+def _matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip().removeprefix("W/").strip('"')
+        # any encoding of the same body is an equivalent representation for revalidation
+        if tag == "*" or tag.split("-", 1)[0] == etag:
+            return True
+    return False
+
+
+async def cached_response(
+    request: Request, key: str, build: Callable[[], Awaitable[bytes]], media_type: str = "application/json"
+) -> Response:
+    """
+    Serve the response body stored under `key` for the current dataset version, building it on a miss.
+
+    The response carries a strong ETag derived from the dataset version, so a matching If-None-Match is
+    answered with 304 before anything is built, and the body is sent pre-compressed when the client accepts
+    gzip or brotli.
+
+    Parameters:
+    - request: The incoming request, for its conditional and content negotiation headers.
+    - key: Identifies the response within a dataset version, e.g. the path and relevant query parameters.
+    - build: Coroutine function producing the serialized response body.
+    - media_type: The media type of the response body.
+
+    Returns:
+    - The response.
+    """
+    version = dataset_version.value
+    if version is None:
+        return Response(content=await build(), media_type=media_type)
+
+    etag = _etag(version, key)
+    encoding = _negotiate_encoding(request.headers.get("accept-encoding", ""))
+    headers = {
+        "ETag": f'"{etag}"' if encoding == "identity" else f'"{etag}-{encoding}"',
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if _matches(request.headers.get("if-none-match"), etag):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+
+    content = await response_cache.get(version, key, encoding, build)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=content, media_type=media_type, headers=headers)
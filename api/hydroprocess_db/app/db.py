@@ -1,17 +1,20 @@
+import hashlib
 from typing import AsyncGenerator
 from urllib.parse import quote_plus
 
 from fastapi import Depends
 from fastapi_users_db_sqlmodel import SQLModelBaseUserDB, SQLModelUserDatabaseAsync
+from sqlalchemy import DDL, text
 from sqlalchemy.engine import URL
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel import SQLModel, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from config import get_settings
 
 from . import models
+from .pool import InstrumentedQueuePool, count_invalidations
 
 settings = get_settings()
 
@@ -35,26 +38,63 @@ class User(SQLModelBaseUserDB, table=True):
     pass
 
 
-engine = create_async_engine(DATABASE_URL, future=True)
+engine = create_async_engine(
+    DATABASE_URL,
+    future=True,
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=settings.db_pool_pre_ping,
+    connect_args={
+        # asyncpg's own statement cache and the one SQLAlchemy keeps on top of it
+        "statement_cache_size": settings.db_statement_cache_size,
+        "prepared_statement_cache_size": settings.db_statement_cache_size,
+    },
+)
+count_invalidations(engine)
 async_session_maker = sessionmaker(
     engine,
     class_=AsyncSession,
     expire_on_commit=False,
 )
 
-SYNC_DATABASE_URL = URL.create(
-    "postgresql+psycopg2",
-    username=PG_USERNAME,
-    password=PG_PASSWORD,
-    host=PG_HOST,
-    port=PG_PORT,
-    database=PG_DBNAME,
-)
-sync_engine = create_engine(SYNC_DATABASE_URL)
+
+def view_version(definition: str) -> str:
+    return hashlib.md5(definition.encode("utf-8")).hexdigest()
+
+
+def materialized_view_ddl(name: str, definition: str) -> list[DDL]:
+    """
+    DDL creating a materialized view along with the tables, and creating it again when its definition changed.
+
+    CREATE IF NOT EXISTS alone would keep a view created from a previous definition on existing databases, so
+    the version of the definition is recorded in the comment of the view, and a view with another version is
+    dropped first. Its indexes are dropped along with it, and are to be declared after these statements.
+    """
+    version = view_version(definition)
+    return [
+        DDL(
+            f"""
+            DO $$
+            BEGIN
+                IF obj_description(to_regclass('{name}'), 'pg_class') IS DISTINCT FROM '{version}' THEN
+                    DROP MATERIALIZED VIEW IF EXISTS {name};
+                END IF;
+            END
+            $$
+            """
+        ),
+        DDL(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {name} AS {definition}"),
+        DDL(f"COMMENT ON MATERIALIZED VIEW {name} IS '{version}'"),
+    ]
 
 
 async def create_db_and_tables():
     async with engine.begin() as conn:
+        # one worker at a time, as the views created along with the tables may be dropped and created again
+        await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('create_db_and_tables'))"))
         await conn.run_sync(SQLModel.metadata.create_all)
 
 
@@ -63,9 +103,26 @@ async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 
-def get_session():
-    with Session(sync_engine) as session:
-        yield session
+def select_perceptual_models():
+    """
+    Select statement for perceptual models with all of their nested relations eagerly loaded.
+    """
+    return (
+        select(models.PerceptualModel)
+        .options(*models.perceptual_model_load_options())
+        .order_by(models.PerceptualModel.id)
+    )
+
+
+def select_perceptual_model_features():
+    """
+    Select statement for the perceptual models located at a point, i.e. those with a GeoJSON feature, with all
+    of their nested relations eagerly loaded. The models without a location or located without a point are
+    left out, as they are by the FEATURE_JSON of the postgis engine.
+    """
+    return select_perceptual_models().where(
+        models.PerceptualModel.location_id.in_(select(models.Location.id).where(models.Location.pt.is_not(None)))
+    )
 
 
 async def get_user_db(session: AsyncSession = Depends(get_async_session)):
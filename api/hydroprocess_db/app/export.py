@@ -0,0 +1,181 @@
+"""
+Bulk export of the perceptual models as Arrow IPC streams or GeoParquet files.
+
+Every perceptual model is flattened into one row along with its citation, location, zone types, model type and
+processes, the columns of the relations it lacks and its geometry, when located without a point, left null. The rows are read from a server-side cursor one batch at a time and handed to pyarrow as columns,
+without building any ORM objects, and every batch is encoded and sent before the next one is fetched, so the
+memory used stays bounded by the batch size whatever the size of the catalogue.
+
+The column types are derived from the SQLModel table definitions, and the location point is sent as WKB in a
+`geometry` column, tagged with the GeoParquet metadata and the geoarrow extension name so that geopandas reads
+it as a GeoDataFrame.
+"""
+
+import json
+from typing import AsyncIterator, Literal
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from geoalchemy2 import Geometry
+from sqlalchemy import Float, Integer, text
+from starlette.concurrency import run_in_threadpool
+
+from app.db import engine
+from app.models import Citation, Location, ModelType, PerceptualModel, SpatialZoneType, TemporalZoneType
+
+ExportFormat = Literal["arrow", "parquet"]
+
+EXPORT_MEDIA_TYPES: dict[str, str] = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+EXPORT_EXTENSIONS: dict[str, str] = {"arrow": "arrows", "parquet": "parquet"}
+
+# related tables flattened into the export, along with their alias in EXPORT_SQL and the prefix of their columns
+_RELATED = (
+    (Citation, "c", "citation"),
+    (Location, "l", "location"),
+    (SpatialZoneType, "sz", "spatial_zone_type"),
+    (TemporalZoneType, "tz", "temporal_zone_type"),
+    (ModelType, "mt", "model_type"),
+)
+
+GEOMETRY_FIELD = pa.field("geometry", pa.binary(), metadata={"ARROW:extension:name": "geoarrow.wkb"})
+
+# https://geoparquet.org/releases/v1.0.0/, the crs defaults to OGC:CRS84, i.e. longitude/latitude
+GEO_METADATA = {
+    "version": "1.0.0",
+    "primary_column": GEOMETRY_FIELD.name,
+    "columns": {GEOMETRY_FIELD.name: {"encoding": "WKB", "geometry_types": ["Point"]}},
+}
+
+
+def _arrow_type(column) -> pa.DataType:
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, Float):
+        return pa.float64()
+    return pa.string()
+
+
+def _export_columns() -> list[tuple[str, pa.Field]]:
+    """
+    List the SQL expression and arrow field of every exported column.
+    """
+    columns = []
+    for name in PerceptualModel.model_fields:
+        column = PerceptualModel.__table__.c[name]
+        columns.append((f"pm.{column.name}", pa.field(name, _arrow_type(column))))
+    for model, alias, prefix in _RELATED:
+        for name in model.model_fields:
+            column = model.__table__.c[name]
+            # the ids are already exported as the foreign keys of the perceptual model
+            if name == "id" or isinstance(column.type, Geometry):
+                continue
+            field_name = name if name == prefix else f"{prefix}_{name}"
+            columns.append((f"{alias}.{column.name}", pa.field(field_name, _arrow_type(column))))
+    columns.append(("processes.ids", pa.field("process_taxonomy_ids", pa.list_(pa.int64()))))
+    columns.append(("processes.names", pa.field("process_taxonomies", pa.list_(pa.string()))))
+    columns.append(("ST_AsBinary(l.pt)", GEOMETRY_FIELD))
+    return columns
+
+
+EXPORT_COLUMNS = _export_columns()
+
+EXPORT_SCHEMA = pa.schema(
+    [field for _, field in EXPORT_COLUMNS], metadata={"geo": json.dumps(GEO_METADATA, separators=(",", ":"))}
+)
+
+EXPORT_SQL = text(
+    f"""
+    SELECT {", ".join(f"{expression} AS {field.name}" for expression, field in EXPORT_COLUMNS)}
+    FROM perceptual_model pm
+    LEFT JOIN locations l ON l.id = pm.location_id
+    LEFT JOIN citations c ON c.id = pm.citation_id
+    LEFT JOIN spatial_zone_type sz ON sz.id = pm.spatialzone_id
+    LEFT JOIN temporal_zone_type tz ON tz.id = pm.temporalzone_id
+    LEFT JOIN model_type mt ON mt.id = pm.model_type_id
+    LEFT JOIN (
+        SELECT lpp.entry_id, array_agg(ptx.id ORDER BY ptx.id) AS ids, array_agg(ptx.process ORDER BY ptx.id) AS names
+        FROM (SELECT DISTINCT entry_id, process_id FROM link_process_perceptual) lpp
+        JOIN process_taxonomy ptx ON ptx.id = lpp.process_id
+        GROUP BY lpp.entry_id
+    ) processes ON processes.entry_id = pm.id
+    ORDER BY pm.id
+    """
+)
+
+
+async def export_batches(batch_size: int) -> AsyncIterator[pa.RecordBatch]:
+    """
+    Read the flattened perceptual models from a server-side cursor, `batch_size` rows at a time.
+    """
+    # a connection of its own, held until the last batch is sent rather than for the duration of the endpoint
+    async with engine.connect() as connection:
+        # yield_per sizes the fetches of the cursor, the partitions are the batches
+        result = await connection.stream(EXPORT_SQL.execution_options(yield_per=batch_size))
+        async for rows in result.partitions(batch_size):
+            yield pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*rows), EXPORT_SCHEMA)],
+                schema=EXPORT_SCHEMA,
+            )
+
+
+class _Sink:
+    """
+    File-like target of a pyarrow writer, collecting what it writes until drained.
+    """
+
+    def __init__(self):
+        self.chunks: list[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _open_writer(output_format: ExportFormat, sink: _Sink):
+    target = pa.PythonFile(sink, mode="w")
+    if output_format == "parquet":
+        # one row group per batch, written out as soon as the batch is
+        return pq.ParquetWriter(target, EXPORT_SCHEMA, compression="zstd")
+    return pa.ipc.new_stream(target, EXPORT_SCHEMA)
+
+
+async def stream_export(output_format: ExportFormat, batch_size: int) -> AsyncIterator[bytes]:
+    """
+    Encode the perceptual models as an Arrow IPC stream or a GeoParquet file, yielding the bytes of every batch
+    as soon as it is encoded.
+
+    Parameters:
+    - output_format: "arrow" for an Arrow IPC stream, "parquet" for a GeoParquet file.
+    - batch_size: The number of rows fetched, encoded and sent at a time.
+    """
+    sink = _Sink()
+    writer = _open_writer(output_format, sink)
+    try:
+        async for batch in export_batches(batch_size):
+            await run_in_threadpool(writer.write_batch, batch)
+            yield sink.drain()
+    finally:
+        # also releases the writer when the client disconnects half way
+        writer.close()
+    # the end of stream marker, or the parquet footer
+    yield sink.drain()
@@ -0,0 +1,376 @@
+"""
+In-memory bitmap index of the perceptual models by facet, answering the statistics endpoints without the db.
+
+The facets, i.e. the model type, the spatial zone, the temporal zone and the processes of the models, are small,
+closed vocabularies, and the filters of `ModelCountRequest` only combine their values with OR within a facet and
+AND across facets. The index holds, for every facet value, a bitset of the models having it, one bit per model
+in id order packed in 64 bit words, so that matching a request is a few vectorized ORs and ANDs, and counting the
+matches of every value of a facet a single AND and popcount over the matrix of its bitsets: microseconds for
+the thousands of models of the catalogue, milliseconds for hundreds of thousands.
+
+The bitsets of the zones and processes also make up the model × feature incidence matrix the similar models are
+ranked on: the features a model shares with every other one are summed with a product of the bitsets of its
+own features, a few dozen rows, so ranking hundreds of thousands of models takes milliseconds too.
+
+It is built from the catalogue tables at startup and rebuilt before every new dataset version is published,
+like the read model, so counts served under a version always come from an index at least as recent.
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Literal
+
+import numpy as np
+from sqlmodel import select
+from starlette.concurrency import run_in_threadpool
+
+from app.cache import dataset_version
+from app.db import engine
+from app.models import (
+    FacetCount,
+    FacetCounts,
+    LinkProcessPerceptual,
+    Location,
+    ModelCountRequest,
+    ModelType,
+    PerceptualModel,
+    ProcessTaxonomy,
+)
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Facet:
+    # sorted ids of the facet values, and the bitset of the models having each of them
+    values: np.ndarray
+    bits: np.ndarray
+
+    def union(self, ids: list[int]) -> np.ndarray:
+        """
+        The bitset of the models having any of the values, none of them for unknown values.
+        """
+        positions = np.searchsorted(self.values, ids)
+        positions = positions[positions < len(self.values)]
+        positions = positions[np.isin(self.values[positions], ids)]
+        return np.bitwise_or.reduce(self.bits[positions], axis=0, initial=0)
+
+    def counts(self, matches: np.ndarray) -> list[FacetCount]:
+        """
+        The number of matching models for every value, for the values with any.
+        """
+        counts = np.bitwise_count(self.bits & matches).sum(axis=1)
+        return [
+            FacetCount(id=value, count=count) for value, count in zip(self.values.tolist(), counts.tolist()) if count
+        ]
+
+
+# the facets making up the features of a model, compared by the similarity
+SIMILARITY_FACETS = ("spatial_zones", "temporal_zones", "process_taxonomies")
+SimilarityMetric = Literal["jaccard", "cosine"]
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+@dataclass(frozen=True)
+class SimilarModel:
+    id: int
+    score: float
+    similarity: float
+    distance_km: float | None
+
+
+def _facet(rows: np.ndarray, values: np.ndarray, words: int) -> Facet:
+    """
+    Index the models at the given rows by the value they have, null values being left out.
+    """
+    known = values >= 0
+    rows, values = rows[known], values[known]
+    unique, positions = np.unique(values, return_inverse=True)
+    bits = np.zeros((len(unique), words), dtype=np.uint64)
+    np.bitwise_or.at(bits, (positions, rows >> 6), np.left_shift(np.uint64(1), (rows & 63).astype(np.uint64)))
+    return Facet(unique, bits)
+
+
+class FacetIndex:
+    """
+    Bitsets of the perceptual models by model type, spatial zone, temporal zone and process, along with the
+    weights of the features and the locations of the models the similarity is computed from.
+    """
+
+    def __init__(
+        self,
+        models: list[tuple[int, int | None, int | None, int | None]],
+        links: list[tuple[int, int]],
+        model_types: list[tuple[int, str]],
+        processes: list[tuple[int, str]],
+        locations: list[tuple[int, float, float]],
+    ):
+        """
+        Parameters:
+        - models: The id, model type id, spatial zone id and temporal zone id of every perceptual model.
+        - links: The perceptual model id and process id of every link between them.
+        - model_types: The id and name of every model type.
+        - processes: The id and identifier of every process taxonomy entry.
+        - locations: The perceptual model id, latitude and longitude of every model with a location.
+        """
+        columns = np.array(models, dtype=np.int64).reshape(-1, 4) if models else np.empty((0, 4), dtype=np.int64)
+        order = np.argsort(columns[:, 0], kind="stable")
+        columns = columns[order]
+        self.ids = columns[:, 0]
+        self.words = -(-len(self.ids) // 64)
+        rows = np.arange(len(self.ids), dtype=np.int64)
+
+        link_columns = np.array(links, dtype=np.int64).reshape(-1, 2)
+        # links of models that do not exist are left out, as the joins of the queries would
+        link_rows = np.searchsorted(self.ids, link_columns[:, 0])
+        linked = link_rows < len(self.ids)
+        linked[linked] = self.ids[link_rows[linked]] == link_columns[linked, 0]
+
+        memberships = {
+            "model_types": (rows, columns[:, 1]),
+            "spatial_zones": (rows, columns[:, 2]),
+            "temporal_zones": (rows, columns[:, 3]),
+            "process_taxonomies": (link_rows[linked], link_columns[linked, 1]),
+        }
+        self.facets = {name: _facet(*membership, self.words) for name, membership in memberships.items()}
+
+        # rare features tell more about a model than the ones most models share, weighted by their inverse
+        # frequency, and the total weight of the features of every model, by weighting and power of the weights
+        self.weights: dict[str, np.ndarray] = {}
+        self.totals: dict[tuple[bool, int], np.ndarray] = {}
+        for weighted in (False, True):
+            for power in (1, 2):
+                self.totals[weighted, power] = np.zeros(len(self.ids))
+        for name in SIMILARITY_FACETS:
+            facet = self.facets[name]
+            member_rows, values = memberships[name]
+            known = values >= 0
+            member_rows, positions = member_rows[known], np.searchsorted(facet.values, values[known])
+            # a model linked twice to the same process has it once, as in its bitset
+            pairs = np.unique(member_rows * len(facet.values) + positions)
+            member_rows, positions = pairs // len(facet.values), pairs % len(facet.values)
+            frequencies = np.bincount(positions, minlength=len(facet.values))
+            self.weights[name] = np.log1p(len(self.ids) / np.maximum(frequencies, 1))
+            for weighted, power in self.totals:
+                weights = self.weights[name][positions] ** power if weighted else np.ones(len(positions))
+                self.totals[weighted, power] += np.bincount(member_rows, weights=weights, minlength=len(self.ids))
+
+        self.latitudes = np.full(len(self.ids), np.nan)
+        self.longitudes = np.full(len(self.ids), np.nan)
+        location_columns = np.array(locations, dtype=np.float64).reshape(-1, 3)
+        location_rows = np.searchsorted(self.ids, location_columns[:, 0].astype(np.int64))
+        located = location_rows < len(self.ids)
+        self.latitudes[location_rows[located]] = location_columns[located, 1]
+        self.longitudes[location_rows[located]] = location_columns[located, 2]
+
+        self.model_types = sorted(model_types)
+        self.processes = processes
+
+        self.everything = np.zeros(self.words, dtype=np.uint64)
+        if len(self.ids):
+            self.everything[:] = np.iinfo(np.uint64).max
+            # the bits past the last model are never set
+            if len(self.ids) % 64:
+                self.everything[-1] = np.uint64((1 << (len(self.ids) % 64)) - 1)
+
+    def subtree_ids(self, ids: list[int]) -> list[int]:
+        """
+        The ids of the process taxonomy entries with the same identifier as any of the given entries, or below it,
+        as matched in SQL by `app.models.process_subtree_ids`.
+        """
+        requested = set(ids)
+        identifiers = {identifier for process_id, identifier in self.processes if process_id in requested}
+        return [
+            process_id
+            for process_id, identifier in self.processes
+            if any(identifier == root or identifier.startswith(root + ".") for root in identifiers)
+        ]
+
+    def matches(self, request: ModelCountRequest) -> np.ndarray:
+        """
+        The bitset of the models matching the filters of a request, with the semantics of its SQL criteria.
+        """
+        matches = self.everything.copy()
+        if request.spatialzone_ids:
+            matches &= self.facets["spatial_zones"].union(request.spatialzone_ids)
+        if request.temporalzone_ids:
+            matches &= self.facets["temporal_zones"].union(request.temporalzone_ids)
+        if request.process_taxonomy_ids:
+            process_ids = request.process_taxonomy_ids
+            if request.include_descendants:
+                process_ids = self.subtree_ids(process_ids)
+            matches &= self.facets["process_taxonomies"].union(process_ids)
+        return matches
+
+    def model_count(self) -> int:
+        return len(self.ids)
+
+    def model_type_counts(self, request: ModelCountRequest) -> dict[str, int]:
+        matches = self.matches(request)
+        counts = {facet_count.id: facet_count.count for facet_count in self.facets["model_types"].counts(matches)}
+        return {name: counts.get(model_type_id, 0) for model_type_id, name in self.model_types}
+
+    def facet_counts(self, request: ModelCountRequest) -> FacetCounts:
+        matches = self.matches(request)
+        return FacetCounts(
+            total=int(np.bitwise_count(matches).sum()),
+            **{name: facet.counts(matches) for name, facet in self.facets.items()},
+        )
+
+    def row(self, model_id: int) -> int | None:
+        row = int(np.searchsorted(self.ids, model_id))
+        return row if row < len(self.ids) and self.ids[row] == model_id else None
+
+    def distances_km(self, row: int) -> np.ndarray:
+        """
+        The great-circle distance from the location of a model to the location of every model, NaN when either
+        has none.
+        """
+        latitudes, longitudes = np.radians(self.latitudes), np.radians(self.longitudes)
+        haversine = (
+            np.sin((latitudes - latitudes[row]) / 2) ** 2
+            + np.cos(latitudes[row]) * np.cos(latitudes) * np.sin((longitudes - longitudes[row]) / 2) ** 2
+        )
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(haversine, 0, 1)))
+
+    def similar(
+        self,
+        model_id: int,
+        k: int,
+        metric: SimilarityMetric = "jaccard",
+        weighted: bool = True,
+        distance_weight: float = 0.0,
+        distance_scale_km: float = 500.0,
+    ) -> list[SimilarModel] | None:
+        """
+        Rank the other perceptual models by the similarity of their features, i.e. their spatial zone, temporal
+        zone and processes, to the features of a model.
+
+        Parameters:
+        - model_id: The ID of the perceptual model to compare the others to.
+        - k: The number of models to return.
+        - metric: "jaccard", the weight of the shared features over the weight of the features of either model,
+          or "cosine", of the vectors of the feature weights of both models.
+        - weighted: Weight the features by their inverse frequency, rather than all the same.
+        - distance_weight: The share of the proximity of the locations in the score, from 0 to 1, the proximity
+          decaying exponentially with the distance.
+        - distance_scale_km: The distance at which the proximity decays to 1/e.
+
+        Returns:
+        - The `k` models of highest score, which is the similarity blended with the proximity, best first and
+          excluding the models with nothing in common, or None when the model does not exist.
+        """
+        row = self.row(model_id)
+        if row is None:
+            return None
+        power = 2 if metric == "cosine" else 1
+        word, bit = row >> 6, np.uint64(row & 63)
+
+        # the weight of the features every model shares with this one
+        shared = np.zeros(len(self.ids))
+        for name in SIMILARITY_FACETS:
+            facet = self.facets[name]
+            own = ((facet.bits[:, word] >> bit) & np.uint64(1)).astype(bool)
+            if not own.any():
+                continue
+            members = np.unpackbits(facet.bits[own].view(np.uint8), axis=1, count=len(self.ids), bitorder="little")
+            weights = self.weights[name][own] ** power if weighted else np.ones(int(own.sum()))
+            shared += weights @ members
+
+        totals = self.totals[weighted, power]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if metric == "cosine":
+                similarity = shared / np.sqrt(totals * totals[row])
+            else:
+                similarity = shared / (totals + totals[row] - shared)
+        similarity = np.nan_to_num(similarity)
+
+        distances = self.distances_km(row)
+        proximity = np.nan_to_num(np.exp(-distances / distance_scale_km))
+        scores = (1 - distance_weight) * similarity + distance_weight * proximity
+        scores[row] = 0
+
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        # best first, ties by id
+        candidates = candidates[np.lexsort((self.ids[candidates], -scores[candidates]))]
+        return [
+            SimilarModel(
+                id=int(self.ids[candidate]),
+                score=float(scores[candidate]),
+                similarity=float(similarity[candidate]),
+                distance_km=None if np.isnan(distances[candidate]) else float(distances[candidate]),
+            )
+            for candidate in candidates
+        ]
+
+    def nbytes(self) -> int:
+        return (
+            self.ids.nbytes
+            + sum(facet.values.nbytes + facet.bits.nbytes for facet in self.facets.values())
+            + sum(weights.nbytes for weights in self.weights.values())
+            + sum(totals.nbytes for totals in self.totals.values())
+            + self.latitudes.nbytes
+            + self.longitudes.nbytes
+        )
+
+
+# the index of the latest dataset version, None until built or when disabled
+_facet_index: FacetIndex | None = None
+
+
+def current_facet_index() -> FacetIndex | None:
+    return _facet_index
+
+
+@dataset_version.before_change
+async def rebuild_facet_index(version: str):
+    global _facet_index
+    if not get_settings().facet_index_enabled:
+        return
+    start = time.perf_counter()
+    async with engine.connect() as connection:
+        models = (
+            await connection.execute(
+                select(
+                    PerceptualModel.id,
+                    PerceptualModel.model_type_id,
+                    PerceptualModel.spatialzone_id,
+                    PerceptualModel.temporalzone_id,
+                )
+            )
+        ).all()
+        links = (
+            await connection.execute(select(LinkProcessPerceptual.entry_id, LinkProcessPerceptual.process_id))
+        ).all()
+        model_types = (await connection.execute(select(ModelType.id, ModelType.name))).all()
+        processes = (await connection.execute(select(ProcessTaxonomy.id, ProcessTaxonomy.identifier))).all()
+        locations = (
+            await connection.execute(
+                select(PerceptualModel.id, Location.lat, Location.lon)
+                .join(Location, Location.id == PerceptualModel.location_id)
+                .where(Location.lat.is_not(None), Location.lon.is_not(None))
+            )
+        ).all()
+
+    # nulls are stored as -1, below every id
+    models = [tuple(-1 if value is None else value for value in row) for row in models]
+    links = [tuple(row) for row in links if row.entry_id is not None and row.process_id is not None]
+    _facet_index = await run_in_threadpool(
+        FacetIndex,
+        models,
+        links,
+        [tuple(row) for row in model_types],
+        [tuple(row) for row in processes],
+        [tuple(row) for row in locations],
+    )
+    logger.info(
+        "Built the facet index of %d models (%d bytes) in %.3f s",
+        _facet_index.model_count(),
+        _facet_index.nbytes(),
+        time.perf_counter() - start,
+    )
@@ -0,0 +1,156 @@
+"""
+Fast path for the GeoJSON features of perceptual models.
+
+Perceptual models share their citation, zones, model type, location and processes, so those are dumped once
+per dataset version and the features are assembled as plain dicts which orjson encodes directly, without
+building and re-validating a pydantic model for every feature. The output is the same document FastAPI
+produces from the `GeoJsonFeature` models.
+
+The compact format goes one step further for bulk listings: every related row is sent once in a lookup table,
+the models are sent as columns referencing them by id and their coordinates as a single flat array.
+"""
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from sqlmodel import SQLModel
+
+from app.cache import dataset_version
+from app.metrics import timed_serialization
+from app.models import (
+    Citation,
+    Location,
+    ModelType,
+    PerceptualModel,
+    ProcessTaxonomy,
+    SpatialZoneType,
+    TemporalZoneType,
+    WKBToGeoJSON,
+    _dump_fields,
+)
+
+# dumps of the related rows, keyed on (model class, id), valid for the current dataset version
+_related_dumps: dict[tuple[type, int], dict] = {}
+_geometries: dict[int, dict] = {}
+
+
+@dataset_version.on_change
+def _drop_stale_dumps(version: str):
+    _related_dumps.clear()
+    _geometries.clear()
+
+
+def _dump_related(instance: SQLModel) -> dict:
+    key = (type(instance), instance.id)
+    dump = _related_dumps.get(key)
+    if dump is None:
+        dump = _related_dumps[key] = _dump_fields(instance)
+    return dump
+
+
+def _geometry(location: Location) -> dict:
+    geometry = _geometries.get(location.id)
+    if geometry is None:
+        geometry = _geometries[location.id] = WKBToGeoJSON.from_WKBElement(location.pt)
+    return geometry
+
+
+def feature(pmodel: PerceptualModel, **members) -> dict:
+    """
+    Build the GeoJSON feature of a perceptual model as a plain dict, with `members` appended after its
+    properties (e.g. a search rank). Only the models located at a point have one, see
+    `app.db.select_perceptual_model_features`.
+    """
+    return {
+        "type": "Feature",
+        "geometry": _geometry(pmodel.location),
+        "properties": pmodel.get_feature_properties(dump_related=_dump_related),
+        **members,
+    }
+
+
+def feature_collection(features: list[dict], **members) -> dict:
+    return {"type": "FeatureCollection", "features": features, **members}
+
+
+# related tables sent once, as lookups, in the compact format
+COMPACT_LOOKUPS = (Citation, Location, SpatialZoneType, TemporalZoneType, ModelType, ProcessTaxonomy)
+
+
+def _lookup_row(instance: SQLModel) -> dict:
+    # the location geometry is already part of the packed coordinates
+    return {name: value for name, value in _dump_related(instance).items() if name != "pt"}
+
+
+def compact_collection(perceptual_models: list[PerceptualModel]) -> dict:
+    """
+    Build the compact representation of perceptual models.
+
+    Returns:
+    - `lookups`: the related rows referenced by the models, once each, keyed by table name and ordered by id.
+    - `models`: one array per perceptual model field, plus `process_taxonomy_ids` holding the ids of the process
+      taxonomies of every model.
+    - `coordinates`: the longitude and latitude of every model, one after the other, i.e.
+      `[lon_0, lat_0, lon_1, lat_1, ...]`, both null for a model located without a point, which has no feature.
+    """
+    lookups: dict[type, dict[int, SQLModel]] = {model: {} for model in COMPACT_LOOKUPS}
+    columns: dict[str, list] = {name: [] for name in PerceptualModel.model_fields}
+    columns["process_taxonomy_ids"] = []
+    coordinates: list[float] = []
+    for pmodel in perceptual_models:
+        for name, value in _dump_fields(pmodel).items():
+            columns[name].append(value)
+        process_taxonomies = pmodel.process_taxonomies or []
+        columns["process_taxonomy_ids"].append([process_taxonomy.id for process_taxonomy in process_taxonomies])
+        for related in (
+            pmodel.citation,
+            pmodel.location,
+            pmodel.spatial_zone_type,
+            pmodel.temporal_zone_type,
+            pmodel.model_type,
+            *process_taxonomies,
+        ):
+            if related is not None:
+                lookups[type(related)][related.id] = related
+        if pmodel.location is None or pmodel.location.pt is None:
+            coordinates.extend((None, None))
+        else:
+            coordinates.extend(_geometry(pmodel.location)["coordinates"])
+
+    return {
+        "format": "compact",
+        "lookups": {
+            model.__tablename__: [_lookup_row(rows[row_id]) for row_id in sorted(rows)]
+            for model, rows in lookups.items()
+        },
+        "models": columns,
+        "coordinates": coordinates,
+    }
+
+
+def batch_entry(pmodel: PerceptualModel, relations: list[str]) -> dict:
+    """
+    Build the entry of a perceptual model in a batch lookup as a plain dict: its fields, followed by the
+    requested relations.
+    """
+    entry = _dump_fields(pmodel)
+    for name in relations:
+        related = getattr(pmodel, name)
+        if isinstance(related, list):
+            entry[name] = [_dump_related(instance) for instance in related]
+        else:
+            entry[name] = _dump_related(related) if related is not None else None
+    return entry
+
+
+def dumps(content: dict) -> bytes:
+    with timed_serialization():
+        return orjson.dumps(content)
+
+
+def feature_response(content: dict) -> ORJSONResponse:
+    """
+    Respond with a document built from `feature`/`feature_collection` or `batch_entry`, bypassing the response
+    model validation.
+    """
+    with timed_serialization():
+        return ORJSONResponse(content=content)
@@ -0,0 +1,172 @@
+"""
+Figures of the perceptual models, resized and re-encoded by the api.
+
+The figures are the images matched to the citations by `citation_and_images_matching.json`, which the frontend
+used to bundle at full size, about 58 MB in all, while a popup shows them at most 400 pixels wide. They are
+served instead in a few widths, as WebP or JPEG, generated on first request or ahead of time with:
+
+    python -m app.figures
+
+Every variant is stored in an on-disk cache under a name derived from the content of its source image, its width
+and its format, so a variant never changes once written: it is served with an immutable, year long cache
+lifetime, and a replaced image gets new names rather than stale copies in the browsers.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Literal
+
+from PIL import Image, ImageOps
+from sqlmodel import select
+from starlette.concurrency import run_in_threadpool
+
+from app.cache import dataset_version
+from app.models import Citation
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+FigureFormat = Literal["webp", "jpeg"]
+
+FIGURE_MEDIA_TYPES: dict[str, str] = {"webp": "image/webp", "jpeg": "image/jpeg"}
+FIGURE_EXTENSIONS: dict[str, str] = {"webp": "webp", "jpeg": "jpg"}
+# bump to give every variant a new name when the encoding changes
+FIGURE_ENCODING_VERSION = 1
+
+# image file name by citation id, valid for the current dataset version
+_citation_figures: dict[int, str] | None = None
+# content digest of the source images, keyed by path and valid while their size and mtime are unchanged
+_source_digests: dict[str, tuple[int, int, str]] = {}
+
+
+@dataset_version.on_change
+def _drop_citation_figures(version: str):
+    global _citation_figures
+    _citation_figures = None
+
+
+def _matching() -> dict[str, str]:
+    # the keys are citations, some of them with trailing whitespace, and some citations have no file
+    with open(get_settings().figure_matching_file, encoding="utf-8") as matching:
+        return {citation.strip(): filename for citation, filename in json.load(matching).items() if filename}
+
+
+async def citation_figure(session, citation_id: int) -> str | None:
+    """
+    Get the path of the source image of the figure of a citation, None when it has no figure.
+    """
+    global _citation_figures
+    if _citation_figures is None:
+        matching = _matching()
+        citations = (await session.exec(select(Citation.id, Citation.citation))).all()
+        _citation_figures = {
+            row_id: matching[citation.strip()]
+            for row_id, citation in citations
+            if citation and citation.strip() in matching
+        }
+    filename = _citation_figures.get(citation_id)
+    return os.path.join(get_settings().figure_images_dir, filename) if filename else None
+
+
+def _source_digest(path: str) -> str:
+    stat = os.stat(path)
+    cached = _source_digests.get(path)
+    if cached and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+        return cached[2]
+    with open(path, "rb") as source:
+        digest = hashlib.sha256(source.read()).hexdigest()[:32]
+    _source_digests[path] = (stat.st_size, stat.st_mtime_ns, digest)
+    return digest
+
+
+def snap_width(width: int | None) -> int | None:
+    """
+    Round a requested width up to the closest width variants are generated in, None for the full size.
+    """
+    if width is None:
+        return None
+    return next((candidate for candidate in sorted(get_settings().figure_widths) if candidate >= width), None)
+
+
+def variant_name(path: str, width: int | None, output_format: FigureFormat) -> str:
+    return f"{_source_digest(path)}-v{FIGURE_ENCODING_VERSION}-{width or 'full'}.{FIGURE_EXTENSIONS[output_format]}"
+
+
+def variant_path(name: str) -> str:
+    return os.path.join(get_settings().figure_cache_dir, name)
+
+
+def _render(path: str, width: int | None, output_format: FigureFormat, target: str):
+    with Image.open(path) as source:
+        image = ImageOps.exif_transpose(source)
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        # converted before resizing, palette images would otherwise be resized without interpolation
+        if has_alpha and output_format == "webp":
+            image = image.convert("RGBA")
+        elif has_alpha:
+            # jpeg has no alpha channel, transparent areas are made white
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, "white")
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        else:
+            image = image.convert("RGB")
+        if width and width < image.width:
+            image.thumbnail((width, image.height), Image.Resampling.LANCZOS)
+
+        # written aside and renamed, so concurrent requests never read a partial variant
+        directory = os.path.dirname(target)
+        with tempfile.NamedTemporaryFile(dir=directory, suffix=".tmp", delete=False) as output:
+            if output_format == "webp":
+                image.save(output, format="WEBP", quality=80, method=4)
+            else:
+                image.save(output, format="JPEG", quality=82, optimize=True, progressive=True)
+        os.replace(output.name, target)
+
+
+async def figure_variant(path: str, width: int | None, output_format: FigureFormat) -> str:
+    """
+    Get the name of a variant of a figure, generating it unless already cached.
+    """
+    # hashing the source reads it whole, the first time
+    name = await run_in_threadpool(variant_name, path, width, output_format)
+    target = variant_path(name)
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        await run_in_threadpool(_render, path, width, output_format, target)
+        logger.info("Generated figure variant %s from %s", name, os.path.basename(path))
+    return name
+
+
+async def generate_all() -> int:
+    """
+    Generate every variant of every matched figure that is not cached yet.
+
+    Returns:
+    - The number of variants generated.
+    """
+    settings = get_settings()
+    generated = 0
+    for filename in sorted(set(_matching().values())):
+        path = os.path.join(settings.figure_images_dir, filename)
+        if not os.path.exists(path):
+            logger.warning("Figure %s is missing from %s", filename, settings.figure_images_dir)
+            continue
+        for width in [*settings.figure_widths, None]:
+            for output_format in FIGURE_MEDIA_TYPES:
+                if not os.path.exists(variant_path(variant_name(path, width, output_format))):
+                    await figure_variant(path, width, output_format)
+                    generated += 1
+    return generated
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    print(f"generated {asyncio.run(generate_all())} figure variants in {get_settings().figure_cache_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+GeoJSON documents rendered entirely inside PostGIS.
+
+The SQL below is generated from the SQLModel table definitions so that every object is emitted with the same
+keys, in the same order and with the same compact separators as the python path (``model_dump`` followed by
+FastAPI's JSON rendering). Every feature is rendered once per dataset version into the read model (see
+`app.read_model`), and postgres concatenates them into a single text value which is handed to the client as-is,
+without building any per-feature python objects.
+"""
+
+import orjson
+from geoalchemy2 import Geometry
+from sqlalchemy import ARRAY, Float, Integer, bindparam, text
+from sqlmodel import SQLModel
+
+from app.models import (
+    Citation,
+    Location,
+    ModelType,
+    PerceptualModel,
+    ProcessTaxonomy,
+    SpatialZoneType,
+    TemporalZoneType,
+    perceptual_model_read,
+)
+
+
+def _json_value(expression: str) -> str:
+    return f"coalesce(to_json({expression})::text, 'null')"
+
+
+def _json_float(expression: str) -> str:
+    # postgres prints integral floats without a fractional part, python keeps the trailing ".0"
+    return (
+        f"CASE WHEN {expression} IS NULL THEN 'null' "
+        f"WHEN {expression} = trunc({expression}) AND abs({expression}) < 1e15 "
+        f"THEN trunc({expression})::bigint::text || '.0' "
+        f"ELSE {expression}::text END"
+    )
+
+
+def _point_geojson(expression: str) -> str:
+    return (
+        "'{\"type\":\"Point\",\"coordinates\":[' || "
+        f"{_json_float(f'ST_X({expression})')} || ',' || {_json_float(f'ST_Y({expression})')} || ']}}'"
+    )
+
+
+def _json_members(model: type[SQLModel], alias: str) -> str:
+    """
+    Build a SQL expression rendering a row of `model` the way `model.model_dump()` would serialize it,
+    leaving the object open so that further members can be appended.
+    """
+    members = []
+    for index, name in enumerate(model.model_fields):
+        column = model.__table__.c[name]
+        expression = f"{alias}.{column.name}"
+        if isinstance(column.type, Geometry):
+            value = _json_value(_point_geojson(expression))
+        elif isinstance(column.type, Float):
+            value = _json_float(expression)
+        else:
+            value = _json_value(expression)
+        separator = "{" if index == 0 else ","
+        members.append(f"'{separator}\"{name}\":' || {value}")
+    return " || ".join(members)
+
+
+def _json_object(model: type[SQLModel], alias: str) -> str:
+    return f"{_json_members(model, alias)} || '}}'"
+
+
+def _json_relation(name: str, model: type[SQLModel], alias: str) -> str:
+    # like get_feature_properties, a relation without a row is left out
+    return f" || CASE WHEN {alias}.id IS NULL THEN '' ELSE ',\"{name}\":' || {_json_object(model, alias)} END"
+
+
+def _feature_json() -> str:
+    # the nested relations are appended in the same order as PerceptualModel.get_feature_properties
+    properties = _json_members(PerceptualModel, "pm")
+    relations = (
+        _json_relation("citation", Citation, "c")
+        + " || coalesce(',\"process_taxonomies\":[' || processes.json || ']', '')"
+        + _json_relation("spatial_zone_type", SpatialZoneType, "sz")
+        + _json_relation("temporal_zone_type", TemporalZoneType, "tz")
+        + _json_relation("model_type", ModelType, "mt")
+        + _json_relation("location", Location, "l")
+        + " || '}'"
+    )
+    geometry = _point_geojson("l.pt")
+    return f"""'{{"type":"Feature","geometry":' || {geometry} || ',"properties":' || {properties}{relations} || '}}'"""
+
+
+# SQL expressions rendering the feature of the perceptual model `pm` and its geometry over FEATURE_FROM, both
+# NULL for the models located without a point, which are left out of the collections
+FEATURE_JSON = f"CASE WHEN l.pt IS NULL THEN NULL ELSE {_feature_json()} END"
+GEOMETRY_JSON = f"CASE WHEN l.pt IS NULL THEN NULL ELSE {_point_geojson('l.pt')} END"
+
+# every perceptual model, along with the rows of its relations when they exist, as the ORM loads them
+FEATURE_FROM = f"""
+    perceptual_model pm
+    LEFT JOIN locations l ON l.id = pm.location_id
+    LEFT JOIN citations c ON c.id = pm.citation_id
+    LEFT JOIN spatial_zone_type sz ON sz.id = pm.spatialzone_id
+    LEFT JOIN temporal_zone_type tz ON tz.id = pm.temporalzone_id
+    LEFT JOIN model_type mt ON mt.id = pm.model_type_id
+    LEFT JOIN (
+        SELECT lpp.entry_id,
+               string_agg({_json_object(ProcessTaxonomy, 'ptx')}, ',' ORDER BY ptx.id) AS json,
+               array_agg(ptx.id ORDER BY ptx.id) AS ids,
+               string_agg(ptx.process, E'\\n' ORDER BY ptx.id) AS names
+        FROM (SELECT DISTINCT entry_id, process_id FROM link_process_perceptual) lpp
+        JOIN process_taxonomy ptx ON ptx.id = lpp.process_id
+        GROUP BY lpp.entry_id
+    ) processes ON processes.entry_id = pm.id
+"""
+
+# the features are read from the denormalized read model, where they are rendered once per dataset version
+FEATURE_COLLECTION_SQL = text(
+    f"""
+    SELECT '{{"type":"FeatureCollection","features":[' || coalesce(string_agg(feature, ',' ORDER BY id), '') || ']}}'
+    FROM {perceptual_model_read.name}
+    WHERE feature IS NOT NULL AND (CAST(:model_ids AS integer[]) IS NULL OR id = ANY(:model_ids))
+    """
+).bindparams(bindparam("model_ids", type_=ARRAY(Integer)))
+
+
+async def feature_collection_json(session, model_ids: list[int] | None = None) -> bytes:
+    """
+    Render a GeoJSON FeatureCollection of perceptual models inside PostGIS.
+
+    Parameters:
+    - session: The session to use for database operations.
+    - model_ids: Optionally restrict the collection to these perceptual model ids.
+
+    Returns:
+    - The encoded FeatureCollection document.
+    """
+    document = (await session.exec(FEATURE_COLLECTION_SQL, params={"model_ids": model_ids})).scalar_one()
+    return document.encode("utf-8")
+
+
+def join_features(features: list[str], **members) -> bytes:
+    """
+    Assemble features rendered by PostGIS into a FeatureCollection document, with `members` appended after
+    them (e.g. a pagination cursor).
+    """
+    document = '{"type":"FeatureCollection","features":[' + ",".join(features) + "]"
+    for name, value in members.items():
+        document += f',"{name}":' + orjson.dumps(value).decode("utf-8")
+    return (document + "}").encode("utf-8")
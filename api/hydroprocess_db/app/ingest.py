@@ -0,0 +1,263 @@
+"""
+Bulk ingest of the catalogue from CSV or JSON files, in place of replaying the SQL dump.
+
+Every file is named after the table it loads (e.g. ``locations.csv`` or ``perceptual_model.json``) and holds
+columns of that table, ``id`` included. The files are COPYed into temporary staging tables and merged into the
+catalogue tables with one set-based upsert per table, all in a single transaction: the api keeps serving the
+previous data until the transaction commits, and nothing changes when any file fails to load.
+
+CSV files start with a header line and are parsed by postgres itself. JSON files hold an array of objects, or
+one object per line, whose values are typed after the SQLModel table definitions and sent with a binary COPY.
+Geometries cannot be sent as JSON, so the location points are built from the latitude and longitude when they
+are not given.
+
+Run from the api container with:
+
+    python -m app.ingest /data/ingest --replace
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import BinaryIO
+
+import asyncpg
+from geoalchemy2 import Geometry
+from sqlalchemy import Float, Integer, Table
+from sqlmodel import SQLModel
+
+from app.cache import CATALOGUE_TABLES, dataset_version
+from app.db import engine
+from app.models import IngestRun
+
+logger = logging.getLogger(__name__)
+
+# catalogue tables, parents first so that the foreign keys of every upsert are satisfied
+INGEST_TABLES: dict[str, Table] = {
+    table.name: table for table in SQLModel.metadata.sorted_tables if table.name in CATALOGUE_TABLES
+}
+
+# columns computed from the others when a file does not provide them
+DERIVED_COLUMNS: dict[str, dict[str, str]] = {
+    "locations": {"pt": "ST_SetSRID(ST_MakePoint(lon, lat), 4326)"},
+}
+
+
+class IngestError(Exception):
+    pass
+
+
+def _staging(table: Table) -> str:
+    return f"staging_{table.name}"
+
+
+def _coerce(column, value):
+    if value is None:
+        return None
+    if isinstance(column.type, Integer):
+        return int(value)
+    if isinstance(column.type, Float):
+        return float(value)
+    return str(value)
+
+
+def _check_columns(filename: str, table: Table, columns: list[str]):
+    unknown = [name for name in columns if name not in table.c]
+    if unknown:
+        raise IngestError(f"{filename}: unknown columns {', '.join(unknown)} for table {table.name}")
+    if "id" not in columns:
+        raise IngestError(f"{filename}: the id column is required")
+
+
+def _read_json(filename: str, table: Table, source: BinaryIO) -> tuple[list[str], list[tuple]]:
+    content = source.read().decode("utf-8-sig").strip()
+    if content.startswith("["):
+        objects = json.loads(content)
+    else:
+        objects = [json.loads(line) for line in content.splitlines() if line.strip()]
+
+    names = set().union(*objects) if objects else {"id"}
+    _check_columns(filename, table, list(names))
+    columns = [column for column in table.c if column.name in names and not isinstance(column.type, Geometry)]
+    try:
+        records = [tuple(_coerce(column, row.get(column.name)) for column in columns) for row in objects]
+    except (TypeError, ValueError) as error:
+        raise IngestError(f"{filename}: {error}") from error
+    return [column.name for column in columns], records
+
+
+async def _copy(connection: asyncpg.Connection, filename: str, table: Table, source: BinaryIO) -> tuple[list[str], int]:
+    """
+    COPY a file into the staging table of `table`.
+
+    Returns:
+    - The columns loaded from the file, and the number of rows.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".csv":
+        header = source.readline().decode("utf-8-sig")
+        columns = next(csv.reader([header]), [])
+        _check_columns(filename, table, columns)
+        status = await connection.copy_to_table(_staging(table), source=source, columns=columns, format="csv")
+        return columns, _row_count(status)
+    if extension in (".json", ".jsonl", ".ndjson"):
+        columns, records = _read_json(filename, table, source)
+        status = await connection.copy_records_to_table(_staging(table), records=records, columns=columns)
+        return columns, _row_count(status)
+    raise IngestError(f"{filename}: expected a .csv, .json or .ndjson file")
+
+
+def _upsert_sql(table: Table, columns: list[str]) -> str:
+    expressions = {name: name for name in columns}
+    for name, expression in DERIVED_COLUMNS.get(table.name, {}).items():
+        expressions[name] = f"coalesce({name}, {expression})" if name in columns else expression
+    updates = ", ".join(f"{name} = EXCLUDED.{name}" for name in expressions if name != "id")
+    return (
+        f"INSERT INTO {table.name} ({', '.join(expressions)}) "
+        f"SELECT {', '.join(expressions.values())} FROM {_staging(table)} "
+        f"ON CONFLICT (id) DO {f'UPDATE SET {updates}' if updates else 'NOTHING'}"
+    )
+
+
+def _row_count(status: str) -> int:
+    # command tags look like "COPY 12", "INSERT 0 12" or "DELETE 3"
+    return int(status.rsplit(" ", 1)[1])
+
+
+async def ingest(sources: dict[str, BinaryIO], replace: bool = False) -> dict:
+    """
+    Load catalogue tables from CSV or JSON files in one transaction.
+
+    Parameters:
+    - sources: The files to load, by file name, each named after the table it loads.
+    - replace: Also delete the rows of every loaded table that are missing from its file, so that the table
+      ends up holding exactly the content of the file.
+
+    Returns:
+    - The rows loaded, upserted and deleted, along with the time spent copying and merging, per table.
+    """
+    files: dict[str, tuple[str, BinaryIO]] = {}
+    for filename, source in sources.items():
+        name = os.path.splitext(os.path.basename(filename))[0]
+        if name not in INGEST_TABLES:
+            raise IngestError(f"{filename}: {name} is not a catalogue table ({', '.join(INGEST_TABLES)})")
+        if name in files:
+            raise IngestError(f"{filename}: {name} is already loaded from {files[name][0]}")
+        files[name] = (filename, source)
+    tables = [table for name, table in INGEST_TABLES.items() if name in files]
+
+    started_at = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    report: dict[str, dict] = {}
+    async with engine.connect() as sa_connection:
+        connection: asyncpg.Connection = (await sa_connection.get_raw_connection()).driver_connection
+        try:
+            async with connection.transaction():
+                for table in tables:
+                    filename, source = files[table.name]
+                    await connection.execute(
+                        f"CREATE TEMP TABLE {_staging(table)} (LIKE {table.name} INCLUDING DEFAULTS) ON COMMIT DROP"
+                    )
+                    copy_start = time.perf_counter()
+                    columns, rows = await _copy(connection, filename, table, source)
+                    merge_start = time.perf_counter()
+                    upserted = _row_count(await connection.execute(_upsert_sql(table, columns)))
+                    report[table.name] = {
+                        "file": filename,
+                        "rows": rows,
+                        "upserted": upserted,
+                        "deleted": 0,
+                        "copy_seconds": merge_start - copy_start,
+                        "merge_seconds": time.perf_counter() - merge_start,
+                    }
+
+                if replace:
+                    # children first, so that no row is deleted while still referenced
+                    for table in reversed(tables):
+                        delete_start = time.perf_counter()
+                        status = await connection.execute(
+                            f"DELETE FROM {table.name} t WHERE NOT EXISTS "
+                            f"(SELECT 1 FROM {_staging(table)} s WHERE s.id = t.id)"
+                        )
+                        report[table.name]["deleted"] = _row_count(status)
+                        report[table.name]["merge_seconds"] += time.perf_counter() - delete_start
+
+                for table in tables:
+                    # the files carry their ids, move the sequences past them
+                    await connection.execute(
+                        f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), max(id)) "
+                        f"FROM {table.name} HAVING max(id) IS NOT NULL"
+                    )
+
+                seconds = time.perf_counter() - start
+                await connection.execute(
+                    f"INSERT INTO {IngestRun.__tablename__} (started_at, seconds, replace, report) "
+                    "VALUES ($1, $2, $3, $4::json)",
+                    started_at,
+                    seconds,
+                    replace,
+                    json.dumps(report),
+                )
+        except asyncpg.PostgresError as error:
+            raise IngestError(f"{type(error).__name__}: {error}") from error
+
+    for name, stats in report.items():
+        logger.info(
+            "Ingested %s from %s: %d rows, %d upserted, %d deleted, copy %.1f ms, merge %.1f ms",
+            name,
+            stats["file"],
+            stats["rows"],
+            stats["upserted"],
+            stats["deleted"],
+            stats["copy_seconds"] * 1000,
+            stats["merge_seconds"] * 1000,
+        )
+    # don't wait for the next poll to stop serving the previous data from this worker
+    await dataset_version.refresh(wait=True)
+    return {"seconds": seconds, "replace": replace, "tables": report}
+
+
+async def ingest_directory(directory: str, replace: bool = False) -> dict:
+    """
+    Load every CSV and JSON file of `directory` named after a catalogue table.
+    """
+    filenames = sorted(
+        filename
+        for filename in os.listdir(directory)
+        if os.path.splitext(filename)[1].lower() in (".csv", ".json", ".jsonl", ".ndjson")
+    )
+    if not filenames:
+        raise IngestError(f"{directory}: no .csv, .json or .ndjson file to ingest")
+    sources = {filename: open(os.path.join(directory, filename), "rb") for filename in filenames}
+    try:
+        return await ingest(sources, replace=replace)
+    finally:
+        for source in sources.values():
+            source.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="directory holding one .csv/.json file per catalogue table")
+    parser.add_argument(
+        "--replace", action="store_true", help="delete the rows of the loaded tables missing from their file"
+    )
+    args = parser.parse_args()
+
+    result = asyncio.run(ingest_directory(args.directory, replace=args.replace))
+    print(f"{'table':>24} {'rows':>8} {'upserted':>9} {'deleted':>8} {'copy ms':>9} {'merge ms':>9}")
+    for name, stats in result["tables"].items():
+        print(
+            f"{name:>24} {stats['rows']:>8} {stats['upserted']:>9} {stats['deleted']:>8}"
+            f" {stats['copy_seconds'] * 1000:>9.1f} {stats['merge_seconds'] * 1000:>9.1f}"
+        )
+    print(f"ingested in {result['seconds'] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Prometheus instrumentation of the api: per-route latency, SQL and serialization time, and response size.
+
+A middleware opens a `RequestStats` for every http request and keeps it in a context variable, which the
+SQLAlchemy cursor hooks and the serialization timers add to. The route template (e.g.
+``/perceptual_model/{model_id}``) is used as label so that the series do not grow with the ids requested.
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+from prometheus_client.registry import REGISTRY
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.db import engine
+from app.pool import pool_metrics
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling a request, until the last byte of the response is sent.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_sql_queries",
+    "SQL statements executed per request.",
+    ["method", "route"],
+    buckets=QUERY_BUCKETS,
+)
+REQUEST_SQL_DURATION = Histogram(
+    "http_request_sql_duration_seconds",
+    "Time spent executing SQL statements per request.",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_SERIALIZATION_DURATION = Histogram(
+    "http_request_serialization_duration_seconds",
+    "Time spent validating and serializing the response body per request.",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "Size of the response body, as sent (i.e. after content encoding).",
+    ["method", "route"],
+    buckets=SIZE_BUCKETS,
+)
+SLOW_REQUESTS = Counter(
+    "http_slow_requests",
+    "Requests slower than the slow request threshold.",
+    ["method", "route"],
+)
+
+
+class RequestStats:
+    """
+    What a single request spent its time on.
+    """
+
+    def __init__(self, capture_statements: bool):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.serialization_seconds = 0.0
+        self.endpoint_returned_at: float | None = None
+        self.statements: list[tuple[float, str]] | None = [] if capture_statements else None
+
+
+_request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+@contextmanager
+def timed_serialization():
+    """
+    Attribute the time spent in the block to the serialization of the current request.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.serialization_seconds += time.perf_counter() - start
+
+
+# the start time is kept on the execution context of the statement, which is dropped along with it when the
+# statement fails and after_cursor_execute is never called
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_start = time.perf_counter()
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_start
+    stats = _request_stats.get()
+    if stats is None:
+        return
+    stats.queries += 1
+    stats.sql_seconds += elapsed
+    if stats.statements is not None:
+        stats.statements.append((elapsed, statement))
+
+
+class InstrumentedRoute(APIRoute):
+    """
+    Route measuring the time FastAPI spends turning the value returned by the endpoint into a response, i.e.
+    validating it against the response model, encoding and rendering it.
+    """
+
+    def get_route_handler(self):
+        call = self.dependant.call
+
+        def mark_returned():
+            stats = _request_stats.get()
+            if stats is not None:
+                stats.endpoint_returned_at = time.perf_counter()
+
+        # the wrapper must keep the sync/async flavour of the endpoint, which FastAPI uses to decide how to call it
+        if asyncio.iscoroutinefunction(call):
+
+            @functools.wraps(call)
+            async def endpoint(*args, **kwargs):
+                try:
+                    return await call(*args, **kwargs)
+                finally:
+                    mark_returned()
+
+        else:
+
+            @functools.wraps(call)
+            def endpoint(*args, **kwargs):
+                try:
+                    return call(*args, **kwargs)
+                finally:
+                    mark_returned()
+
+        self.dependant.call = endpoint
+        handler = super().get_route_handler()
+
+        async def timed_handler(request: Request) -> Response:
+            response = await handler(request)
+            stats = _request_stats.get()
+            if stats is not None and stats.endpoint_returned_at is not None:
+                stats.serialization_seconds += time.perf_counter() - stats.endpoint_returned_at
+            return response
+
+        return timed_handler
+
+
+class MetricsMiddleware:
+    """
+    Record the latency, SQL and serialization time and response size of every http request, and log the SQL
+    statements of the requests slower than `slow_request_log_seconds` (when set).
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.slow_request_seconds = get_settings().slow_request_log_seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(capture_statements=self.slow_request_seconds is not None)
+        token = _request_stats.set(stats)
+        status = 500
+        size = 0
+
+        async def send_wrapper(message: Message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_stats.reset(token)
+            self._observe(scope, stats, status, size, elapsed)
+
+    def _observe(self, scope: Scope, stats: RequestStats, status: int, size: int, elapsed: float):
+        route = scope.get("route")
+        # unmatched paths share one label, so that scanners cannot blow up the number of series
+        path = route.path if route is not None else "<unmatched>"
+        method = scope["method"]
+
+        REQUEST_DURATION.labels(method, path, str(status)).observe(elapsed)
+        REQUEST_QUERIES.labels(method, path).observe(stats.queries)
+        REQUEST_SQL_DURATION.labels(method, path).observe(stats.sql_seconds)
+        REQUEST_SERIALIZATION_DURATION.labels(method, path).observe(stats.serialization_seconds)
+        RESPONSE_SIZE.labels(method, path).observe(size)
+
+        if self.slow_request_seconds is not None and elapsed >= self.slow_request_seconds:
+            SLOW_REQUESTS.labels(method, path).inc()
+            statements = "".join(
+                f"\n  [{seconds * 1000:.1f} ms] {statement}" for seconds, statement in stats.statements
+            )
+            logger.warning(
+                "Slow request %s %s (%s) took %.1f ms: %d queries in %.1f ms, serialization %.1f ms, %d bytes%s",
+                method,
+                scope["path"],
+                path,
+                elapsed * 1000,
+                stats.queries,
+                stats.sql_seconds * 1000,
+                stats.serialization_seconds * 1000,
+                size,
+                statements,
+            )
+
+
+class PoolCollector:
+    """
+    Export the connection pool state and checkout statistics along with the request metrics.
+    """
+
+    def collect(self):
+        stats = pool_metrics.stats(engine.pool)
+        for name, documentation in (
+            ("size", "Connections kept in the pool."),
+            ("checked_out", "Connections currently in use."),
+            ("checked_in", "Idle connections in the pool."),
+            ("overflow", "Connections open beyond the pool size."),
+        ):
+            yield GaugeMetricFamily(f"db_pool_{name}", documentation, value=stats[name])
+        for name, documentation in (
+            ("checkouts", "Connections checked out of the pool."),
+            ("timeouts", "Checkouts that timed out waiting for a connection."),
+            ("connects", "Connections opened by the pool."),
+            ("overflow_connects", "Connections opened beyond the pool size."),
+            ("invalidations", "Connections dropped after a failed pre-ping or a disconnect error."),
+        ):
+            yield CounterMetricFamily(f"db_pool_{name}", documentation, value=stats[name])
+        yield HistogramMetricFamily(
+            "db_pool_checkout_wait_seconds",
+            "Time spent waiting for a connection from the pool.",
+            buckets=list(stats["wait_seconds_buckets"].items()),
+            sum_value=stats["wait_seconds_total"],
+        )
+
+
+REGISTRY.register(PoolCollector())
+
+
+def metrics(request: Request) -> Response:
+    """
+    Expose the metrics in the Prometheus text format.
+    """
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,11 +1,15 @@
 import json
-from typing import List, Optional
+from datetime import datetime
+from typing import Callable, List, Literal, Optional, Tuple
 
 from geoalchemy2 import Geometry, WKBElement, shape
 from geojson_pydantic import Feature, FeatureCollection, Point
-from pydantic import BaseModel, ConfigDict, model_serializer
+from pydantic import BaseModel, ConfigDict, field_validator, model_serializer
 from pydantic_extra_types.coordinate import Latitude, Longitude
 from shapely import to_geojson
+from sqlalchemy import JSON, Integer, MetaData, Table, Text, and_, distinct, func, or_, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import joinedload, raiseload, selectinload
 from sqlmodel import Column, Field, Relationship, SQLModel
 
 
@@ -43,8 +47,8 @@ class WKBToGeoJSON(SQLModel, WKBElement):
 
     @model_serializer()
     def ser_model(self) -> str:
-        shp = shape.to_shape(self)
-        return to_geojson(shp)
+        # re-encode so coordinates use the shortest float repr, as they do in the feature geometry
+        return json.dumps(WKBToGeoJSON.validate(self), separators=(",", ":"))
 
 
 class Location(SQLModel, table=True):
@@ -135,7 +139,9 @@ class PerceptualModel(PerceptualModelBase, table=True):
 
     # many-to-many relationship between perceptual model and processTaxonomy
     process_taxonomies: list["ProcessTaxonomy"] | None = Relationship(
-        back_populates="perceptual_models", link_model=LinkProcessPerceptual
+        back_populates="perceptual_models",
+        link_model=LinkProcessPerceptual,
+        sa_relationship_kwargs={"order_by": "ProcessTaxonomy.id"},
     )
     location: Location = Relationship(back_populates="perceptual_models")
     citation: Citation = Relationship(back_populates="perceptual_model")
@@ -143,44 +149,53 @@ class PerceptualModel(PerceptualModelBase, table=True):
     temporal_zone_type: TemporalZoneType = Relationship(back_populates="perceptual_models")
     model_type: ModelType = Relationship(back_populates="perceptual_models")
 
-    def get_feature_properties(self) -> dict:
+    def get_feature_properties(self, dump_related: Callable[[SQLModel], dict] | None = None) -> dict:
+        # related rows are shared between models, callers serializing many models can reuse their dumps
+        dump_related = dump_related or _dump_fields
 
         # add the base properties
-        properties = self.model_dump()
+        properties = _dump_fields(self)
 
         # add the citation to the properties
         citation = self.citation
         if citation:
-            properties["citation"] = citation.model_dump()
+            properties["citation"] = dump_related(citation)
 
         # add the process taxonomies to the properties
         process_taxonomies = self.process_taxonomies
         if process_taxonomies:
-            properties["process_taxonomies"] = [pt.model_dump() for pt in process_taxonomies]
+            properties["process_taxonomies"] = [dump_related(pt) for pt in process_taxonomies]
 
         # add the spatial zone type to the properties
         spatial_zone_type = self.spatial_zone_type
         if spatial_zone_type:
-            properties["spatial_zone_type"] = spatial_zone_type.model_dump()
+            properties["spatial_zone_type"] = dump_related(spatial_zone_type)
 
         # add the temporal zone type to the properties
         temporal_zone_type = self.temporal_zone_type
         if temporal_zone_type:
-            properties["temporal_zone_type"] = temporal_zone_type.model_dump()
+            properties["temporal_zone_type"] = dump_related(temporal_zone_type)
 
         # add the model type to the properties
         model_type = self.model_type
         if model_type:
-            properties["model_type"] = model_type.model_dump()
+            properties["model_type"] = dump_related(model_type)
 
         # add the location to the properties
         location = self.location
         if location:
-            properties["location"] = location.model_dump()
+            properties["location"] = dump_related(location)
 
         return properties
 
 
+def _dump_fields(instance: SQLModel) -> dict:
+    # model_dump follows the order in which SQLAlchemy populated the instance, which differs between
+    # processes; re-key it in field declaration order so the serialized output is stable
+    dump = instance.model_dump()
+    return {name: dump[name] for name in type(instance).model_fields if name in dump}
+
+
 class PerceptualModelRecursive(PerceptualModelBase):
     process_taxonomies: list["ProcessTaxonomy"] | None
     location: Location
@@ -230,7 +245,266 @@ class ProcessAltName(SQLModel, table=True):
     process_taxonomy: ProcessTaxonomy | None = Relationship(back_populates="process_alt_name")
 
 
+class IngestRun(SQLModel, table=True):
+    __tablename__: str = "ingest_runs"
+    id: int = Field(default=None, primary_key=True)
+    started_at: datetime
+    seconds: float
+    replace: bool
+    # rows loaded, upserted and deleted along with the time spent, per table
+    report: dict = Field(sa_column=Column(JSON))
+
+
+# one denormalized row per perceptual model, a materialized view maintained by app.read_model, kept out of
+# SQLModel.metadata so that create_all does not create it as a table
+perceptual_model_read = Table(
+    "perceptual_model_read",
+    MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("location_id", Integer),
+    Column("citation_id", Integer),
+    Column("spatialzone_id", Integer),
+    Column("temporalzone_id", Integer),
+    Column("model_type_id", Integer),
+    Column("process_taxonomy_ids", ARRAY(Integer)),
+    Column("pt", Geometry("POINT")),
+    # the GeoJSON geometry and feature, rendered as the geojson endpoints serve them
+    Column("geometry", Text),
+    Column("feature", Text),
+    # the text matched by the search filters, the process names one per line
+    Column("long_name", Text),
+    Column("citation", Text),
+    Column("textmodel_snipped", Text),
+    Column("processes", Text),
+    Column("spatial_property", Text),
+    Column("temporal_property", Text),
+)
+
+
+def perceptual_model_load_options() -> list:
+    """
+    Loader options that eagerly fetch every relation exposed by the nested and geojson representations.
+
+    The scalar relations are joined onto the perceptual model query and the many-to-many process taxonomies
+    are fetched with a single additional IN query, so a whole collection of perceptual models is loaded in a
+    fixed number of round trips instead of one lazy load per relation per row. Any other relation raises
+    rather than lazy loading, which an async session cannot do.
+    """
+    return [
+        joinedload(PerceptualModel.location),
+        joinedload(PerceptualModel.citation),
+        joinedload(PerceptualModel.spatial_zone_type),
+        joinedload(PerceptualModel.temporal_zone_type),
+        joinedload(PerceptualModel.model_type),
+        selectinload(PerceptualModel.process_taxonomies),
+        raiseload("*"),
+    ]
+
+
+def process_subtree_ids(ids: List[int]):
+    """
+    Array of the ids of the process taxonomies `ids` and of all their descendants.
+
+    The descendants of an entry are the entries whose identifier extends its own with more dot-separated parts,
+    e.g. `Chan.Flow.Quick` for `Chan.Flow`. They are matched by a range of identifiers, compared bytewise
+    with the pattern operators, which the `text_pattern_ops` index on the identifier serves like a prefix
+    LIKE: `Chan.` <= identifier < `Chan/`, as `/` follows `.`.
+    """
+    taxonomy = ProcessTaxonomy.__table__
+    parent = taxonomy.alias("parent")
+    # grouped, as || does not bind tighter than the pattern operators
+    lower = (parent.c.identifier + ".").self_group()
+    upper = (parent.c.identifier + "/").self_group()
+    return (
+        select(func.array_agg(distinct(taxonomy.c.id)))
+        .select_from(taxonomy)
+        .join(
+            parent,
+            or_(
+                taxonomy.c.identifier == parent.c.identifier,
+                and_(
+                    taxonomy.c.identifier.op("~>=~", is_comparison=True)(lower),
+                    taxonomy.c.identifier.op("~<~", is_comparison=True)(upper),
+                ),
+            ),
+        )
+        .where(parent.c.id.in_(ids))
+        .scalar_subquery()
+    )
+
+
 class ModelCountRequest(BaseModel):
     spatialzone_ids: Optional[List[int]] = None
     temporalzone_ids: Optional[List[int]] = None
     process_taxonomy_ids: Optional[List[int]] = None
+    # also match the models linked to any descendant of the requested processes
+    include_descendants: bool = False
+
+    def filters(self) -> list:
+        """
+        SQL criteria on the perceptual model read model matching this request.
+
+        Models are matched when they are in any of the requested spatial zones, any of the requested temporal
+        zones, and linked to any of the requested processes, or to any of their descendants with
+        `include_descendants`. The process criterion is an overlap test on the array of process ids of the
+        model, served by its GIN index.
+        """
+        read = perceptual_model_read.c
+        clauses = []
+        if self.spatialzone_ids:
+            clauses.append(read.spatialzone_id.in_(self.spatialzone_ids))
+        if self.temporalzone_ids:
+            clauses.append(read.temporalzone_id.in_(self.temporalzone_ids))
+        if self.process_taxonomy_ids:
+            process_ids = self.process_taxonomy_ids
+            if self.include_descendants:
+                process_ids = process_subtree_ids(process_ids)
+            clauses.append(read.process_taxonomy_ids.overlap(process_ids))
+        return clauses
+
+
+TextSearchField = Literal[
+    "long_name", "citation", "textmodel_snipped", "processes_taxonomies", "spatial_property", "temporal_property"
+]
+
+
+def check_bbox(min_lon: float, min_lat: float, max_lon: float, max_lat: float):
+    """
+    Check that a bounding box is not inverted. Boxes crossing the antimeridian, whose minimum longitude is
+    above the maximum, are not supported: they are to be requested as two boxes, on either side.
+
+    Raises:
+    - ValueError: When a minimum is above its maximum.
+    """
+    if min_lon > max_lon or min_lat > max_lat:
+        raise ValueError("the bounding box minimums must not be above its maximums")
+
+
+class PerceptualModelSearchRequest(ModelCountRequest):
+    # min_lon, min_lat, max_lon, max_lat
+    bbox: Optional[Tuple[float, float, float, float]] = None
+    text: Optional[str] = None
+    text_fields: List[TextSearchField] = ["long_name", "citation", "textmodel_snipped"]
+    limit: int = Field(default=100, ge=1, le=1000)
+    cursor: Optional[int] = None
+
+    @field_validator("bbox")
+    @classmethod
+    def _check_bbox(cls, bbox: Optional[Tuple[float, float, float, float]]):
+        if bbox is not None:
+            check_bbox(*bbox)
+        return bbox
+
+    def filters(self) -> list:
+        """
+        SQL criteria on the perceptual model read model matching this request.
+
+        On top of the zone and process filters, models must lie within the bounding box (an index-assisted
+        `&&` test on the location point) and contain the text, case-insensitively, in any of the text fields.
+        """
+        read = perceptual_model_read.c
+        clauses = super().filters()
+        if self.bbox:
+            clauses.append(read.pt.op("&&")(func.ST_MakeEnvelope(*self.bbox, 4326)))
+        if self.text and self.text_fields:
+            pattern = "%" + self.text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            columns = {
+                "long_name": read.long_name,
+                "citation": read.citation,
+                "textmodel_snipped": read.textmodel_snipped,
+                "processes_taxonomies": read.processes,
+                "spatial_property": read.spatial_property,
+                "temporal_property": read.temporal_property,
+            }
+            clauses.append(or_(*(columns[field].ilike(pattern) for field in self.text_fields)))
+        return clauses
+
+
+class PerceptualModelSearchResults(GeoJsonFeatureCollection):
+    next_cursor: int | None = None
+
+
+class RankedGeoJsonFeature(GeoJsonFeature):
+    rank: float
+
+
+class PerceptualModelTextSearchResults(GeoJsonFeatureCollection):
+    features: list[RankedGeoJsonFeature]
+    next_offset: int | None = None
+
+
+class SimilarGeoJsonFeature(GeoJsonFeature):
+    score: float
+    similarity: float
+    # None when either model has no location
+    distance_km: float | None
+
+
+class SimilarPerceptualModels(GeoJsonFeatureCollection):
+    features: list[SimilarGeoJsonFeature]
+
+
+class CompactPerceptualModels(BaseModel):
+    format: Literal["compact"] = "compact"
+    # related rows keyed by table name
+    lookups: dict[str, list[dict]]
+    # one array per perceptual model field, plus process_taxonomy_ids
+    models: dict[str, list]
+    # [lon_0, lat_0, lon_1, lat_1, ...], null for the models located without a point
+    coordinates: list[float | None]
+
+
+PerceptualModelRelation = Literal[
+    "location", "citation", "spatial_zone_type", "temporal_zone_type", "model_type", "process_taxonomies"
+]
+
+
+class PerceptualModelBatchRequest(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=1000)
+    relations: List[PerceptualModelRelation] = []
+
+
+class PerceptualModelBatchEntry(PerceptualModelBase):
+    id: int
+    location_id: int
+    citation_id: int
+    spatialzone_id: int
+    temporalzone_id: int
+    model_type_id: int | None = None
+    # only the requested relations are present
+    location: Location | None = None
+    citation: Citation | None = None
+    spatial_zone_type: SpatialZoneType | None = None
+    temporal_zone_type: TemporalZoneType | None = None
+    model_type: ModelType | None = None
+    process_taxonomies: list["ProcessTaxonomy"] | None = None
+
+
+class PerceptualModelBatch(BaseModel):
+    # keyed by id, in the order requested
+    models: dict[int, PerceptualModelBatchEntry]
+    # the requested ids without a perceptual model
+    missing: list[int]
+
+
+class FacetCount(BaseModel):
+    id: int
+    count: int
+
+
+class FacetCounts(BaseModel):
+    total: int
+    model_types: list[FacetCount]
+    spatial_zones: list[FacetCount]
+    temporal_zones: list[FacetCount]
+    process_taxonomies: list[FacetCount]
+
+
+class ProcessTaxonomyNode(BaseModel):
+    # None for the levels of the hierarchy without an entry of their own
+    id: int | None = None
+    identifier: str
+    # the process name, or the last part of the identifier when there is no entry
+    title: str
+    process_level: float | None = None
+    children: list["ProcessTaxonomyNode"] = []
@@ -0,0 +1,93 @@
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool
+
+# upper bounds, in seconds, of the checkout wait histogram buckets
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float("inf"))
+
+
+class PoolMetrics:
+    """
+    Counters of connection pool activity, used to size the pool and the worker count against max_connections.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.wait_buckets = [0] * len(WAIT_BUCKETS)
+        self.timeouts = 0
+        self.connects = 0
+        self.overflow_connects = 0
+        self.invalidations = 0
+
+    def observe_checkout(self, seconds: float, connected: bool, overflow: bool):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            self.wait_buckets[next(i for i, bound in enumerate(WAIT_BUCKETS) if seconds <= bound)] += 1
+            self.connects += connected
+            self.overflow_connects += overflow
+
+    def observe_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def observe_invalidation(self):
+        with self._lock:
+            self.invalidations += 1
+
+    def stats(self, pool: Pool) -> dict:
+        with self._lock:
+            return {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "checkouts": self.checkouts,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_seconds_max": self.wait_seconds_max,
+                "wait_seconds_mean": self.wait_seconds_total / self.checkouts if self.checkouts else 0.0,
+                # cumulative counts, like a prometheus histogram
+                "wait_seconds_buckets": {
+                    "+Inf" if bound == float("inf") else str(bound): sum(self.wait_buckets[: i + 1])
+                    for i, bound in enumerate(WAIT_BUCKETS)
+                },
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "overflow_connects": self.overflow_connects,
+                "invalidations": self.invalidations,
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool recording how long every checkout waits for a connection and when it has to open a new one.
+    """
+
+    def _do_get(self):
+        opened = self.overflow()
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.observe_timeout()
+            raise
+        # the overflow counter starts at -pool_size and goes up with every connection opened
+        connected = self.overflow() > opened
+        pool_metrics.observe_checkout(time.perf_counter() - start, connected, connected and self.overflow() > 0)
+        return connection
+
+
+def count_invalidations(engine):
+    """
+    Count the connections of `engine` dropped after a failed pre-ping or a disconnect error.
+    """
+    event.listen(engine.sync_engine, "invalidate", lambda *args: pool_metrics.observe_invalidation())
@@ -0,0 +1,55 @@
+"""
+Denormalized read model of the perceptual models.
+
+Every read of a perceptual model used to join it with its location, citation, zone types, model type and
+processes. The read model holds one row per model instead, with the ids of its relations, the array of its
+process ids, the text matched by the search filters and its GeoJSON feature and geometry rendered once, so the
+search, statistics and bulk geojson endpoints scan a single table.
+
+Every perceptual model has a row, whether or not its relations exist, while its feature and geometry are NULL
+when it is located without a point.
+
+It is a materialized view, created along with the tables and refreshed concurrently, i.e. without blocking its
+readers, by a single worker before every new dataset version is published: responses cached under a version are
+always built from a read model at least as recent as that version.
+"""
+
+from sqlalchemy import DDL, event, text
+from sqlmodel import SQLModel
+
+from app.cache import dataset_version
+from app.db import engine, materialized_view_ddl, view_version
+from app.geojson import FEATURE_FROM, FEATURE_JSON, GEOMETRY_JSON
+from app.models import perceptual_model_read
+
+READ_MODEL = perceptual_model_read.name
+
+READ_MODEL_SQL = f"""
+    SELECT pm.id, pm.location_id, pm.citation_id, pm.spatialzone_id, pm.temporalzone_id, pm.model_type_id,
+           coalesce(processes.ids, '{{}}') AS process_taxonomy_ids,
+           l.pt,
+           {GEOMETRY_JSON} AS geometry,
+           {FEATURE_JSON} AS feature,
+           l.long_name, c.citation, pm.textmodel_snipped, processes.names AS processes,
+           sz.spatial_property, tz.temporal_property
+    FROM {FEATURE_FROM}
+"""
+
+READ_MODEL_VERSION = view_version(READ_MODEL_SQL)
+
+READ_MODEL_DDL = [
+    *materialized_view_ddl(READ_MODEL, READ_MODEL_SQL),
+    # a unique index is what allows refreshing the view concurrently
+    DDL(f"CREATE UNIQUE INDEX IF NOT EXISTS ix_{READ_MODEL}_id ON {READ_MODEL} (id)"),
+    DDL(f"CREATE INDEX IF NOT EXISTS ix_{READ_MODEL}_processes ON {READ_MODEL} USING gin (process_taxonomy_ids)"),
+    DDL(f"CREATE INDEX IF NOT EXISTS ix_{READ_MODEL}_pt ON {READ_MODEL} USING gist (pt)"),
+]
+
+for statement in READ_MODEL_DDL:
+    event.listen(SQLModel.metadata, "after_create", statement)
+
+
+@dataset_version.prepare_database
+async def refresh_read_model():
+    async with engine.begin() as connection:
+        await connection.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {READ_MODEL}"))
@@ -0,0 +1,129 @@
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Query
+from fastapi.responses import FileResponse, RedirectResponse
+from sqlmodel import select
+
+from app.db import get_async_session
+from app.figures import (
+    FIGURE_EXTENSIONS,
+    FIGURE_MEDIA_TYPES,
+    FigureFormat,
+    citation_figure,
+    figure_variant,
+    snap_width,
+    variant_path,
+)
+from app.metrics import InstrumentedRoute
+from app.models import PerceptualModel
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+# variants are named after their content and never change
+IMMUTABLE = "public, max-age=31536000, immutable"
+# the figure of a citation may change with the dataset
+REDIRECT_MAX_AGE = "public, max-age=300"
+
+VARIANT_NAME = r"^[0-9a-f]{32}-v\d+-(\d+|full)\.(" + "|".join(FIGURE_EXTENSIONS.values()) + r")$"
+
+
+async def _redirect_to_variant(
+    session, citation_id: int, width: int | None, output_format: FigureFormat
+) -> RedirectResponse:
+    path = await citation_figure(session, citation_id)
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"Citation {citation_id} has no figure")
+    name = await figure_variant(path, snap_width(width), output_format)
+    # relative to the figure endpoints, so the redirect holds behind a proxy serving the api under a prefix
+    return RedirectResponse(
+        f"../variants/{name}",
+        status_code=307,
+        headers={"Cache-Control": REDIRECT_MAX_AGE},
+    )
+
+
+@router.get(
+    "/citation/{citation_id}",
+    description="Get the figure of a citation, resized and re-encoded.",
+    response_class=RedirectResponse,
+    status_code=307,
+)
+async def get_citation_figure(
+    *,
+    citation_id: int,
+    width: int | None = Query(default=None, ge=1),
+    output_format: FigureFormat = Query(default="webp", alias="format"),
+    session=Depends(get_async_session),
+):
+    """
+    Get the figure of a citation, as a redirect to its variant of the requested width and format.
+
+    Parameters:
+    - citation_id: The ID of the citation to get the figure of.
+    - width: The width of the figure, rounded up to the closest width generated. The full size when unset, or
+      larger than every width generated.
+    - output_format: "webp", or "jpeg" for clients without WebP support.
+    - session: The async session to use for database operations.
+
+    Returns:
+    - A redirect to the immutable URL of the variant.
+    """
+    return await _redirect_to_variant(session, citation_id, width, output_format)
+
+
+@router.get(
+    "/perceptual_model/{model_id}",
+    description="Get the figure of a perceptual model, resized and re-encoded.",
+    response_class=RedirectResponse,
+    status_code=307,
+)
+async def get_perceptual_model_figure(
+    *,
+    model_id: int,
+    width: int | None = Query(default=None, ge=1),
+    output_format: FigureFormat = Query(default="webp", alias="format"),
+    session=Depends(get_async_session),
+):
+    """
+    Get the figure of a perceptual model, i.e. of its citation, as a redirect to its variant of the requested
+    width and format.
+
+    Parameters:
+    - model_id: The ID of the perceptual model to get the figure of.
+    - width: The width of the figure, rounded up to the closest width generated. The full size when unset, or
+      larger than every width generated.
+    - output_format: "webp", or "jpeg" for clients without WebP support.
+    - session: The async session to use for database operations.
+
+    Returns:
+    - A redirect to the immutable URL of the variant.
+    """
+    citation_id = (
+        await session.exec(select(PerceptualModel.citation_id).where(PerceptualModel.id == model_id))
+    ).one_or_none()
+    if citation_id is None:
+        raise HTTPException(status_code=404, detail=f"Perceptual model {model_id} does not exist")
+    return await _redirect_to_variant(session, citation_id, width, output_format)
+
+
+@router.get(
+    "/variants/{name}",
+    description="Get a variant of a figure by name.",
+    response_class=FileResponse,
+)
+async def get_figure_variant(name: str = Path(pattern=VARIANT_NAME)):
+    """
+    Get a variant of a figure, as named by the redirects of the figure endpoints.
+
+    Parameters:
+    - name: The name of the variant, derived from the content of the figure, its width and format.
+
+    Returns:
+    - The image, cacheable for a year.
+    """
+    path = variant_path(name)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"Figure variant {name} does not exist")
+    extension = name.rsplit(".", 1)[1]
+    media_type = next(FIGURE_MEDIA_TYPES[key] for key, value in FIGURE_EXTENSIONS.items() if value == extension)
+    return FileResponse(path, media_type=media_type, headers={"Cache-Control": IMMUTABLE})
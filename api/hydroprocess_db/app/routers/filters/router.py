@@ -1,12 +1,19 @@
 from typing import List
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from sqlmodel import select
 
-from app.db import get_session
-from app.models import ProcessTaxonomy, SpatialZoneType, TemporalZoneType
+from app.cache import cached_response, dump_json
+from app.db import get_async_session
+from app.metrics import InstrumentedRoute
+from app.models import ProcessTaxonomy, ProcessTaxonomyNode, SpatialZoneType, TemporalZoneType
+from app.taxonomy import build_taxonomy_tree
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
+
+
+async def _dump_all(session, model) -> bytes:
+    return dump_json(List[model], (await session.exec(select(model))).all())
 
 
 @router.get(
@@ -14,18 +21,50 @@ router = APIRouter()
     description="Get all process taxonomy entries.",
     response_model=List[ProcessTaxonomy],
 )
-def get_process_taxonomy_entries(*, session=Depends(get_session)):
+async def get_process_taxonomy_entries(*, request: Request, session=Depends(get_async_session)):
     """
     Get process taxonomy entries from the database.
 
     Parameters:
+    - request: The incoming request, used for conditional requests and content negotiation.
     - session: The async session to use for database operations.
 
     Returns:
     - A list of process taxonomy entries.
     """
-    process_taxonomy_entries = session.exec(select(ProcessTaxonomy)).all()
-    return process_taxonomy_entries
+    return await cached_response(
+        request,
+        "filters/process_taxonomies",
+        lambda: _dump_all(session, ProcessTaxonomy),
+    )
+
+
+async def _dump_tree(session) -> bytes:
+    entries = (await session.exec(select(ProcessTaxonomy))).all()
+    return dump_json(List[ProcessTaxonomyNode], build_taxonomy_tree(entries))
+
+
+@router.get(
+    "/process_taxonomy_tree",
+    description="Get the process taxonomy entries arranged in a tree following their identifiers.",
+    response_model=List[ProcessTaxonomyNode],
+)
+async def get_process_taxonomy_tree(*, request: Request, session=Depends(get_async_session)):
+    """
+    Get the hierarchy of the process taxonomy, e.g. `Chan.Flow.Quick` under `Chan.Flow` under `Chan`.
+
+    Parameters:
+    - request: The incoming request, used for conditional requests and content negotiation.
+    - session: The async session to use for database operations.
+
+    Returns:
+    - The root nodes of the tree. Levels of the hierarchy without an entry of their own have no id.
+    """
+    return await cached_response(
+        request,
+        "filters/process_taxonomy_tree",
+        lambda: _dump_tree(session),
+    )
 
 
 @router.get(
@@ -33,18 +72,22 @@ def get_process_taxonomy_entries(*, session=Depends(get_session)):
     description="Get all spatial zone types",
     response_model=List[SpatialZoneType],
 )
-def get_spatial_zones_entries(*, session=Depends(get_session)):
+async def get_spatial_zones_entries(*, request: Request, session=Depends(get_async_session)):
     """
     Get spatial zone types from the database.
 
     Parameters:
+    - request: The incoming request, used for conditional requests and content negotiation.
     - session: The async session to use for database operations.
 
     Returns:
     - A list of spatial zone types.
     """
-    spatial_zone_types = session.exec(select(SpatialZoneType)).all()
-    return spatial_zone_types
+    return await cached_response(
+        request,
+        "filters/spatial_zones",
+        lambda: _dump_all(session, SpatialZoneType),
+    )
 
 
 @router.get(
@@ -52,15 +95,19 @@ def get_spatial_zones_entries(*, session=Depends(get_session)):
     description="Get all temporal zone types",
     response_model=List[TemporalZoneType],
 )
-def get_temporal_zones_entries(*, session=Depends(get_session)):
+async def get_temporal_zones_entries(*, request: Request, session=Depends(get_async_session)):
     """
     Get temporal zone types from the database.
 
     Parameters:
+    - request: The incoming request, used for conditional requests and content negotiation.
     - session: The async session to use for database operations.
 
     Returns:
     - A list of temporal zone types.
     """
-    temporal_zone_types = session.exec(select(TemporalZoneType)).all()
-    return temporal_zone_types
+    return await cached_response(
+        request,
+        "filters/temporal_zones",
+        lambda: _dump_all(session, TemporalZoneType),
+    )
@@ -1,43 +1,277 @@
-from typing import List
+from typing import List, Literal
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import raiseload, selectinload
 from sqlmodel import select
 
-from app.db import get_session
+from app.cache import cached_response, dump_json
+from app.db import get_async_session, select_perceptual_model_features, select_perceptual_models
+from app.export import EXPORT_EXTENSIONS, EXPORT_MEDIA_TYPES, ExportFormat, stream_export
+from app.facet_index import SimilarityMetric, current_facet_index
+from app.features import batch_entry, compact_collection, dumps, feature, feature_collection, feature_response
+from app.geojson import feature_collection_json, join_features
+from app.metrics import InstrumentedRoute
 from app.models import (
     Citation,
+    CompactPerceptualModels,
     GeoJsonFeature,
     GeoJsonFeatureCollection,
     Location,
     ModelType,
     PerceptualModel,
+    PerceptualModelBatch,
+    PerceptualModelBatchRequest,
     PerceptualModelRecursive,
+    PerceptualModelSearchRequest,
+    PerceptualModelSearchResults,
+    PerceptualModelTextSearchResults,
     ProcessTaxonomy,
+    SimilarPerceptualModels,
     SpatialZoneType,
     TemporalZoneType,
-    WKBToGeoJSON,
+    check_bbox,
+    perceptual_model_load_options,
+    perceptual_model_read,
 )
+from app.search import search_perceptual_model_ids
+from app.spatial import select_nearest, select_within_bbox, select_within_radius
+from app.streaming import NDJSON_MEDIA_TYPE, feature_collection_response, ndjson_response
+from app.tiles import is_valid_tile, perceptual_model_tile
+from config import get_settings
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
+
+
+@router.post(
+    "/search",
+    description="Search perceptual models by zone, process, bounding box and free text, one page at a time.",
+    response_model=PerceptualModelSearchResults,
+)
+async def search_perceptual_models(request: PerceptualModelSearchRequest, session=Depends(get_async_session)):
+    """
+    Search perceptual models, filtering the read model and paginating on the model id.
+
+    Parameters:
+    - request: The filters along with the page size (limit) and the cursor returned with the previous page.
+    - session: The async session to use for database operations.
+
+    Returns:
+    - A page of matching perceptual models as geojson features, along with the cursor of the next page.
+    """
+    read = perceptual_model_read.c
+    query = select(read.id, read.feature).where(read.feature.is_not(None), *request.filters())
+    if request.cursor is not None:
+        query = query.where(read.id > request.cursor)
+    rows = (await session.exec(query.order_by(read.id).limit(request.limit + 1))).all()
+
+    page = rows[: request.limit]
+    next_cursor = page[-1].id if len(rows) > request.limit else None
+    return Response(
+        content=join_features([row.feature for row in page], next_cursor=next_cursor), media_type="application/json"
+    )
+
+
+@router.get(
+    "/text_search",
+    description="Full-text search over perceptual models, their citations, locations and processes, best match first.",
+    response_model=PerceptualModelTextSearchResults,
+)
+async def text_search_perceptual_models(
+    q: str = Query(min_length=1),
+    limit: int = Query(default=50, ge=1, le=500),
+    offset: int = Query(default=0, ge=0),
+    session=Depends(get_async_session),
+):
+    """
+    Full-text search over perceptual models, ranked by relevance.
+
+    Parameters:
+    - q: A web-search style query, e.g. `"saturation excess" -karst`.
+    - limit: The maximum number of results.
+    - offset: The number of results to skip.
+    - session: The async session to use for database operations.
+
+    Returns:
+    - The matching perceptual models as geojson features carrying their rank, along with the offset of the next page.
+    """
+    hits = await search_perceptual_model_ids(session, q, limit=limit + 1, offset=offset)
+    ranks = dict(hits[:limit])
+    perceptual_models = (
+        await session.exec(select_perceptual_model_features().where(PerceptualModel.id.in_(ranks)))
+    ).all()
+
+    features = [feature(pmodel, rank=ranks[pmodel.id]) for pmodel in perceptual_models]
+    features.sort(key=lambda ranked: (-ranked["rank"], ranked["properties"]["id"]))
+    next_offset = offset + limit if len(hits) > limit else None
+    return feature_response(feature_collection(features, next_offset=next_offset))
+
+
+async def _feature_collection(session, query) -> Response:
+    perceptual_models = (await session.exec(query)).all()
+    return feature_response(feature_collection([feature(pmodel) for pmodel in perceptual_models]))
+
+
+@router.get(
+    "/within_bbox",
+    description="Get the perceptual models located within a bounding box, as geojson.",
+    response_model=GeoJsonFeatureCollection,
+)
+async def get_perceptual_models_within_bbox(
+    min_lon: float = Query(ge=-180, le=180),
+    min_lat: float = Query(ge=-90, le=90),
+    max_lon: float = Query(ge=-180, le=180),
+    max_lat: float = Query(ge=-90, le=90),
+    session=Depends(get_async_session),
+):
+    """
+    Get the perceptual models located within a bounding box, as geojson.
+
+    Parameters:
+    - min_lon, min_lat, max_lon, max_lat: The bounding box, in degrees, with its minimums below its maximums: a
+      box crossing the antimeridian is to be requested as two boxes.
+    - session: The async session to use for database operations.
+
+    Returns:
+    - The perceptual models within the bounding box.
+    """
+    try:
+        check_bbox(min_lon, min_lat, max_lon, max_lat)
+    except ValueError as error:
+        raise HTTPException(status_code=422, detail=str(error))
+    return await _feature_collection(session, select_within_bbox(min_lon, min_lat, max_lon, max_lat))
+
+
+@router.get(
+    "/within_radius",
+    description="Get the perceptual models located within a radius of a point, closest first, as geojson.",
+    response_model=GeoJsonFeatureCollection,
+)
+async def get_perceptual_models_within_radius(
+    lon: float = Query(ge=-180, le=180),
+    lat: float = Query(ge=-90, le=90),
+    radius_km: float = Query(gt=0),
+    session=Depends(get_async_session),
+):
+    """
+    Get the perceptual models located within a radius of a point, closest first, as geojson.
+
+    Parameters:
+    - lon, lat: The point, in degrees.
+    - radius_km: The radius, in kilometers.
+    - session: The async session to use for database operations.
+
+    Returns:
+    - The perceptual models within the radius, ordered by distance.
+    """
+    return await _feature_collection(session, select_within_radius(lon, lat, radius_km))
+
+
+@router.get(
+    "/nearest",
+    description="Get the k perceptual models closest to a point, closest first, as geojson.",
+    response_model=GeoJsonFeatureCollection,
+)
+async def get_nearest_perceptual_models(
+    lon: float = Query(ge=-180, le=180),
+    lat: float = Query(ge=-90, le=90),
+    k: int = Query(default=10, ge=1, le=1000),
+    session=Depends(get_async_session),
+):
+    """
+    Get the k perceptual models closest to a point, closest first, as geojson.
+
+    Parameters:
+    - lon, lat: The point, in degrees.
+    - k: The number of perceptual models to return.
+    - session: The async session to use for database operations.
+
+    Returns:
+    - The k nearest perceptual models, ordered by distance.
+    """
+    return await _feature_collection(session, select_nearest(lon, lat, k))
+
+
+@router.get(
+    "/tiles/{z}/{x}/{y}.mvt",
+    description="Get a Mapbox Vector Tile of the perceptual model locations, clustered at low zoom levels.",
+    response_class=Response,
+    responses={200: {"content": {"application/vnd.mapbox-vector-tile": {}}}},
+)
+async def get_perceptual_model_tile(
+    *, request: Request, z: int = Path(ge=0, le=22), x: int, y: int, session=Depends(get_async_session)
+):
+    """
+    Get a vector tile of the perceptual model locations.
+
+    Parameters:
+    - request: The incoming request, used for conditional requests and content negotiation.
+    - z, x, y: The tile coordinates, in the XYZ (slippy map) scheme.
+    - session: The async session to use for database operations.
+
+    Returns:
+    - The vector tile.
+    """
+    if not is_valid_tile(z, x, y):
+        raise HTTPException(status_code=404, detail=f"Tile {z}/{x}/{y} does not exist")
+    return await cached_response(
+        request,
+        f"perceptual_model/tiles/{z}/{x}/{y}.mvt",
+        lambda: perceptual_model_tile(session, z, x, y),
+        media_type="application/vnd.mapbox-vector-tile",
+    )
+
+
+async def _compact_response(request: Request, session) -> Response:
+    async def build():
+        perceptual_models = (await session.exec(select_perceptual_models())).all()
+        return dumps(compact_collection(perceptual_models))
+
+    # the same document serves every bulk listing
+    return await cached_response(request, "perceptual_model?format=compact", build)
 
 
 @router.get(
     "/recursive",
     description="Get all perceptual models along with their nested relations.",
-    response_model=List[PerceptualModelRecursive],
+    response_model=List[PerceptualModelRecursive] | CompactPerceptualModels,
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}},
 )
-def get_perceptual_models_recursive(*, session=Depends(get_session)):
+async def get_perceptual_models_recursive(
+    *,
+    request: Request,
+    output_format: Literal["nested", "compact", "ndjson"] = Query(default="nested", alias="format"),
+    session=Depends(get_async_session),
+):
     """
     Get perceptual models from the database.
 
     Parameters:
+    - request: The incoming request, used for conditional requests and content negotiation.
+    - output_format: Embed the relations in every model ("nested"), send them once as lookups ("compact"), or
+      stream the nested models one per line as they are read ("ndjson").
     - session: The async session to use for database operations.
 
     Returns:
     - A list of perceptual models.
     """
-    models = session.exec(select(PerceptualModel))
-    return models
+    if output_format == "compact":
+        return await _compact_response(request, session)
+    if output_format == "ndjson":
+        return ndjson_response(select_perceptual_models(), lambda pmodel: dump_json(PerceptualModelRecursive, pmodel))
+
+    async def build():
+        perceptual_models = (await session.exec(select_perceptual_models())).all()
+        return dump_json(List[PerceptualModelRecursive], perceptual_models)
+
+    return await cached_response(request, "perceptual_model/recursive", build)
+
+
+async def _get_model(session, model_id: int, options: list | None = None) -> PerceptualModel:
+    model = await session.get(PerceptualModel, model_id, options=options)
+    if model is None:
+        raise HTTPException(status_code=404, detail=f"Perceptual model {model_id} does not exist")
+    return model
 
 
 @router.get(
@@ -45,7 +279,7 @@ def get_perceptual_models_recursive(*, session=Depends(get_session)):
     description="Get a perceptual model by ID along with its nested relations.",
     response_model=PerceptualModelRecursive,
 )
-def get_perceptual_model_by_id_recursive(model_id: int, session=Depends(get_session)):
+async def get_perceptual_model_by_id_recursive(model_id: int, session=Depends(get_async_session)):
     """
     Get a perceptual model by ID along with its nested relations.
 
@@ -56,34 +290,82 @@ def get_perceptual_model_by_id_recursive(model_id: int, session=Depends(get_sess
     Returns:
     - The perceptual model with the specified ID.
     """
-    model = session.get(PerceptualModel, model_id)
-    return model
+    return await _get_model(session, model_id, perceptual_model_load_options())
 
 
 @router.get(
     "/geojson",
     description="Get all perceptual models along with their nested relations, as geojson.",
-    response_model=GeoJsonFeatureCollection,
+    response_model=GeoJsonFeatureCollection | CompactPerceptualModels,
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}},
 )
-def get_perceptual_models_geojson(*, session=Depends(get_session)):
+async def get_perceptual_models_geojson(
+    *,
+    request: Request,
+    engine: Literal["python", "postgis"] = "python",
+    output_format: Literal["nested", "compact", "ndjson"] = Query(default="nested", alias="format"),
+    stream: bool = False,
+    session=Depends(get_async_session),
+):
     """
     Get perceptual models from the database.
 
     Parameters:
+    - request: The incoming request, used for conditional requests and content negotiation.
+    - engine: Build the FeatureCollection in python ("python") or let PostGIS render the whole document ("postgis").
+    - output_format: A FeatureCollection embedding the relations in every feature ("nested"), or the models with
+      their relations sent once as lookups and their coordinates packed in a flat array ("compact"), or the
+      features one per line ("ndjson").
+    - stream: Write the nested FeatureCollection out feature by feature as the models are read, rather than
+      building the whole document first.
     - session: The async session to use for database operations.
 
     Returns:
     - A list of perceptual models.
     """
-    perceptual_models = session.exec(select(PerceptualModel)).all()
+    if output_format == "compact":
+        return await _compact_response(request, session)
+    if output_format == "ndjson":
+        return ndjson_response(select_perceptual_model_features(), lambda pmodel: dumps(feature(pmodel)))
+    if stream:
+        return feature_collection_response()
+    if engine == "postgis":
+        return await cached_response(
+            request, "perceptual_model/geojson?engine=postgis", lambda: feature_collection_json(session)
+        )
+
+    async def build():
+        perceptual_models = (await session.exec(select_perceptual_model_features())).all()
 
-    features = []
-    for pmodel in perceptual_models:
-        geometry = WKBToGeoJSON.from_WKBElement(pmodel.location.pt)
-        feature = GeoJsonFeature(type="Feature", geometry=geometry, properties=pmodel.get_feature_properties())
-        features.append(feature)
-    geojson = GeoJsonFeatureCollection(type="FeatureCollection", features=features)
-    return geojson
+        return dumps(feature_collection([feature(pmodel) for pmodel in perceptual_models]))
+
+    return await cached_response(request, "perceptual_model/geojson?engine=python", build)
+
+
+@router.get(
+    "/export",
+    description="Export all perceptual models, flattened, as an Arrow IPC stream or a GeoParquet file.",
+    response_class=StreamingResponse,
+    responses={200: {"content": {media_type: {} for media_type in EXPORT_MEDIA_TYPES.values()}}},
+)
+async def export_perceptual_models(
+    output_format: ExportFormat = Query(default="parquet", alias="format"),
+):
+    """
+    Export all perceptual models, one row per model along with its citation, location, zones, model type and
+    processes, streamed batch by batch.
+
+    Parameters:
+    - output_format: An Arrow IPC stream ("arrow") or a GeoParquet file ("parquet").
+
+    Returns:
+    - The perceptual models, as an attachment.
+    """
+    return StreamingResponse(
+        stream_export(output_format, get_settings().stream_batch_size),
+        media_type=EXPORT_MEDIA_TYPES[output_format],
+        headers={"Content-Disposition": f'attachment; filename="perceptual_models.{EXPORT_EXTENSIONS[output_format]}"'},
+    )
 
 
 @router.get(
@@ -91,7 +373,7 @@ def get_perceptual_models_geojson(*, session=Depends(get_session)):
     description="Get a perceptual model by ID along with its nested relations, as geojson.",
     response_model=GeoJsonFeature,
 )
-def get_perceptual_model_by_id_geojson(model_id: int, session=Depends(get_session)):
+async def get_perceptual_model_by_id_geojson(model_id: int, session=Depends(get_async_session)):
     """
     Get a perceptual model by ID along with its nested relations, as geojson.
 
@@ -100,33 +382,84 @@ def get_perceptual_model_by_id_geojson(model_id: int, session=Depends(get_sessio
     - session: The async session to use for database operations.
 
     Returns:
-    - The perceptual model with the specified ID.
+    - The perceptual model with the specified ID, which is not found when it is not located at a point, as it
+      has no feature.
     """
-    pmodel = session.get(PerceptualModel, model_id)
-
-    geometry = WKBToGeoJSON.from_WKBElement(pmodel.location.pt)
-    feature = {"type": "Feature", "geometry": geometry, "properties": pmodel.get_feature_properties()}
+    pmodel = await _get_model(session, model_id, perceptual_model_load_options())
+    if pmodel.location is None or pmodel.location.pt is None:
+        raise HTTPException(status_code=404, detail=f"Perceptual model {model_id} is not located at a point")
 
-    return GeoJsonFeature(**feature)
+    return feature_response(feature(pmodel))
 
 
 @router.get(
     "/",
     description="Get all perceptual models.",
     response_model=List[PerceptualModel],
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}},
 )
-def get_perceptual_models(*, session=Depends(get_session)):
+async def get_perceptual_models(
+    *,
+    request: Request,
+    output_format: Literal["json", "ndjson"] = Query(default="json", alias="format"),
+    session=Depends(get_async_session),
+):
     """
     Get perceptual models from the database.
 
     Parameters:
+    - request: The incoming request, used for conditional requests and content negotiation.
+    - output_format: A JSON array ("json"), or the models streamed one per line as they are read ("ndjson").
     - session: The async session to use for database operations.
 
     Returns:
     - A list of perceptual models.
     """
-    models = session.exec(select(PerceptualModel))
-    return models
+    if output_format == "ndjson":
+        return ndjson_response(
+            select(PerceptualModel).order_by(PerceptualModel.id), lambda pmodel: dump_json(PerceptualModel, pmodel)
+        )
+
+    async def build():
+        perceptual_models = (await session.exec(select(PerceptualModel).order_by(PerceptualModel.id))).all()
+        return dump_json(List[PerceptualModel], perceptual_models)
+
+    return await cached_response(request, "perceptual_model/", build)
+
+
+@router.post(
+    "/batch",
+    description="Get many perceptual models by ID along with the requested relations.",
+    response_model=PerceptualModelBatch,
+)
+async def get_perceptual_models_batch(request: PerceptualModelBatchRequest, session=Depends(get_async_session)):
+    """
+    Get many perceptual models by ID along with the requested relations, in one query for the models and one
+    IN query per requested relation, whatever the number of ids.
+
+    Parameters:
+    - request: The ids of the perceptual models, and the relations to get along with them.
+    - session: The async session to use for database operations.
+
+    Returns:
+    - The perceptual models keyed by id, in the order requested, and the requested ids without a perceptual
+      model.
+    """
+    ids = list(dict.fromkeys(request.ids))
+    relations = list(dict.fromkeys(request.relations))
+    query = (
+        select(PerceptualModel)
+        .where(PerceptualModel.id.in_(ids))
+        .options(*(selectinload(getattr(PerceptualModel, name)) for name in relations), raiseload("*"))
+    )
+    pmodels = {pmodel.id: pmodel for pmodel in (await session.exec(query)).all()}
+
+    return feature_response(
+        {
+            "models": {model_id: batch_entry(pmodels[model_id], relations) for model_id in ids if model_id in pmodels},
+            "missing": [model_id for model_id in ids if model_id not in pmodels],
+        }
+    )
 
 
 @router.get(
@@ -134,7 +467,7 @@ def get_perceptual_models(*, session=Depends(get_session)):
     description="Get a perceptual model by ID.",
     response_model=PerceptualModel,
 )
-async def get_perceptual_model_by_id(model_id: int, session=Depends(get_session)):
+async def get_perceptual_model_by_id(model_id: int, session=Depends(get_async_session)):
     """
     Get a perceptual model by ID.
 
@@ -145,8 +478,12 @@ async def get_perceptual_model_by_id(model_id: int, session=Depends(get_session)
     Returns:
     - The perceptual model with the specified ID.
     """
-    model = session.get(PerceptualModel, model_id)
-    return model
+    return await _get_model(session, model_id)
+
+
+async def _get_relation(session, model_id: int, relationship):
+    model = await _get_model(session, model_id, [selectinload(relationship)])
+    return getattr(model, relationship.key)
 
 
 @router.get(
@@ -154,7 +491,7 @@ async def get_perceptual_model_by_id(model_id: int, session=Depends(get_session)
     description="Get the location for a perceptual model by ID.",
     response_model=Location | None,
 )
-async def get_perceptual_model_location(model_id: int, session=Depends(get_session)):
+async def get_perceptual_model_location(model_id: int, session=Depends(get_async_session)):
     """
     Get the location for a perceptual model by ID.
 
@@ -165,9 +502,7 @@ async def get_perceptual_model_location(model_id: int, session=Depends(get_sessi
     Returns:
     - The location for the perceptual model with the specified ID.
     """
-    model = session.get(PerceptualModel, model_id)
-    location = model.location
-    return location
+    return await _get_relation(session, model_id, PerceptualModel.location)
 
 
 @router.get(
@@ -175,7 +510,7 @@ async def get_perceptual_model_location(model_id: int, session=Depends(get_sessi
     description="Get the citation for a perceptual model by ID.",
     response_model=Citation | None,
 )
-async def get_perceptual_model_citation(model_id: int, session=Depends(get_session)):
+async def get_perceptual_model_citation(model_id: int, session=Depends(get_async_session)):
     """
     Get the citation for a perceptual model by ID.
 
@@ -186,9 +521,7 @@ async def get_perceptual_model_citation(model_id: int, session=Depends(get_sessi
     Returns:
     - The citation for the perceptual model with the specified ID.
     """
-    model = session.get(PerceptualModel, model_id)
-    citation = model.citation
-    return citation
+    return await _get_relation(session, model_id, PerceptualModel.citation)
 
 
 @router.get(
@@ -196,7 +529,7 @@ async def get_perceptual_model_citation(model_id: int, session=Depends(get_sessi
     description="Get the spatial zone type for a perceptual model by ID.",
     response_model=SpatialZoneType | None,
 )
-async def get_perceptual_model_spatial_zone_type(model_id: int, session=Depends(get_session)):
+async def get_perceptual_model_spatial_zone_type(model_id: int, session=Depends(get_async_session)):
     """
     Get the spatial zone type for a perceptual model by ID.
 
@@ -207,9 +540,7 @@ async def get_perceptual_model_spatial_zone_type(model_id: int, session=Depends(
     Returns:
     - The spatial zone type for the perceptual model with the specified ID.
     """
-    model = session.get(PerceptualModel, model_id)
-    spatial_zone_type = model.spatial_zone_type
-    return spatial_zone_type
+    return await _get_relation(session, model_id, PerceptualModel.spatial_zone_type)
 
 
 @router.get(
@@ -217,7 +548,7 @@ async def get_perceptual_model_spatial_zone_type(model_id: int, session=Depends(
     description="Get the temporal zone type for a perceptual model by ID.",
     response_model=TemporalZoneType | None,
 )
-async def get_perceptual_model_temporal_zone_type(model_id: int, session=Depends(get_session)):
+async def get_perceptual_model_temporal_zone_type(model_id: int, session=Depends(get_async_session)):
     """
     Get the temporal zone type for a perceptual model by ID.
 
@@ -228,9 +559,7 @@ async def get_perceptual_model_temporal_zone_type(model_id: int, session=Depends
     Returns:
     - The temporal zone type for the perceptual model with the specified ID.
     """
-    model = session.get(PerceptualModel, model_id)
-    temporal_zone_type = model.temporal_zone_type
-    return temporal_zone_type
+    return await _get_relation(session, model_id, PerceptualModel.temporal_zone_type)
 
 
 @router.get(
@@ -238,7 +567,7 @@ async def get_perceptual_model_temporal_zone_type(model_id: int, session=Depends
     description="Get the model type for a perceptual model by ID.",
     response_model=ModelType | None,
 )
-async def get_perceptual_model_model_type(model_id: int, session=Depends(get_session)):
+async def get_perceptual_model_model_type(model_id: int, session=Depends(get_async_session)):
     """
     Get the model type for a perceptual model by ID.
 
@@ -249,9 +578,7 @@ async def get_perceptual_model_model_type(model_id: int, session=Depends(get_ses
     Returns:
     - The model type for the perceptual model with the specified ID.
     """
-    model = session.get(PerceptualModel, model_id)
-    model_type = model.model_type
-    return model_type
+    return await _get_relation(session, model_id, PerceptualModel.model_type)
 
 
 @router.get(
@@ -259,7 +586,7 @@ async def get_perceptual_model_model_type(model_id: int, session=Depends(get_ses
     description="Get the process taxonomies for a perceptual model by ID.",
     response_model=List[ProcessTaxonomy] | None,
 )
-async def get_perceptual_model_process_taxonomies(model_id: int, session=Depends(get_session)):
+async def get_perceptual_model_process_taxonomies(model_id: int, session=Depends(get_async_session)):
     """
     Get the process taxonomies for a perceptual model by ID.
 
@@ -270,6 +597,62 @@ async def get_perceptual_model_process_taxonomies(model_id: int, session=Depends
     Returns:
     - The process taxonomies for the perceptual model with the specified ID.
     """
-    model = session.get(PerceptualModel, model_id)
-    process_taxonomies = model.process_taxonomies
-    return process_taxonomies
+    return await _get_relation(session, model_id, PerceptualModel.process_taxonomies)
+
+
+@router.get(
+    "/{model_id}/similar",
+    description="Get the perceptual models most similar to a perceptual model by processes and zones, optionally "
+    "weighing in the distance between their locations, best first, as geojson.",
+    response_model=SimilarPerceptualModels,
+)
+async def get_similar_perceptual_models(
+    model_id: int,
+    k: int = Query(default=10, ge=1, le=100),
+    metric: SimilarityMetric = "jaccard",
+    weighted: bool = True,
+    distance_weight: float = Query(default=0.0, ge=0, le=1),
+    distance_scale_km: float = Query(default=500.0, gt=0),
+    session=Depends(get_async_session),
+):
+    """
+    Get the perceptual models most similar to a perceptual model, ranked on the facet index by the similarity of
+    their sets of processes, spatial zone and temporal zone.
+
+    Parameters:
+    - model_id: The ID of the perceptual model to find similar models for.
+    - k: The number of similar models to return.
+    - metric: "jaccard" or "cosine" similarity of the features of the models.
+    - weighted: Weight the features by their inverse frequency across the models, so that sharing a rare
+      process counts more than sharing a common one.
+    - distance_weight: The share of the proximity of the locations in the score, from 0 (similarity only) to 1
+      (proximity only).
+    - distance_scale_km: The distance at which the proximity decays to 1/e.
+    - session: The async session to use for database operations.
+
+    Returns:
+    - The similar perceptual models as geojson features carrying their score, similarity and distance, best
+      first.
+    """
+    facet_index = current_facet_index()
+    if facet_index is None:
+        raise HTTPException(status_code=503, detail="Similar models are served from the facet index, which is disabled")
+    similar = facet_index.similar(model_id, k, metric, weighted, distance_weight, distance_scale_km)
+    if similar is None:
+        raise HTTPException(status_code=404, detail=f"Perceptual model {model_id} does not exist")
+
+    ranked = {model.id: model for model in similar}
+    perceptual_models = (
+        await session.exec(select_perceptual_model_features().where(PerceptualModel.id.in_(ranked)))
+    ).all()
+    features = [
+        feature(
+            pmodel,
+            score=ranked[pmodel.id].score,
+            similarity=ranked[pmodel.id].similarity,
+            distance_km=ranked[pmodel.id].distance_km,
+        )
+        for pmodel in perceptual_models
+    ]
+    features.sort(key=lambda scored: (-scored["score"], scored["properties"]["id"]))
+    return feature_response(feature_collection(features))
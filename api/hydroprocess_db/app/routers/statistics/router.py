@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends
+from sqlalchemy import and_, distinct, func, true, tuple_
 from sqlmodel import select
 
-from app.db import get_session
-from app.models import ModelCountRequest, ModelType, PerceptualModel, ProcessTaxonomy
+from app.db import get_async_session
+from app.facet_index import current_facet_index
+from app.metrics import InstrumentedRoute
+from app.models import FacetCount, FacetCounts, ModelCountRequest, ModelType, PerceptualModel, perceptual_model_read
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
 
 
 @router.post(
@@ -12,28 +15,87 @@ router = APIRouter()
     description="Get the count of models for each model type.",
     response_model=dict[str, int],
 )
-def get_model_count_by_type(request: ModelCountRequest, session=Depends(get_session)):
-    model_types = session.exec(select(ModelType)).all()
-    model_type_count = {}
+async def get_model_count_by_type(request: ModelCountRequest, session=Depends(get_async_session)):
+    """
+    Get the count of models matching the filters for each model type, from the facet index, or in a single
+    grouped query when it is disabled.
+
+    Parameters:
+    - request: The spatial zone, temporal zone and process taxonomy filters.
+    - session: The async session to use for database operations.
 
-    for model_type in model_types:
-        query = session.query(PerceptualModel).where(PerceptualModel.model_type_id == model_type.id)
+    Returns:
+    - The count of matching models keyed by model type name.
+    """
+    facet_index = current_facet_index()
+    if facet_index is not None:
+        return facet_index.model_type_counts(request)
 
-        if request.spatialzone_ids:
-            query = query.where(PerceptualModel.spatialzone_id.in_(request.spatialzone_ids))
+    read = perceptual_model_read.c
+    query = (
+        select(ModelType.name, func.count(read.id))
+        .select_from(ModelType)
+        .outerjoin(perceptual_model_read, and_(read.model_type_id == ModelType.id, *request.filters()))
+        .group_by(ModelType.id, ModelType.name)
+        .order_by(ModelType.id)
+    )
+    return {name: count for name, count in await session.exec(query)}
 
-        if request.temporalzone_ids:
-            query = query.where(PerceptualModel.temporalzone_id.in_(request.temporalzone_ids))
 
-        if request.process_taxonomy_ids:
-            query = query.join(PerceptualModel.process_taxonomies).where(
-                ProcessTaxonomy.id.in_(request.process_taxonomy_ids)
-            )
+@router.post(
+    "/facet_counts",
+    description="Get the count of models matching the filters, broken down by model type, spatial zone, "
+    "temporal zone and process taxonomy.",
+    response_model=FacetCounts,
+)
+async def get_facet_counts(request: ModelCountRequest, session=Depends(get_async_session)):
+    """
+    Get the count of models matching the filters, broken down by every facet, from the facet index, or in a
+    single grouped query when it is disabled.
+
+    Parameters:
+    - request: The spatial zone, temporal zone and process taxonomy filters.
+    - session: The async session to use for database operations.
+
+    Returns:
+    - The total count of matching models and, for each facet value with matching models, their count.
+    """
+    facet_index = current_facet_index()
+    if facet_index is not None:
+        return facet_index.facet_counts(request)
 
-        matching_models = query.all()
-        model_type_count[model_type.name] = len(matching_models)
+    read = perceptual_model_read.c
+    models = (
+        select(read.id, read.model_type_id, read.spatialzone_id, read.temporalzone_id, read.process_taxonomy_ids)
+        .where(*request.filters())
+        .subquery()
+    )
+    processes = func.unnest(models.c.process_taxonomy_ids).table_valued("process_id").render_derived().lateral()
+    facets = {
+        "model_types": models.c.model_type_id,
+        "spatial_zones": models.c.spatialzone_id,
+        "temporal_zones": models.c.temporalzone_id,
+        "process_taxonomies": processes.c.process_id,
+    }
+    columns = list(facets.values())
+    # unnesting the process ids fans out every model, so count distinct models within each grouping set
+    query = (
+        select(func.grouping(*columns), *columns, func.count(distinct(models.c.id)))
+        .select_from(models)
+        .outerjoin(processes, true())
+        .group_by(func.grouping_sets(*(tuple_(column) for column in columns), tuple_()))
+    )
 
-    return model_type_count
+    counts = {"total": 0, **{facet: [] for facet in facets}}
+    for grouping, *values, count in await session.exec(query):
+        if grouping == (1 << len(columns)) - 1:
+            counts["total"] = count
+            continue
+        # grouping() sets a bit for every column that is aggregated away, the remaining one is the facet
+        index = next(i for i in range(len(columns)) if not grouping & (1 << (len(columns) - 1 - i)))
+        if values[index] is not None:
+            counts[list(facets)[index]].append(FacetCount(id=values[index], count=count))
+    return FacetCounts(**counts)
 
 
 @router.get(
@@ -41,7 +103,7 @@ def get_model_count_by_type(request: ModelCountRequest, session=Depends(get_sess
     description="Get the count of models.",
     response_model=int,
 )
-def get_model_count(*, session=Depends(get_session)):
+async def get_model_count(*, session=Depends(get_async_session)):
     """
     Get the count of models.
 
@@ -51,4 +113,7 @@ def get_model_count(*, session=Depends(get_session)):
     Returns:
     - The count of models.
     """
-    return session.query(PerceptualModel).count()
+    facet_index = current_facet_index()
+    if facet_index is not None:
+        return facet_index.model_count()
+    return (await session.exec(select(func.count()).select_from(PerceptualModel))).one()
@@ -0,0 +1,65 @@
+from fastapi import APIRouter, Depends, HTTPException, UploadFile
+
+from app.cache import dataset_version, response_cache
+from app.db import engine
+from app.ingest import IngestError, ingest
+from app.metrics import InstrumentedRoute
+from app.pool import pool_metrics
+from app.users import current_superuser
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+
+@router.get(
+    "/cache",
+    description="Get the dataset version and the hit/miss statistics of the response cache.",
+    response_model=dict,
+)
+def get_cache_stats():
+    """
+    Get the dataset version and the hit/miss statistics of the response cache.
+
+    Returns:
+    - The current dataset version along with the response cache statistics.
+    """
+    return {"dataset_version": dataset_version.value, **response_cache.stats()}
+
+
+@router.get(
+    "/pool",
+    description="Get the state and checkout statistics of the database connection pool.",
+    response_model=dict,
+)
+def get_pool_stats():
+    """
+    Get the state and checkout statistics of the database connection pool of this worker.
+
+    Returns:
+    - The pool size, the connections in use and in overflow, along with the checkout wait times, pool timeouts,
+      connections opened and invalidated since startup.
+    """
+    return pool_metrics.stats(engine.pool)
+
+
+@router.post(
+    "/ingest",
+    description="Load catalogue tables from CSV or JSON files, each named after the table it loads.",
+    response_model=dict,
+    dependencies=[Depends(current_superuser)],
+)
+async def ingest_catalogue(files: list[UploadFile], replace: bool = False):
+    """
+    Load catalogue tables from CSV or JSON files in a single transaction, while the api keeps serving the
+    previous data.
+
+    Parameters:
+    - files: One file per table, named after it (e.g. locations.csv), holding its columns along with the ids.
+    - replace: Also delete the rows of the loaded tables that are missing from their file.
+
+    Returns:
+    - The rows loaded, upserted and deleted, along with the time spent copying and merging, per table.
+    """
+    try:
+        return await ingest({upload.filename: upload.file for upload in files}, replace=replace)
+    except IngestError as error:
+        raise HTTPException(status_code=422, detail=str(error))
@@ -0,0 +1,91 @@
+import logging
+
+from sqlalchemy import DDL, event, text
+from sqlmodel import SQLModel
+
+from app.cache import dataset_version
+from app.db import engine, materialized_view_ddl
+
+logger = logging.getLogger(__name__)
+
+TEXT_SEARCH_CONFIG = "english"
+SEARCH_VIEW = "perceptual_model_search"
+
+# one weighted tsvector per perceptual model, gathered from the model text and its related rows:
+# A - location name, B - citation and process names, C - model text, D - spatial/temporal zone properties
+SEARCH_VIEW_SQL = f"""
+    SELECT pm.id AS perceptual_model_id,
+           setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(l.long_name, '')), 'A')
+           || setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(c.citation, '')), 'B')
+           || setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(processes.text, '')), 'B')
+           || setweight(
+               to_tsvector('{TEXT_SEARCH_CONFIG}', concat_ws(' ', pm.textmodel_snipped, pm.figure_caption)), 'C'
+           )
+           || setweight(
+               to_tsvector('{TEXT_SEARCH_CONFIG}', concat_ws(' ', sz.spatial_property, tz.temporal_property)), 'D'
+           ) AS document
+    FROM perceptual_model pm
+    LEFT JOIN locations l ON l.id = pm.location_id
+    LEFT JOIN citations c ON c.id = pm.citation_id
+    LEFT JOIN spatial_zone_type sz ON sz.id = pm.spatialzone_id
+    LEFT JOIN temporal_zone_type tz ON tz.id = pm.temporalzone_id
+    LEFT JOIN (
+        SELECT lpp.entry_id, string_agg(concat_ws(' ', pt.process, alt.names), ' ') AS text
+        FROM (SELECT DISTINCT entry_id, process_id FROM link_process_perceptual) lpp
+        JOIN process_taxonomy pt ON pt.id = lpp.process_id
+        LEFT JOIN (
+            SELECT process_id, string_agg(alternative_names, ' ') AS names
+            FROM process_alt_names
+            GROUP BY process_id
+        ) alt ON alt.process_id = pt.id
+        GROUP BY lpp.entry_id
+    ) processes ON processes.entry_id = pm.id
+"""
+
+SEARCH_VIEW_DDL = [
+    *materialized_view_ddl(SEARCH_VIEW, SEARCH_VIEW_SQL),
+    # a unique index is required to refresh the view concurrently
+    DDL(f"CREATE UNIQUE INDEX IF NOT EXISTS ix_{SEARCH_VIEW}_id ON {SEARCH_VIEW} (perceptual_model_id)"),
+    DDL(f"CREATE INDEX IF NOT EXISTS ix_{SEARCH_VIEW}_document ON {SEARCH_VIEW} USING gin (document)"),
+]
+
+for statement in SEARCH_VIEW_DDL:
+    event.listen(SQLModel.metadata, "after_create", statement)
+
+# the rank is a float4, cast through numeric so that asyncpg does not hand back the widened binary value
+TEXT_SEARCH_SQL = text(
+    f"""
+    SELECT perceptual_model_id, ts_rank_cd(document, query)::numeric AS rank
+    FROM {SEARCH_VIEW}, websearch_to_tsquery('{TEXT_SEARCH_CONFIG}', :query) query
+    WHERE document @@ query
+    ORDER BY rank DESC, perceptual_model_id
+    LIMIT :limit OFFSET :offset
+    """
+)
+
+
+@dataset_version.prepare_database
+async def refresh_search_index():
+    """
+    Rebuild the search documents whenever the catalogue changes, without blocking concurrent searches.
+    """
+    async with engine.begin() as conn:
+        await conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {SEARCH_VIEW}"))
+    logger.info("Refreshed the perceptual model search index")
+
+
+async def search_perceptual_model_ids(session, query: str, limit: int, offset: int = 0) -> list[tuple[int, float]]:
+    """
+    Rank perceptual models against a web-search style query (quoted phrases, `or`, `-` exclusions).
+
+    Parameters:
+    - session: The session to use for database operations.
+    - query: The search query.
+    - limit: The maximum number of results.
+    - offset: The number of results to skip.
+
+    Returns:
+    - The ids of the matching perceptual models along with their rank, best match first.
+    """
+    rows = await session.exec(TEXT_SEARCH_SQL, params={"query": query, "limit": limit, "offset": offset})
+    return [(model_id, float(rank)) for model_id, rank in rows]
@@ -0,0 +1,76 @@
+from geoalchemy2 import Geography
+from sqlalchemy import DDL, cast, event, func
+from sqlmodel import SQLModel, select
+
+from app.db import select_perceptual_model_features
+from app.models import Location, PerceptualModel
+
+# create_all only indexes tables it creates, so the GiST indexes are (re)declared idempotently to also reach
+# existing databases: planar geometry for bounding boxes, geography for metric radius and nearest neighbours
+SPATIAL_INDEX_DDL = [
+    DDL("CREATE INDEX IF NOT EXISTS idx_locations_pt ON locations USING gist (pt)"),
+    DDL("CREATE INDEX IF NOT EXISTS ix_locations_pt_geography ON locations USING gist ((pt::geography))"),
+]
+
+for statement in SPATIAL_INDEX_DDL:
+    event.listen(SQLModel.metadata, "after_create", statement)
+
+
+# a bare geography cast (no typmod), so the expression matches the geography index
+GEOGRAPHY = Geography(geometry_type=None)
+
+
+def _point(lon: float, lat: float):
+    return cast(func.ST_SetSRID(func.ST_MakePoint(lon, lat), 4326), GEOGRAPHY)
+
+
+def _geography():
+    return cast(Location.pt, GEOGRAPHY)
+
+
+def select_within_bbox(min_lon: float, min_lat: float, max_lon: float, max_lat: float):
+    """
+    Select perceptual models located within a bounding box, using the GiST index on the location point.
+    """
+    envelope = func.ST_MakeEnvelope(min_lon, min_lat, max_lon, max_lat, 4326)
+    return select_perceptual_model_features().where(
+        PerceptualModel.location_id.in_(select(Location.id).where(Location.pt.op("&&")(envelope)))
+    )
+
+
+def select_within_radius(lon: float, lat: float, radius_km: float):
+    """
+    Select perceptual models located within `radius_km` of a point, closest first.
+    """
+    distance = _geography().op("<->")(_point(lon, lat))
+    return (
+        select_perceptual_model_features()
+        .join(Location, Location.id == PerceptualModel.location_id)
+        .where(func.ST_DWithin(_geography(), _point(lon, lat), radius_km * 1000))
+        .order_by(None)
+        .order_by(distance, PerceptualModel.id)
+    )
+
+
+def select_nearest(lon: float, lat: float, k: int):
+    """
+    Select the `k` perceptual models closest to a point, closest first.
+
+    The k nearest locations holding a model are found with an index-assisted `<->` scan first, so the k
+    nearest models are among the models at those locations.
+    """
+    distance = _geography().op("<->")(_point(lon, lat))
+    nearest_locations = (
+        select(Location.id)
+        .where(Location.pt.is_not(None), Location.id.in_(select(PerceptualModel.location_id)))
+        .order_by(distance)
+        .limit(k)
+    )
+    return (
+        select_perceptual_model_features()
+        .join(Location, Location.id == PerceptualModel.location_id)
+        .where(Location.id.in_(nearest_locations))
+        .order_by(None)
+        .order_by(distance, PerceptualModel.id)
+        .limit(k)
+    )
@@ -0,0 +1,62 @@
+"""
+Streamed listings of the perceptual models, for result sets too large to be built in memory at once.
+
+The models are read from a server-side cursor, `stream_batch_size` rows at a time, and every batch is encoded
+and sent before the next one is fetched, so neither the time to the first byte nor the memory used grow with
+the number of models. The rows are sent as newline-delimited JSON, or as a FeatureCollection written out
+feature by feature.
+
+The responses outlive the endpoint, and so its session, so every stream reads from a session of its own.
+"""
+
+from typing import AsyncIterator, Callable
+
+from fastapi.responses import StreamingResponse
+
+from app.db import async_session_maker, select_perceptual_model_features
+from app.features import dumps, feature
+from config import get_settings
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+async def stream_rows(query, batch_size: int) -> AsyncIterator[list]:
+    """
+    Read the results of `query` from a server-side cursor, `batch_size` rows at a time.
+    """
+    async with async_session_maker() as session:
+        result = await session.stream(query.execution_options(yield_per=batch_size))
+        async for rows in result.scalars().partitions(batch_size):
+            yield rows
+
+
+async def _ndjson_lines(query, encode: Callable[[object], bytes], batch_size: int):
+    async for rows in stream_rows(query, batch_size):
+        yield b"".join(encode(row) + b"\n" for row in rows)
+
+
+async def _feature_collection_chunks(batch_size: int):
+    yield b'{"type":"FeatureCollection","features":['
+    separator = b""
+    async for rows in stream_rows(select_perceptual_model_features(), batch_size):
+        yield separator + b",".join(dumps(feature(pmodel)) for pmodel in rows)
+        separator = b","
+    yield b"]}"
+
+
+def ndjson_response(query, encode: Callable[[object], bytes]) -> StreamingResponse:
+    """
+    Stream the results of `query` as newline-delimited JSON, one row encoded by `encode` per line.
+    """
+    return StreamingResponse(
+        _ndjson_lines(query, encode, get_settings().stream_batch_size), media_type=NDJSON_MEDIA_TYPE
+    )
+
+
+def feature_collection_response() -> StreamingResponse:
+    """
+    Stream the GeoJSON FeatureCollection of all perceptual models, the same document as the cached one.
+    """
+    return StreamingResponse(
+        _feature_collection_chunks(get_settings().stream_batch_size), media_type="application/json"
+    )
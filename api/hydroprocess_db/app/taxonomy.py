@@ -0,0 +1,64 @@
+"""
+The hierarchy of the process taxonomy.
+
+The hierarchy is implied by the dot-separated identifiers of the entries, e.g. `Chan.Flow.Quick` is a child of
+`Chan.Flow`, itself a child of `Chan`. It is built here once per dataset version and served as a tree, and the
+identifiers are indexed for prefix matching so that process filters can include all the descendants of the
+requested entries (see `app.models.process_subtree_ids`).
+"""
+
+from sqlalchemy import DDL, event
+from sqlmodel import SQLModel
+
+from app.models import ProcessTaxonomy
+
+# text_pattern_ops compares bytewise whatever the collation, which is what prefix ranges and LIKE need
+TAXONOMY_INDEX_DDL = [
+    DDL(
+        "CREATE INDEX IF NOT EXISTS ix_process_taxonomy_identifier_prefix "
+        "ON process_taxonomy (identifier text_pattern_ops)"
+    ),
+]
+
+for statement in TAXONOMY_INDEX_DDL:
+    event.listen(SQLModel.metadata, "after_create", statement)
+
+
+def _node(identifier: str, entry: ProcessTaxonomy | None = None) -> dict:
+    return {
+        "id": entry.id if entry else None,
+        "identifier": identifier,
+        "title": (entry.process if entry else None) or identifier.rsplit(".", 1)[-1],
+        "process_level": entry.process_level if entry else None,
+        "children": [],
+    }
+
+
+def build_taxonomy_tree(entries: list[ProcessTaxonomy]) -> list[dict]:
+    """
+    Arrange the process taxonomy entries in a tree following their identifiers.
+
+    Levels of an identifier without an entry of their own (e.g. `Human.Chan` for `Human.Chan.Flow.Pumped`) get
+    a node without id, so that every entry hangs under its ancestors. Entries sharing an identifier with an
+    earlier one are added next to it, without children. Siblings are ordered by identifier.
+
+    Returns:
+    - The root nodes, each with `id`, `identifier`, `title`, `process_level` and `children`.
+    """
+    roots: list[dict] = []
+    nodes: dict[str, dict] = {}
+    for entry in sorted(entries, key=lambda entry: (entry.identifier.split("."), entry.id)):
+        parts = entry.identifier.split(".")
+        siblings = roots
+        for depth in range(1, len(parts)):
+            identifier = ".".join(parts[:depth])
+            if identifier not in nodes:
+                nodes[identifier] = _node(identifier)
+                siblings.append(nodes[identifier])
+            siblings = nodes[identifier]["children"]
+
+        # entries come after their ancestors, so a node already there is an entry with the same identifier
+        node = _node(entry.identifier, entry)
+        nodes.setdefault(entry.identifier, node)
+        siblings.append(node)
+    return roots
@@ -0,0 +1,92 @@
+"""
+Mapbox Vector Tiles of the perceptual model locations, rendered by PostGIS with ST_AsMVT.
+
+Tiles above the clustering zoom level carry one point per model with just what the map needs to draw its
+marker, the model is fetched by id once the marker is clicked. Lower zoom levels are clustered on the server by
+snapping the points to a grid aligned with the tile boundaries, so every cluster falls in exactly one tile and
+the tile size stays bounded whatever the number of models.
+"""
+
+from sqlalchemy import text
+
+from config import get_settings
+
+TILE_LAYER = "perceptual_models"
+TILE_EXTENT = 4096
+# clusters per tile side, i.e. one cluster per 32 pixels of a 256 pixel tile
+CLUSTER_GRID = 8
+# half the width of the web mercator square, in meters
+MERCATOR_HALF_WIDTH = 20037508.342789244
+
+_TILE_POINTS_SQL = """
+    WITH bounds AS (
+        SELECT ST_TileEnvelope(:z, :x, :y) AS tile, ST_Transform(ST_TileEnvelope(:z, :x, :y), 4326) AS lonlat
+    ),
+    points AS (
+        SELECT pm.id, mt.name AS model_type, l.long_name, ST_Transform(l.pt, 3857) AS geom
+        FROM bounds, perceptual_model pm
+        JOIN locations l ON l.id = pm.location_id
+        LEFT JOIN model_type mt ON mt.id = pm.model_type_id
+        WHERE l.pt && bounds.lonlat
+    )
+"""
+
+MODEL_TILE_SQL = text(
+    f"""
+    {_TILE_POINTS_SQL}
+    SELECT coalesce(ST_AsMVT(features, '{TILE_LAYER}', {TILE_EXTENT}, 'geom', 'id'), ''::bytea)
+    FROM (
+        SELECT points.id, points.model_type, points.long_name,
+               ST_AsMVTGeom(points.geom, bounds.tile, {TILE_EXTENT}, 0) AS geom
+        FROM points, bounds
+    ) features
+    WHERE geom IS NOT NULL
+    """
+)
+
+CLUSTER_TILE_SQL = text(
+    f"""
+    {_TILE_POINTS_SQL},
+    cells AS (
+        SELECT floor((ST_X(geom) + {MERCATOR_HALF_WIDTH}) / :cell) AS cell_x,
+               floor((ST_Y(geom) + {MERCATOR_HALF_WIDTH}) / :cell) AS cell_y,
+               count(*) AS point_count,
+               min(id) AS id,
+               ST_Centroid(ST_Collect(geom)) AS geom
+        FROM points
+        GROUP BY 1, 2
+    )
+    SELECT coalesce(ST_AsMVT(features, '{TILE_LAYER}', {TILE_EXTENT}, 'geom'), ''::bytea)
+    FROM (
+        SELECT cells.point_count, CASE WHEN cells.point_count = 1 THEN cells.id END AS id,
+               ST_AsMVTGeom(cells.geom, bounds.tile, {TILE_EXTENT}, 0) AS geom
+        FROM cells, bounds
+    ) features
+    WHERE geom IS NOT NULL
+    """
+)
+
+
+def is_valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= x < 2**z and 0 <= y < 2**z
+
+
+async def perceptual_model_tile(session, z: int, x: int, y: int) -> bytes:
+    """
+    Render the perceptual model locations falling within a tile.
+
+    Parameters:
+    - session: The session to use for database operations.
+    - z, x, y: The tile coordinates, in the XYZ (slippy map) scheme.
+
+    Returns:
+    - The encoded vector tile, with a single layer of points. Up to the clustering zoom level every point is a
+      cluster with its `point_count` (and the model `id` when it holds a single model), above it every point is
+      a model with its `id`, `model_type` and `long_name`.
+    """
+    if z <= get_settings().mvt_cluster_max_zoom:
+        cell = 2 * MERCATOR_HALF_WIDTH / 2**z / CLUSTER_GRID
+        tile = (await session.exec(CLUSTER_TILE_SQL, params={"z": z, "x": x, "y": y, "cell": cell})).scalar_one()
+    else:
+        tile = (await session.exec(MODEL_TILE_SQL, params={"z": z, "x": x, "y": y})).scalar_one()
+    return bytes(tile)
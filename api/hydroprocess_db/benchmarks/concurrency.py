@@ -0,0 +1,81 @@
+"""
+Measure request latency of the uncached database endpoints under concurrent load.
+
+Run against a running api, e.g. from inside the api container:
+
+    python -m benchmarks.concurrency --url http://localhost:8000 --concurrency 50 --requests 2000
+"""
+
+import argparse
+import asyncio
+import itertools
+import statistics
+import time
+from collections import defaultdict
+
+import httpx
+
+PATHS = (
+    "/perceptual_model/{model_id}",
+    "/perceptual_model/{model_id}/location",
+    "/perceptual_model/{model_id}/process_taxonomies",
+    "/perceptual_model/geojson/{model_id}",
+    "/statistics/model_count",
+)
+
+
+def percentile(timings: list[float], fraction: float) -> float:
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run(url: str, concurrency: int, requests: int) -> tuple[dict[str, list[float]], int, float]:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        response = await client.get("/perceptual_model/")
+        response.raise_for_status()
+        model_ids = [model["id"] for model in response.json()]
+
+        # every worker draws from the same round robin of endpoints and models
+        work = zip(range(requests), itertools.cycle(PATHS), itertools.cycle(model_ids))
+        timings = defaultdict(list)
+        errors = 0
+
+        async def worker():
+            nonlocal errors
+            for _, path, model_id in work:
+                start = time.perf_counter()
+                response = await client.get(path.format(model_id=model_id))
+                timings[path].append(time.perf_counter() - start)
+                errors += response.status_code != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return timings, errors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000", help="base url of the api")
+    parser.add_argument("--concurrency", type=int, default=50, help="requests in flight at any time")
+    parser.add_argument("--requests", type=int, default=2000, help="total number of requests")
+    args = parser.parse_args()
+
+    timings, errors, elapsed = asyncio.run(run(args.url, args.concurrency, args.requests))
+    for path, path_timings in timings.items():
+        print(
+            f"{path:>48}: p50 {statistics.median(path_timings) * 1000:8.1f} ms"
+            f"  p95 {percentile(path_timings, 0.95) * 1000:8.1f} ms"
+            f"  p99 {percentile(path_timings, 0.99) * 1000:8.1f} ms"
+        )
+    everything = [timing for path_timings in timings.values() for timing in path_timings]
+    print(
+        f"{'all':>48}: p50 {statistics.median(everything) * 1000:8.1f} ms"
+        f"  p95 {percentile(everything, 0.95) * 1000:8.1f} ms"
+        f"  p99 {percentile(everything, 0.99) * 1000:8.1f} ms"
+    )
+    print(f"{len(everything)} requests in {elapsed:.1f} s ({len(everything) / elapsed:.0f} req/s), {errors} errors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Compare the python and PostGIS engines of /perceptual_model/geojson.
+
+Run inside the api container against a loaded database:
+
+    python -m benchmarks.geojson_engines --repeat 20
+"""
+
+import argparse
+import statistics
+import time
+
+from fastapi.testclient import TestClient
+
+from app.cache import response_cache
+from main import app
+
+URL = "/perceptual_model/geojson"
+
+
+def time_engine(client: TestClient, engine: str, repeat: int) -> tuple[list[float], bytes]:
+    timings = []
+    body = b""
+    for _ in range(repeat):
+        # time the engines themselves rather than the response cache
+        response_cache.clear()
+        start = time.perf_counter()
+        response = client.get(URL, params={"engine": engine})
+        timings.append(time.perf_counter() - start)
+        response.raise_for_status()
+        body = response.content
+    return timings, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=10, help="requests per engine")
+    args = parser.parse_args()
+
+    with TestClient(app) as client:
+        bodies = {}
+        for engine in ("python", "postgis"):
+            # warm up connections and caches before timing
+            client.get(URL, params={"engine": engine})
+            timings, bodies[engine] = time_engine(client, engine, args.repeat)
+            print(
+                f"{engine:>8}: median {statistics.median(timings) * 1000:8.1f} ms"
+                f"  min {min(timings) * 1000:8.1f} ms  max {max(timings) * 1000:8.1f} ms"
+                f"  {len(bodies[engine])} bytes"
+            )
+        print(f"byte-identical output: {bodies['python'] == bodies['postgis']}")
+
+
+if __name__ == "__main__":
+    main()
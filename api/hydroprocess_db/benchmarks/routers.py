@@ -0,0 +1,336 @@
+"""
+Benchmark every endpoint of the routers in app/routers, in process, against the database of the api settings.
+
+Meant to run against a synthetic catalogue (see benchmarks.synthetic), so that the scaling of every endpoint
+shows. For every case it measures:
+
+- the latency, as the median and 95th percentile of `--repeat` requests, with the response cache cleared
+  before every request unless `--warm`
+- the SQL queries per request, as counted by the request metrics
+- the size of the response body, as sent with the `--accept-encoding` requested
+- the peak of the python heap while handling one request, traced separately from the timed requests
+- the peak RSS of the process once the case is done, a high-water mark over the cases run so far, in a fixed
+  order
+
+The results are written as JSON and compared between commits with --compare:
+
+    PG_DBNAME=hydroprocess_bench python -m benchmarks.routers --label $(git rev-parse --short HEAD) \\
+        --output /data/bench/abc1234.json
+    python -m benchmarks.routers --compare /data/bench/abc1234.json /data/bench/def5678.json
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import resource
+import statistics
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+from prometheus_client.registry import REGISTRY
+
+from app.cache import response_cache
+from main import app
+
+# the routers of app/routers, by prefix
+ROUTER_PREFIXES = ("perceptual_model", "filters", "statistics", "figures", "system")
+# endpoints writing to the catalogue
+EXCLUDED_ROUTES = {("POST", "/system/ingest")}
+
+
+@dataclass
+class Case:
+    name: str
+    method: str
+    # the route template, i.e. the route label of the request metrics
+    route: str
+    path_params: dict = field(default_factory=dict)
+    params: dict = field(default_factory=dict)
+    body: dict | None = None
+
+    @property
+    def path(self) -> str:
+        return self.route.format(**self.path_params)
+
+
+def _tile(lon: float, lat: float, zoom: int) -> dict:
+    scale = 2**zoom
+    y = (1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2
+    return {"z": zoom, "x": int((lon + 180) / 360 * scale), "y": int(y * scale)}
+
+
+def _figure(client: TestClient, features: list[dict]) -> tuple[dict, str] | None:
+    """
+    Find the first of the models whose citation has a figure.
+
+    Returns:
+    - The properties of the model and the name of the variant its figure redirects to, None when no citation has
+      a figure.
+    """
+    for feature in features:
+        model = feature["properties"]
+        response = client.get(
+            f"/figures/citation/{model['citation_id']}", params={"width": 400}, follow_redirects=False
+        )
+        if response.is_redirect:
+            return model, response.headers["location"].rsplit("/", 1)[1]
+    return None
+
+
+def build_cases(client: TestClient) -> list[Case]:
+    """
+    List the cases, with ids, coordinates and filters taken from the first perceptual model of the catalogue, and
+    the figure of the first of the models with one, if any.
+    """
+    response = client.post("/perceptual_model/search", json={"limit": 100})
+    response.raise_for_status()
+    features = response.json()["features"]
+    if not features:
+        raise SystemExit(
+            "the catalogue has no perceptual model located at a point, load one (see benchmarks.synthetic)"
+        )
+    sample = features[0]
+    model = sample["properties"]
+    lon, lat = sample["geometry"]["coordinates"]
+    process_ids = [process["id"] for process in model.get("process_taxonomies", [])][:2]
+    model_path = {"model_id": model["id"]}
+    filters = {"process_taxonomy_ids": process_ids, "spatialzone_ids": [model["spatialzone_id"]]}
+    bbox = {"min_lon": lon - 10, "min_lat": lat - 10, "max_lon": lon + 10, "max_lat": lat + 10}
+
+    cases = [
+        Case("models", "GET", "/perceptual_model/"),
+        Case("models ndjson", "GET", "/perceptual_model/", params={"format": "ndjson"}),
+        Case("recursive", "GET", "/perceptual_model/recursive"),
+        Case("recursive compact", "GET", "/perceptual_model/recursive", params={"format": "compact"}),
+        Case("geojson python", "GET", "/perceptual_model/geojson"),
+        Case("geojson postgis", "GET", "/perceptual_model/geojson", params={"engine": "postgis"}),
+        Case("geojson compact", "GET", "/perceptual_model/geojson", params={"format": "compact"}),
+        Case("geojson ndjson", "GET", "/perceptual_model/geojson", params={"format": "ndjson"}),
+        Case("geojson stream", "GET", "/perceptual_model/geojson", params={"stream": True}),
+        Case("export parquet", "GET", "/perceptual_model/export", params={"format": "parquet"}),
+        Case("export arrow", "GET", "/perceptual_model/export", params={"format": "arrow"}),
+        Case("search filters", "POST", "/perceptual_model/search", body={**filters, "limit": 100}),
+        Case(
+            "search subtree",
+            "POST",
+            "/perceptual_model/search",
+            body={**filters, "include_descendants": True, "limit": 100},
+        ),
+        Case(
+            "search bbox text",
+            "POST",
+            "/perceptual_model/search",
+            body={"bbox": list(bbox.values()), "text": "soil", "limit": 100},
+        ),
+        Case("text search", "GET", "/perceptual_model/text_search", params={"q": "groundwater flow", "limit": 50}),
+        Case("within bbox", "GET", "/perceptual_model/within_bbox", params=bbox),
+        Case(
+            "within radius", "GET", "/perceptual_model/within_radius", params={"lon": lon, "lat": lat, "radius_km": 500}
+        ),
+        Case("nearest", "GET", "/perceptual_model/nearest", params={"lon": lon, "lat": lat, "k": 20}),
+        Case("tile clusters", "GET", "/perceptual_model/tiles/{z}/{x}/{y}.mvt", path_params=_tile(lon, lat, 3)),
+        Case("tile models", "GET", "/perceptual_model/tiles/{z}/{x}/{y}.mvt", path_params=_tile(lon, lat, 10)),
+        Case("model", "GET", "/perceptual_model/{model_id}", path_params=model_path),
+        Case("model recursive", "GET", "/perceptual_model/recursive/{model_id}", path_params=model_path),
+        Case("model geojson", "GET", "/perceptual_model/geojson/{model_id}", path_params=model_path),
+        *(
+            Case(f"model {relation}", "GET", f"/perceptual_model/{{model_id}}/{relation}", path_params=model_path)
+            for relation in (
+                "location",
+                "citation",
+                "spatial_zone_type",
+                "temporal_zone_type",
+                "model_type",
+                "process_taxonomies",
+            )
+        ),
+        Case(
+            "model similar",
+            "GET",
+            "/perceptual_model/{model_id}/similar",
+            path_params=model_path,
+            params={"k": 20, "distance_weight": 0.3},
+        ),
+        Case(
+            "batch",
+            "POST",
+            "/perceptual_model/batch",
+            body={
+                "ids": list(range(model["id"], model["id"] + 200)),
+                "relations": ["location", "citation", "model_type", "process_taxonomies"],
+            },
+        ),
+        Case("process taxonomies", "GET", "/filters/process_taxonomies"),
+        Case("process taxonomy tree", "GET", "/filters/process_taxonomy_tree"),
+        Case("spatial zones", "GET", "/filters/spatial_zones"),
+        Case("temporal zones", "GET", "/filters/temporal_zones"),
+        Case("model type count", "POST", "/statistics/model_type_count", body=filters),
+        Case("facet counts", "POST", "/statistics/facet_counts", body=filters),
+        Case("facet counts all", "POST", "/statistics/facet_counts", body={}),
+        Case("model count", "GET", "/statistics/model_count"),
+        Case("cache stats", "GET", "/system/cache"),
+        Case("pool stats", "GET", "/system/pool"),
+    ]
+
+    # without any figure, e.g. when the figure images are not mounted, the figure routes are left out and reported
+    # as not benchmarked rather than measured as 404s
+    figure = _figure(client, features)
+    if figure is not None:
+        figure_model, variant = figure
+        cases += [
+            Case(
+                "citation figure",
+                "GET",
+                "/figures/citation/{citation_id}",
+                path_params={"citation_id": figure_model["citation_id"]},
+                params={"width": 400},
+            ),
+            Case(
+                "model figure",
+                "GET",
+                "/figures/perceptual_model/{model_id}",
+                path_params={"model_id": figure_model["id"]},
+                params={"width": 400},
+            ),
+            Case("figure variant", "GET", "/figures/variants/{name}", path_params={"name": variant}),
+        ]
+    return cases
+
+
+def uncovered_routes(cases: list[Case]) -> list[str]:
+    covered = {(case.method, case.route) for case in cases} | EXCLUDED_ROUTES
+    return [
+        f"{method} {route.path}"
+        for route in app.routes
+        if isinstance(route, APIRoute) and route.path.split("/")[1] in ROUTER_PREFIXES
+        for method in route.methods
+        if (method, route.path) not in covered
+    ]
+
+
+def _queries(case: Case) -> float:
+    labels = {"method": case.method, "route": case.route}
+    return REGISTRY.get_sample_value("http_request_sql_queries_sum", labels) or 0.0
+
+
+def measure(client: TestClient, case: Case, repeat: int, warm: bool, headers: dict) -> dict:
+    def request() -> tuple[int, int]:
+        # counts the bytes as sent, before decoding, streamed responses included
+        with client.stream(
+            case.method, case.path, params=case.params, json=case.body, headers=headers, follow_redirects=False
+        ) as response:
+            return response.status_code, sum(len(chunk) for chunk in response.iter_raw())
+
+    # warms up the connections, and the response cache when measuring warm requests
+    request()
+    timings = []
+    queries_before = _queries(case)
+    for _ in range(repeat):
+        if not warm:
+            response_cache.clear()
+        start = time.perf_counter()
+        status, size = request()
+        timings.append(time.perf_counter() - start)
+    queries = (_queries(case) - queries_before) / repeat
+
+    if not warm:
+        response_cache.clear()
+    tracemalloc.start()
+    request()
+    _, peak_heap = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "method": case.method,
+        "route": case.route,
+        "status": status,
+        "median_ms": statistics.median(timings) * 1000,
+        "p95_ms": sorted(timings)[min(len(timings) - 1, int(0.95 * len(timings)))] * 1000,
+        "queries": queries,
+        "bytes": size,
+        "peak_heap_mb": peak_heap / 2**20,
+        # kilobytes on linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def run(repeat: int, warm: bool, accept_encoding: str, only: str | None, label: str | None) -> dict:
+    # errors are recorded as their status rather than raised
+    with TestClient(app, raise_server_exceptions=False) as client:
+        cases = build_cases(client)
+        for route in uncovered_routes(cases):
+            print(f"not benchmarked: {route}")
+        if only:
+            cases = [case for case in cases if re.search(only, case.name)]
+        models = client.get("/statistics/model_count").json()
+
+        results = {}
+        for case in cases:
+            results[case.name] = result = measure(client, case, repeat, warm, {"Accept-Encoding": accept_encoding})
+            print(
+                f"{case.name:>24}: {result['status']}  median {result['median_ms']:9.1f} ms"
+                f"  p95 {result['p95_ms']:9.1f} ms  {result['queries']:5.1f} queries"
+                f"  {result['bytes']:>11} bytes  heap {result['peak_heap_mb']:7.1f} MB"
+                f"  rss {result['peak_rss_mb']:7.1f} MB"
+            )
+    return {
+        "label": label,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "models": models,
+        "repeat": repeat,
+        "warm": warm,
+        "accept_encoding": accept_encoding,
+        "cases": results,
+    }
+
+
+def compare(baseline_file: str, candidate_file: str):
+    with open(baseline_file) as baseline_json, open(candidate_file) as candidate_json:
+        baseline, candidate = json.load(baseline_json), json.load(candidate_json)
+    print(
+        f"{baseline_file} ({baseline['label']}, {baseline['models']} models)"
+        f" -> {candidate_file} ({candidate['label']}, {candidate['models']} models)"
+    )
+    for name, after in candidate["cases"].items():
+        before = baseline["cases"].get(name)
+        if before is None:
+            print(f"{name:>24}: new")
+            continue
+        ratio = after["median_ms"] / before["median_ms"] if before["median_ms"] else float("nan")
+        print(
+            f"{name:>24}: median {before['median_ms']:9.1f} -> {after['median_ms']:9.1f} ms (x{ratio:5.2f})"
+            f"  queries {before['queries']:5.1f} -> {after['queries']:5.1f}"
+            f"  bytes {before['bytes']:>11} -> {after['bytes']:>11}"
+            f"  heap {before['peak_heap_mb']:7.1f} -> {after['peak_heap_mb']:7.1f} MB"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="timed requests per case")
+    parser.add_argument("--warm", action="store_true", help="keep the response cache between requests")
+    parser.add_argument("--accept-encoding", default="identity", help="content encoding requested, e.g. br")
+    parser.add_argument("--only", help="only run the cases whose name matches this regular expression")
+    parser.add_argument("--label", help="label stored along with the results, e.g. the commit")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"), help="compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    results = run(args.repeat, args.warm, args.accept_encoding, args.only, args.label)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Compare the serialization cost of perceptual model features, per 1000 features.
+
+- pydantic + fastapi: GeoJsonFeature models, dumped, validated against the response_model, serialized and
+  rendered by the json module, as FastAPI does
+- pydantic + dump_json: GeoJsonFeature models, validated and dumped by a TypeAdapter
+- orjson (cold): plain dicts encoded by orjson, dumping every related row again
+- orjson (warm): plain dicts encoded by orjson, reusing the related rows dumped for the dataset version
+
+Run inside the api container against a loaded database:
+
+    python -m benchmarks.serialization --repeat 20
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import statistics
+import time
+
+from pydantic import TypeAdapter
+
+from app import features
+from app.cache import dump_json
+from app.db import async_session_maker, select_perceptual_models
+from app.models import GeoJsonFeature, GeoJsonFeatureCollection, WKBToGeoJSON
+
+FEATURES = 1000
+
+
+def _models_collection(perceptual_models) -> GeoJsonFeatureCollection:
+    return GeoJsonFeatureCollection(
+        type="FeatureCollection",
+        features=[
+            GeoJsonFeature(
+                type="Feature",
+                geometry=WKBToGeoJSON.from_WKBElement(pmodel.location.pt),
+                properties=pmodel.get_feature_properties(),
+            )
+            for pmodel in perceptual_models
+        ],
+    )
+
+
+def pydantic_fastapi(perceptual_models) -> bytes:
+    adapter = TypeAdapter(GeoJsonFeatureCollection)
+    collection = adapter.validate_python(_models_collection(perceptual_models).model_dump())
+    content = adapter.dump_python(collection, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def pydantic_dump_json(perceptual_models) -> bytes:
+    return dump_json(GeoJsonFeatureCollection, _models_collection(perceptual_models))
+
+
+def orjson_cold(perceptual_models) -> bytes:
+    features._related_dumps.clear()
+    features._geometries.clear()
+    return orjson_warm(perceptual_models)
+
+
+def orjson_warm(perceptual_models) -> bytes:
+    return features.dumps(features.feature_collection([features.feature(pmodel) for pmodel in perceptual_models]))
+
+
+async def load_models(count: int) -> list:
+    async with async_session_maker() as session:
+        perceptual_models = (await session.exec(select_perceptual_models())).all()
+    # cycle through the catalogue to reach the requested number of features
+    return list(itertools.islice(itertools.cycle(perceptual_models), count))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=10, help="timed runs per serializer")
+    args = parser.parse_args()
+
+    perceptual_models = asyncio.run(load_models(FEATURES))
+    outputs = {}
+    for name, serialize in (
+        ("pydantic + fastapi", pydantic_fastapi),
+        ("pydantic + dump_json", pydantic_dump_json),
+        ("orjson (cold)", orjson_cold),
+        ("orjson (warm)", orjson_warm),
+    ):
+        # warm up before timing
+        outputs[name] = serialize(perceptual_models)
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            serialize(perceptual_models)
+            timings.append(time.perf_counter() - start)
+        print(
+            f"{name:>22}: median {statistics.median(timings) * 1000:8.1f} ms  min {min(timings) * 1000:8.1f} ms"
+            f"  per {FEATURES} features, {len(outputs[name])} bytes"
+        )
+    print(f"identical documents: {len({json.dumps(json.loads(output)) for output in outputs.values()}) == 1}")
+
+
+if __name__ == "__main__":
+    main()
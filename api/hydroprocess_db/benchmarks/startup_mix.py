@@ -0,0 +1,223 @@
+"""
+Replay the requests of users opening the map page against a running api, to find the load it saturates at.
+
+A user opening the page fires, all at once, the requests of the map and the filter drawer:
+
+- /perceptual_model/geojson, from TheLeafletMap.vue
+- /perceptual_model, /filters/process_taxonomy_tree, /filters/spatial_zones and /filters/temporal_zones, from
+  FilterDrawer.vue
+- /statistics/model_type_count without filters, from DataViewDrawer.vue
+
+then, after a think time drawn from an exponential distribution, a POST of /statistics/model_type_count for every
+change of the filters, with zones and processes drawn at random.
+
+Users arrive at random (a Poisson process) at `--rates` users per second, each rate in turn for `--duration`
+seconds, whatever the time the api takes to answer: unlike the closed loop of benchmarks.concurrency, the load
+does not ease when the api slows down, so that past the saturation point the throughput levels off while the
+latency and the errors climb. The requests in flight are bounded by `--concurrency` connections, as a proxy in
+front of the api would, and the time spent waiting for a connection counts in the latency. For every rate it
+reports the throughput, the latency percentiles and the error rate of every endpoint, e.g. against the uvicorn
+and pool configuration under test:
+
+    python -m benchmarks.startup_mix --url http://localhost:8000 --rates 1 2 4 8 16 --duration 60
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+import httpx
+
+from benchmarks.concurrency import percentile
+
+STARTUP_REQUESTS = (
+    ("GET", "/perceptual_model/geojson"),
+    # without trailing slash, as the frontend requests it, the redirect included
+    ("GET", "/perceptual_model"),
+    ("GET", "/filters/process_taxonomy_tree"),
+    ("GET", "/filters/spatial_zones"),
+    ("GET", "/filters/temporal_zones"),
+    ("POST", "/statistics/model_type_count"),
+)
+FILTER_REQUEST = ("POST", "/statistics/model_type_count")
+# as sent by browsers, the responses are read as sent and not decoded
+HEADERS = {"Accept-Encoding": "gzip, deflate, br"}
+
+
+@dataclass
+class Results:
+    timings: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    errors: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    bytes: int = 0
+
+
+@dataclass
+class Filters:
+    process_ids: list[int]
+    spatialzone_ids: list[int]
+    temporalzone_ids: list[int]
+
+    def draw(self, rng: random.Random) -> dict:
+        # one to three criteria of one to three values, as picked in the filter drawer
+        choices = {
+            "process_taxonomy_ids": self.process_ids,
+            "spatialzone_ids": self.spatialzone_ids,
+            "temporalzone_ids": self.temporalzone_ids,
+        }
+        criteria = rng.sample(sorted(choices), rng.randint(1, 3))
+        return {name: rng.sample(choices[name], min(len(choices[name]), rng.randint(1, 3))) for name in criteria}
+
+
+def _tree_ids(nodes: list[dict]) -> list[int]:
+    return [
+        node_id
+        for node in nodes
+        for node_id in ([node["id"]] if node["id"] is not None else []) + _tree_ids(node["children"])
+    ]
+
+
+async def load_filters(client: httpx.AsyncClient) -> Filters:
+    responses = [
+        await client.get(path)
+        for path in ("/filters/process_taxonomy_tree", "/filters/spatial_zones", "/filters/temporal_zones")
+    ]
+    for response in responses:
+        response.raise_for_status()
+    tree, spatial_zones, temporal_zones = (response.json() for response in responses)
+    return Filters(_tree_ids(tree), [zone["id"] for zone in spatial_zones], [zone["id"] for zone in temporal_zones])
+
+
+async def request(client: httpx.AsyncClient, results: Results, method: str, path: str, body: dict | None = None):
+    name = f"{method} {path}"
+    start = time.perf_counter()
+    try:
+        async with client.stream(method, path, json=body, headers=HEADERS, follow_redirects=True) as response:
+            async for chunk in response.aiter_raw():
+                results.bytes += len(chunk)
+        failed = response.status_code >= 400
+    except httpx.HTTPError:
+        failed = True
+    results.timings[name].append(time.perf_counter() - start)
+    results.errors[name] += failed
+
+
+async def user(
+    client: httpx.AsyncClient, results: Results, filters: Filters, rng: random.Random, changes: int, think: float
+):
+    await asyncio.gather(
+        *(request(client, results, method, path, {} if method == "POST" else None) for method, path in STARTUP_REQUESTS)
+    )
+    for _ in range(changes):
+        await asyncio.sleep(rng.expovariate(1 / think))
+        await request(client, results, *FILTER_REQUEST, filters.draw(rng))
+
+
+async def run_rate(
+    client: httpx.AsyncClient,
+    filters: Filters,
+    rate: float,
+    duration: float,
+    changes: int,
+    think: float,
+    rng: random.Random,
+) -> tuple[Results, int, float]:
+    """
+    Start users at `rate` per second for `duration` seconds, then wait for all of them to finish.
+
+    Returns:
+    - The results of the requests, the number of users and the seconds until the last one finished.
+    """
+    results = Results()
+    users = []
+    start = time.perf_counter()
+    arrival = 0.0
+    while True:
+        arrival += rng.expovariate(rate)
+        if arrival >= duration:
+            break
+        # scheduled on the clock rather than after the previous user, which may have been late
+        await asyncio.sleep(max(0.0, start + arrival - time.perf_counter()))
+        users.append(asyncio.create_task(user(client, results, filters, rng, changes, think)))
+    await asyncio.gather(*users)
+    return results, len(users), time.perf_counter() - start
+
+
+def summarize(results: Results, elapsed: float) -> dict:
+    summary = {}
+    for name, timings in sorted(results.timings.items()):
+        summary[name] = {
+            "requests": len(timings),
+            "throughput": len(timings) / elapsed,
+            "error_rate": results.errors[name] / len(timings),
+            "p50_ms": statistics.median(timings) * 1000,
+            "p95_ms": percentile(timings, 0.95) * 1000,
+            "p99_ms": percentile(timings, 0.99) * 1000,
+        }
+    return summary
+
+
+async def run(
+    url: str, rates: list[float], duration: float, concurrency: int, changes: int, think: float, seed: int
+) -> list[dict]:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    # generous, so that requests are late rather than failed until the api is well past saturation
+    timeout = httpx.Timeout(120, pool=None)
+    rng = random.Random(seed)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        filters = await load_filters(client)
+        steps = []
+        for rate in rates:
+            results, users, elapsed = await run_rate(client, filters, rate, duration, changes, think, rng)
+            steps.append(
+                {
+                    "rate": rate,
+                    "users": users,
+                    "seconds": elapsed,
+                    "megabytes": results.bytes / 2**20,
+                    "endpoints": summarize(results, elapsed),
+                }
+            )
+            print_step(steps[-1])
+        return steps
+
+
+def print_step(step: dict):
+    print(
+        f"{step['rate']:g} users/s: {step['users']} users in {step['seconds']:.1f} s,"
+        f" {step['megabytes'] / step['seconds']:.1f} MB/s"
+    )
+    for name, endpoint in step["endpoints"].items():
+        print(
+            f"{name:>40}: {endpoint['throughput']:7.1f} req/s  p50 {endpoint['p50_ms']:8.1f} ms"
+            f"  p95 {endpoint['p95_ms']:8.1f} ms  p99 {endpoint['p99_ms']:8.1f} ms"
+            f"  errors {endpoint['error_rate']:6.1%}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000", help="base url of the api")
+    parser.add_argument("--rates", type=float, nargs="+", default=[1, 2, 4, 8], help="users arriving per second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds users arrive for, at every rate")
+    parser.add_argument("--concurrency", type=int, default=100, help="connections to the api")
+    parser.add_argument("--filter-changes", type=int, default=3, help="filter changes of every user")
+    parser.add_argument("--think", type=float, default=5, help="mean seconds between filter changes")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the arrivals and the filters")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    steps = asyncio.run(
+        run(args.url, args.rates, args.duration, args.concurrency, args.filter_changes, args.think, args.seed)
+    )
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(steps, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
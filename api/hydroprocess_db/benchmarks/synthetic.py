@@ -0,0 +1,234 @@
+"""
+Generate a synthetic catalogue of perceptual models, at the scales the real dataset does not reach.
+
+Every synthetic model is a copy of a real model drawn at random: it keeps its zones, model type, citation and
+process links, so the fan-out of the links and the facets follow the real distribution. The models share
+locations in the same proportion as the real ones, jittered around real locations drawn the same way, so the
+points cluster where the real catalogue does. The process taxonomy and the other lookups are copied as is.
+
+The real catalogue is read from the `--source` database and the synthetic one replaces the catalogue of the
+database of the api settings, which must be another one, created when missing. The rows are generated by
+postgres itself from a seeded random sequence, so the same seed and size yield the same catalogue:
+
+    PG_DBNAME=hydroprocess_bench python -m benchmarks.synthetic --source hydroprocess --models 100000
+"""
+
+import argparse
+import asyncio
+import io
+import time
+
+import asyncpg
+from sqlalchemy import text
+from sqlmodel import SQLModel
+
+from app.cache import CATALOGUE_TABLES, dataset_version
+from app.db import create_db_and_tables, engine
+from app.models import PerceptualModelBase
+from config import get_settings
+from main import app  # noqa: F401, registers the read model and the indexes created along with the tables
+
+# copied as is from the real catalogue
+LOOKUP_TABLES = (
+    "function_type",
+    "process_alt_names",
+    "process_taxonomy",
+    "spatial_zone_type",
+    "temporal_zone_type",
+    "model_type",
+)
+# the real rows the synthetic ones are drawn from, copied into temporary tables
+TEMPLATE_TABLES = ("citations", "locations", "perceptual_model", "link_process_perceptual")
+
+# the random numbers are drawn in derived tables, which postgres evaluates once per row in order, rather than
+# in subqueries, which it may evaluate once for all rows
+GENERATE_SQL = (
+    """
+    CREATE TEMP TABLE template_models ON COMMIT DROP AS
+    SELECT row_number() OVER (ORDER BY id) AS n, id, location_id FROM real_perceptual_model
+    """,
+    """
+    CREATE TEMP TABLE synthetic_models ON COMMIT DROP AS
+    SELECT r.id, t.id AS template_id, r.location_id
+    FROM (
+        SELECT g AS id, 1 + floor(random() * :templates)::int AS n, 1 + floor(random() * :locations)::int AS location_id
+        FROM generate_series(1, :models) g
+    ) r
+    JOIN template_models t ON t.n = r.n
+    """,
+    """
+    INSERT INTO citations (id, citation, url, attribution, attribution_url)
+    SELECT s.id, c.citation, c.url, c.attribution, c.attribution_url
+    FROM synthetic_models s
+    JOIN real_perceptual_model t ON t.id = s.template_id
+    JOIN real_citations c ON c.id = t.citation_id
+    ORDER BY s.id
+    """,
+    # jittered by a normal distribution (Box-Muller) of `jitter` degrees around the real location
+    """
+    INSERT INTO locations (id, name, country, lat, lon, area_km2, huc_watershed_id, long_name, pt)
+    SELECT r.id, l.name, l.country, p.lat, p.lon, l.area_km2, l.huc_watershed_id, l.long_name,
+           ST_SetSRID(ST_MakePoint(p.lon, p.lat), 4326)
+    FROM (
+        SELECT g AS id, 1 + floor(random() * :templates)::int AS n,
+               sqrt(-2 * ln(1 - random())) AS radius, 2 * pi() * random() AS theta
+        FROM generate_series(1, :locations) g
+    ) r
+    JOIN template_models t ON t.n = r.n
+    JOIN real_locations l ON l.id = t.location_id
+    CROSS JOIN LATERAL (
+        SELECT greatest(-90, least(90, l.lat + :jitter * r.radius * sin(r.theta))) AS lat,
+               ((l.lon + :jitter * r.radius * cos(r.theta) + 540)::numeric % 360 - 180)::float AS lon
+    ) p
+    ORDER BY r.id
+    """,
+    """
+    INSERT INTO perceptual_model (
+        id, location_id, citation_id, spatialzone_id, temporalzone_id, model_type_id, {model_columns}
+    )
+    SELECT s.id, s.location_id, s.id, t.spatialzone_id, t.temporalzone_id, t.model_type_id, {template_columns}
+    FROM synthetic_models s
+    JOIN real_perceptual_model t ON t.id = s.template_id
+    ORDER BY s.id
+    """,
+    """
+    INSERT INTO link_process_perceptual (entry_id, process_id, original_text)
+    SELECT s.id, lpp.process_id, lpp.original_text
+    FROM synthetic_models s
+    JOIN real_link_process_perceptual lpp ON lpp.entry_id = s.template_id
+    ORDER BY s.id, lpp.id
+    """,
+)
+
+MODEL_COLUMNS = list(PerceptualModelBase.model_fields)
+
+
+def _columns(name: str) -> list[str]:
+    # listed rather than implied, the real tables may not declare their columns in the same order
+    return [column.name for column in SQLModel.metadata.tables[name].c]
+
+
+def _connect_args(database: str) -> dict:
+    settings = get_settings()
+    return {
+        "user": settings.pg_username,
+        "password": settings.pg_password,
+        "host": settings.pg_host,
+        "port": int(settings.pg_port),
+        "database": database,
+    }
+
+
+async def create_database(database: str):
+    connection = await asyncpg.connect(**_connect_args("postgres"))
+    try:
+        if not await connection.fetchval("SELECT 1 FROM pg_database WHERE datname = $1", database):
+            await connection.execute(f'CREATE DATABASE "{database}"')
+    finally:
+        await connection.close()
+    connection = await asyncpg.connect(**_connect_args(database))
+    try:
+        await connection.execute("CREATE EXTENSION IF NOT EXISTS postgis")
+    finally:
+        await connection.close()
+
+
+async def read_source(source: str) -> dict[str, bytes]:
+    """
+    Read the real catalogue tables as binary COPY data.
+    """
+    connection = await asyncpg.connect(**_connect_args(source))
+    try:
+        tables = {}
+        for name in (*LOOKUP_TABLES, *TEMPLATE_TABLES):
+            output = io.BytesIO()
+            await connection.copy_from_table(name, output=output, columns=_columns(name), format="binary")
+            tables[name] = output.getvalue()
+        return tables
+    finally:
+        await connection.close()
+
+
+async def generate(source: str, models: int, seed: float, jitter: float) -> dict:
+    """
+    Replace the catalogue of the target database with `models` synthetic perceptual models.
+
+    Returns:
+    - The number of rows of every catalogue table, and the seconds spent generating them.
+    """
+    tables = await read_source(source)
+    start = time.perf_counter()
+    async with engine.begin() as connection:
+        # begins the transaction, which SQLAlchemy only does on its first statement, and keeps parallel workers,
+        # which would draw from random sequences of their own, out of the generation
+        await connection.execute(text("SET LOCAL max_parallel_workers_per_gather = 0"))
+        driver: asyncpg.Connection = (await connection.get_raw_connection()).driver_connection
+        await driver.execute(f"TRUNCATE {', '.join(CATALOGUE_TABLES)} RESTART IDENTITY CASCADE")
+        for name in LOOKUP_TABLES:
+            await driver.copy_to_table(name, source=io.BytesIO(tables[name]), columns=_columns(name), format="binary")
+        for name in TEMPLATE_TABLES:
+            await driver.execute(f"CREATE TEMP TABLE real_{name} (LIKE {name}) ON COMMIT DROP")
+            await driver.copy_to_table(
+                f"real_{name}", source=io.BytesIO(tables[name]), columns=_columns(name), format="binary"
+            )
+
+        await connection.execute(text("SELECT setseed(:seed)"), {"seed": seed})
+        templates = await driver.fetchval("SELECT count(*) FROM real_perceptual_model")
+        real_locations = await driver.fetchval("SELECT count(DISTINCT location_id) FROM real_perceptual_model")
+        parameters = {
+            "models": models,
+            "templates": templates,
+            "locations": max(1, round(models * real_locations / templates)),
+            "jitter": jitter,
+        }
+        for statement in GENERATE_SQL:
+            statement = statement.format(
+                model_columns=", ".join(MODEL_COLUMNS),
+                template_columns=", ".join(f"t.{name}" for name in MODEL_COLUMNS),
+            )
+            await connection.execute(text(statement), parameters)
+
+        counts = {}
+        for name in CATALOGUE_TABLES:
+            counts[name] = await driver.fetchval(f"SELECT count(*) FROM {name}")
+            await driver.execute(
+                f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), max(id)) FROM {name} HAVING max(id) IS NOT NULL"
+            )
+    seconds = time.perf_counter() - start
+
+    async with engine.connect() as connection:
+        await connection.execution_options(isolation_level="AUTOCOMMIT")
+        await connection.execute(text(f"VACUUM ANALYZE {', '.join(CATALOGUE_TABLES)}"))
+    # publishes the new catalogue, refreshing the read model beforehand
+    await dataset_version.refresh()
+    return {"seconds": seconds, "rows": counts}
+
+
+async def run(source: str, models: int, seed: float, jitter: float) -> dict:
+    target = get_settings().pg_dbname
+    if target == source:
+        raise SystemExit(f"the synthetic catalogue would replace the {source} database, set PG_DBNAME to another one")
+    await create_database(target)
+    await create_db_and_tables()
+    try:
+        return await generate(source, models, seed, jitter)
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default="hydroprocess", help="database holding the real catalogue")
+    parser.add_argument("--models", type=int, default=100_000, help="number of synthetic perceptual models")
+    parser.add_argument("--seed", type=float, default=0.42, help="seed of the random sequence, in [-1, 1]")
+    parser.add_argument("--jitter", type=float, default=0.5, help="spread of the locations, in degrees")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.source, args.models, args.seed, args.jitter))
+    for name, count in result["rows"].items():
+        print(f"{name:>24}: {count:>10} rows")
+    print(f"generated in {result['seconds']:.1f} s into {get_settings().pg_dbname}")
+
+
+if __name__ == "__main__":
+    main()
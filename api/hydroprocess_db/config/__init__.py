@@ -18,6 +18,40 @@ class Settings(BaseSettings):
     vite_app_api_url: str
     allow_origins: str
 
+    # connection pool of the database engine, per api worker
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    # seconds after which a connection is replaced, -1 keeps connections forever
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    # prepared statements cached per connection, set to 0 behind pgbouncer in transaction mode
+    db_statement_cache_size: int = 100
+
+    # response bodies of the read-only catalogue endpoints are cached per dataset version
+    response_cache_max_bytes: int = 256 * 1024 * 1024
+    dataset_version_poll_seconds: float = 5.0
+    gzip_level: int = 9
+    brotli_quality: int = 9
+
+    # log the SQL statements of requests slower than this many seconds, disabled when unset
+    slow_request_log_seconds: float | None = None
+
+    # answer the statistics endpoints from an in-memory bitmap index of the facets rather than from the db
+    facet_index_enabled: bool = True
+
+    # vector tiles up to this zoom level carry clusters rather than individual models
+    mvt_cluster_max_zoom: int = 6
+
+    # rows fetched, encoded and sent at a time by the streamed listings and the bulk export
+    stream_batch_size: int = 1000
+
+    # figure images matched to the citations, and the variants generated from them
+    figure_images_dir: str = "/figures/figure_model_images"
+    figure_matching_file: str = "/figures/citation_and_images_matching.json"
+    figure_cache_dir: str = "/data/figure_cache"
+    figure_widths: list[int] = [200, 400, 800, 1600]
+
 
 @lru_cache()
 def get_settings() -> Settings:
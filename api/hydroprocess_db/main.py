@@ -1,12 +1,18 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.cache import dataset_version
 from app.db import create_db_and_tables
+from app.metrics import MetricsMiddleware, metrics
+from app.read_model import refresh_read_model  # noqa: F401, creates and refreshes the read model
+from app.routers.figures.router import router as figures_router
 from app.routers.filters.router import router as filters_router
 from app.routers.perceptual_model.router import router as perceptual_model_router
 from app.routers.statistics.router import router as statistics_router
+from app.routers.system.router import router as system_router
 from app.schemas import UserCreate, UserRead, UserUpdate
 from app.users import auth_backend, fastapi_users
 from config import get_settings
@@ -16,7 +22,12 @@ from config import get_settings
 async def lifespan(app: FastAPI):
     # TODO: setup a migration system like Alembic
     await create_db_and_tables()
+    await dataset_version.refresh()
+    watcher = asyncio.create_task(dataset_version.watch(get_settings().dataset_version_poll_seconds))
     yield
+    watcher.cancel()
+    with suppress(asyncio.CancelledError):
+        await watcher
 
 
 app = FastAPI(servers=[{"url": get_settings().vite_app_api_url}], lifespan=lifespan)
@@ -30,6 +41,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_api_route("/metrics", metrics, include_in_schema=False)
 
 app.include_router(fastapi_users.get_auth_router(auth_backend), prefix="/auth/jwt", tags=["auth"])
 app.include_router(
@@ -62,8 +75,18 @@ app.include_router(
     prefix="/filters",
     tags=["filters"],
 )
+app.include_router(
+    figures_router,
+    prefix="/figures",
+    tags=["figures"],
+)
 app.include_router(
     statistics_router,
     prefix="/statistics",
     tags=["statistics"],
 )
+app.include_router(
+    system_router,
+    prefix="/system",
+    tags=["system"],
+)
@@ -0,0 +1,231 @@
+"""
+Fixtures of the api tests.
+
+The tests run the app against a database of their own, TEST_PG_DBNAME (hydroprocess_test by default) on the
+server of the api, which is created with the postgis extension when missing and whose catalogue is replaced
+by a small generated one by the `seed` fixture.
+"""
+
+import asyncio
+import json
+import os
+from contextlib import contextmanager
+
+os.environ["PG_DBNAME"] = os.environ.get("TEST_PG_DBNAME", "hydroprocess_test")
+# the tests publish the dataset versions themselves
+os.environ.setdefault("DATASET_VERSION_POLL_SECONDS", "3600")
+
+import asyncpg
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from sqlalchemy import event, insert, text
+
+from app.cache import VERSIONED_TABLES, dataset_version
+from app.db import engine
+from app.models import (
+    Citation,
+    FunctionType,
+    LinkProcessPerceptual,
+    Location,
+    ModelType,
+    PerceptualModel,
+    ProcessTaxonomy,
+    SpatialZoneType,
+    TemporalZoneType,
+)
+from config import get_settings
+from main import app
+
+# a root process with two levels of descendants, and a second root
+PROCESSES = (
+    ("Runoff", "Run", 1.0),
+    ("Surface runoff", "Run.Sur", 2.0),
+    ("Overland flow", "Run.Sur.Ovl", 3.0),
+    ("Subsurface flow", "Sub", 1.0),
+)
+SPATIAL_ZONES = ("Hillslope", "Riparian zone", "Channel")
+TEMPORAL_ZONES = ("Wet season", "Dry season")
+MODEL_TYPES = ("Figure", "Text")
+
+
+async def _create_database():
+    """
+    Create the test database with the postgis extension, unless it exists already.
+    """
+    settings = get_settings()
+    connect_args = {
+        "user": settings.pg_username,
+        "password": settings.pg_password,
+        "host": settings.pg_host,
+        "port": int(settings.pg_port),
+    }
+    connection = await asyncpg.connect(**connect_args, database="postgres")
+    try:
+        if not await connection.fetchval("SELECT 1 FROM pg_database WHERE datname = $1", settings.pg_dbname):
+            await connection.execute(f'CREATE DATABASE "{settings.pg_dbname}"')
+    finally:
+        await connection.close()
+    connection = await asyncpg.connect(**connect_args, database=settings.pg_dbname)
+    try:
+        await connection.execute("CREATE EXTENSION IF NOT EXISTS postgis")
+    finally:
+        await connection.close()
+
+
+@pytest.fixture(scope="session")
+def client():
+    asyncio.run(_create_database())
+    # the app runs in the event loop of the client, where the connections of the engine are bound to
+    with TestClient(app, raise_server_exceptions=False) as client:
+        yield client
+
+
+def _model_rows(models: int, without_point: int, orphans: int) -> dict:
+    rows = {
+        FunctionType: [{"id": 1, "name": "Flow"}],
+        ProcessTaxonomy: [
+            {
+                "id": index,
+                "process": process,
+                "identifier": identifier,
+                "process_level": level,
+                "function_id": 1,
+                "process_alt_name_id": None,
+            }
+            for index, (process, identifier, level) in enumerate(PROCESSES, start=1)
+        ],
+        SpatialZoneType: [{"id": index, "spatial_property": name} for index, name in enumerate(SPATIAL_ZONES, start=1)],
+        TemporalZoneType: [
+            {"id": index, "temporal_property": name} for index, name in enumerate(TEMPORAL_ZONES, start=1)
+        ],
+        ModelType: [{"id": index, "name": name} for index, name in enumerate(MODEL_TYPES, start=1)],
+        Citation: [],
+        Location: [],
+        PerceptualModel: [],
+        LinkProcessPerceptual: [],
+    }
+    for model_id in range(1, models + orphans + 1):
+        lon, lat = -120.0 + model_id * 0.5, 30.0 + model_id * 0.25
+        rows[Location].append(
+            {
+                "id": model_id,
+                "name": f"Catchment {model_id}",
+                "country": "Country",
+                "lat": lat,
+                "lon": lon,
+                "long_name": f"Catchment {model_id}, Country",
+                "pt": None if models - without_point < model_id <= models else f"SRID=4326;POINT({lon} {lat})",
+            }
+        )
+        if model_id > models:
+            # an orphan, whose citation and zones do not exist
+            rows[PerceptualModel].append(
+                {
+                    "id": model_id,
+                    "location_id": model_id,
+                    "citation_id": model_id,
+                    "spatialzone_id": model_id,
+                    "temporalzone_id": model_id,
+                    "model_type_id": 1,
+                    "textmodel_snipped": None,
+                }
+            )
+            continue
+        rows[Citation].append(
+            {"id": model_id, "citation": f"Author {model_id}, 2024. Perceptual model {model_id}.", "url": None}
+        )
+        rows[PerceptualModel].append(
+            {
+                "id": model_id,
+                "location_id": model_id,
+                "citation_id": model_id,
+                "spatialzone_id": model_id % len(SPATIAL_ZONES) + 1,
+                "temporalzone_id": model_id % len(TEMPORAL_ZONES) + 1,
+                "model_type_id": model_id % len(MODEL_TYPES) + 1,
+                "textmodel_snipped": f"Water moves through zone {model_id % len(SPATIAL_ZONES) + 1}.",
+            }
+        )
+        # one or two processes per model, the first one listed twice now and then as in the real catalogue
+        process_ids = [model_id % len(PROCESSES) + 1]
+        if model_id % 3 == 0:
+            process_ids += [(model_id + 1) % len(PROCESSES) + 1, process_ids[0]]
+        rows[LinkProcessPerceptual].extend(
+            {"entry_id": model_id, "process_id": process_id} for process_id in process_ids
+        )
+    return rows
+
+
+async def _seed(models: int, without_point: int, orphans: int):
+    async with engine.begin() as connection:
+        await connection.execute(text(f"TRUNCATE {', '.join(VERSIONED_TABLES)} RESTART IDENTITY CASCADE"))
+        if orphans:
+            # skips the foreign key checks (and the triggers, the truncation bumped the version already) for the
+            # transaction, so that the orphans can be inserted
+            await connection.execute(text("SET LOCAL session_replication_role = replica"))
+        for model, rows in _model_rows(models, without_point, orphans).items():
+            if rows:
+                await connection.execute(insert(model), rows)
+        # the ids were given explicitly
+        for model in (Citation, Location, PerceptualModel, LinkProcessPerceptual):
+            table = model.__tablename__
+            await connection.execute(
+                text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), max(id)) FROM {table}")
+            )
+    await dataset_version.refresh()
+
+
+@pytest.fixture
+def seed(client):
+    """
+    Replace the catalogue with `models` generated perceptual models, the last `without_point` of them located
+    without a point, followed by `orphans` models whose citation and zones do not exist, and publish its version.
+
+    Returns:
+    - The ids of the perceptual models, orphans included.
+    """
+
+    def seed(models: int, without_point: int = 0, orphans: int = 0) -> list[int]:
+        client.portal.call(_seed, models, without_point, orphans)
+        return list(range(1, models + orphans + 1))
+
+    return seed
+
+
+@contextmanager
+def _count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.fixture
+def count_queries():
+    """
+    Context manager recording the SQL statements executed in its block.
+    """
+    return _count_queries
+
+
+@pytest.fixture
+def figures(tmp_path, monkeypatch):
+    """
+    A figure for the citation of the perceptual model 2, in directories of the test.
+    """
+    images = tmp_path / "images"
+    images.mkdir()
+    Image.new("RGB", (1000, 500), "navy").save(images / "figure.png")
+    matching = tmp_path / "matching.json"
+    matching.write_text(json.dumps({"Author 2, 2024. Perceptual model 2.": "figure.png"}), encoding="utf-8")
+    settings = get_settings()
+    monkeypatch.setattr(settings, "figure_images_dir", str(images))
+    monkeypatch.setattr(settings, "figure_matching_file", str(matching))
+    monkeypatch.setattr(settings, "figure_cache_dir", str(tmp_path / "cache"))
+    monkeypatch.setattr("app.figures._citation_figures", None)
@@ -0,0 +1,86 @@
+import random
+
+import httpx
+import pytest
+
+from benchmarks.concurrency import percentile
+from benchmarks.routers import build_cases, uncovered_routes
+from benchmarks.startup_mix import STARTUP_REQUESTS, load_filters, run_rate, summarize
+from config import get_settings
+from main import app
+
+
+def test_benchmarks_cover_every_route(client, seed, figures):
+    seed(12)
+
+    cases = build_cases(client)
+
+    assert uncovered_routes(cases) == []
+    for case in cases:
+        response = client.request(case.method, case.path, params=case.params, json=case.body, follow_redirects=False)
+        assert response.status_code < 400, case.name
+
+
+def test_benchmarks_leave_the_figures_out_without_figures(client, seed, tmp_path, monkeypatch):
+    seed(12)
+    matching = tmp_path / "matching.json"
+    matching.write_text("{}", encoding="utf-8")
+    monkeypatch.setattr(get_settings(), "figure_matching_file", str(matching))
+    monkeypatch.setattr("app.figures._citation_figures", None)
+
+    cases = build_cases(client)
+
+    assert not [case for case in cases if case.route.startswith("/figures/")]
+    assert sorted(uncovered_routes(cases)) == [
+        "GET /figures/citation/{citation_id}",
+        "GET /figures/perceptual_model/{model_id}",
+        "GET /figures/variants/{name}",
+    ]
+
+
+def test_benchmarks_need_a_catalogue(client, seed):
+    seed(0)
+
+    with pytest.raises(SystemExit, match="no perceptual model"):
+        build_cases(client)
+
+
+def test_percentile():
+    timings = [0.5, 0.1, 0.4, 0.2, 0.3]
+
+    assert percentile(timings, 0.5) == 0.3
+    assert percentile(timings, 0.95) == 0.5
+    assert percentile([0.1], 0.99) == 0.1
+
+
+async def _startup_mix() -> tuple:
+    # the app answers in the event loop of the test client, started along with it
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver") as client:
+        filters = await load_filters(client)
+        drawn = [filters.draw(random.Random(seed)) for seed in range(20)]
+        results, users, elapsed = await run_rate(client, filters, 50, 0.2, 2, 0.01, random.Random(0))
+        return filters, drawn, summarize(results, elapsed), users
+
+
+def test_startup_mix_replays_without_errors(client, seed):
+    seed(12)
+
+    filters, drawn, summary, users = client.portal.call(_startup_mix)
+
+    # every process of the tree, the levels below the roots included
+    assert sorted(filters.process_ids) == [1, 2, 3, 4]
+    assert filters.spatialzone_ids == [1, 2, 3]
+    choices = {
+        "process_taxonomy_ids": filters.process_ids,
+        "spatialzone_ids": filters.spatialzone_ids,
+        "temporalzone_ids": filters.temporalzone_ids,
+    }
+    for request in drawn:
+        assert 1 <= len(request) <= 3
+        for name, values in request.items():
+            assert 1 <= len(values) <= 3 and set(values) <= set(choices[name])
+    assert users > 0
+    assert set(summary) == {f"{method} {path}" for method, path in STARTUP_REQUESTS}
+    for name, endpoint in summary.items():
+        assert endpoint["error_rate"] == 0, name
+    assert summary["POST /statistics/model_type_count"]["requests"] == users * 3
@@ -0,0 +1,86 @@
+import gzip
+
+import brotli
+from sqlalchemy import text
+
+from app.cache import PREPARE_LOCK, VERSION_TABLE, dataset_version
+from app.db import engine
+
+
+async def _add_citation():
+    async with engine.begin() as connection:
+        await connection.execute(text("INSERT INTO citations (citation) VALUES ('Added, 2024.')"))
+
+
+async def _versions() -> tuple[int, int]:
+    async with engine.connect() as connection:
+        return (await connection.execute(text(f"SELECT version, prepared FROM {VERSION_TABLE}"))).one()
+
+
+async def _refresh_while_locked() -> bool:
+    # as another worker preparing the derived data would
+    async with engine.begin() as connection:
+        await connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PREPARE_LOCK})
+        return await dataset_version.refresh()
+
+
+def test_version_only_changes_with_the_catalogue(client, seed):
+    seed(5)
+    version = dataset_version.value
+
+    assert not client.portal.call(dataset_version.refresh)
+    assert dataset_version.value == version
+
+    client.portal.call(_add_citation)
+    assert client.portal.call(dataset_version.refresh)
+    assert dataset_version.value != version
+    written, prepared = client.portal.call(_versions)
+    assert prepared == written
+
+
+def test_new_version_is_published_once_prepared(client, seed):
+    seed(5)
+    version = dataset_version.value
+    client.portal.call(_add_citation)
+
+    assert not client.portal.call(_refresh_while_locked)
+    assert dataset_version.value == version
+    written, prepared = client.portal.call(_versions)
+    assert prepared < written
+
+    assert client.portal.call(dataset_version.refresh)
+    assert dataset_version.value != version
+
+
+def test_cached_responses_follow_the_version(client, seed):
+    seed(5)
+    first = client.get("/perceptual_model/")
+    stats = client.get("/system/cache").json()
+    second = client.get("/perceptual_model/")
+    assert second.content == first.content
+    assert client.get("/system/cache").json()["hits"] == stats["hits"] + 1
+
+    seed(7)
+    assert len(client.get("/perceptual_model/").json()) == 7
+
+
+def test_etag_revalidation_and_precompressed_bodies(client, seed):
+    seed(5)
+    identity = client.get("/perceptual_model/", headers={"Accept-Encoding": "identity"})
+    etag = identity.headers["ETag"]
+
+    revalidated = client.get("/perceptual_model/", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+
+    for encoding, decompress in (("br", brotli.decompress), ("gzip", gzip.decompress)):
+        with client.stream("GET", "/perceptual_model/", headers={"Accept-Encoding": encoding}) as encoded:
+            # the body as sent, not decoded by the client
+            body = b"".join(encoded.iter_raw())
+        assert encoded.headers["Content-Encoding"] == encoding
+        assert encoded.headers["ETag"] == f'{etag[:-1]}-{encoding}"'
+        assert decompress(body) == identity.content
+        assert client.get("/perceptual_model/", headers={"If-None-Match": encoded.headers["ETag"]}).status_code == 304
+
+    seed(6)
+    assert client.get("/perceptual_model/", headers={"If-None-Match": etag}).status_code == 200
@@ -0,0 +1,57 @@
+import io
+import json
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+import shapely
+
+from config import get_settings
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    monkeypatch.setattr(get_settings(), "stream_batch_size", 5)
+
+
+@pytest.mark.parametrize("output_format", ("arrow", "parquet"))
+def test_export(client, seed, small_batches, output_format):
+    ids = seed(12)
+    features = client.get("/perceptual_model/geojson").json()["features"]
+
+    response = client.get("/perceptual_model/export", params={"format": output_format})
+
+    assert response.status_code == 200
+    if output_format == "arrow":
+        assert response.headers["Content-Type"] == "application/vnd.apache.arrow.stream"
+        batches = list(pa.ipc.open_stream(response.content))
+        assert [batch.num_rows for batch in batches] == [5, 5, 2]
+        table = pa.Table.from_batches(batches)
+    else:
+        assert response.headers["Content-Type"] == "application/vnd.apache.parquet"
+        table = pq.read_table(io.BytesIO(response.content))
+        assert json.loads(table.schema.metadata[b"geo"])["primary_column"] == "geometry"
+    assert table.column("id").to_pylist() == ids
+    points = shapely.from_wkb(table.column("geometry").to_pylist())
+    assert [[point.x, point.y] for point in points] == [feature["geometry"]["coordinates"] for feature in features]
+    assert table.column("citation").to_pylist() == [
+        feature["properties"]["citation"]["citation"] for feature in features
+    ]
+
+
+@pytest.mark.parametrize("output_format", ("arrow", "parquet"))
+def test_export_holds_every_model(client, seed, small_batches, output_format):
+    # the last 2 of the 8 models are located without a point, followed by 2 models without citation nor zones
+    ids = seed(8, without_point=2, orphans=2)
+
+    response = client.get("/perceptual_model/export", params={"format": output_format})
+
+    if output_format == "arrow":
+        table = pa.ipc.open_stream(response.content).read_all()
+    else:
+        table = pq.read_table(io.BytesIO(response.content))
+    assert table.column("id").to_pylist() == ids
+    geometries = table.column("geometry").to_pylist()
+    assert [geometry is None for geometry in geometries] == [False] * 6 + [True] * 2 + [False] * 2
+    assert table.column("citation").to_pylist()[-2:] == [None, None]
+    assert table.column("spatial_zone_type_spatial_property").to_pylist()[-2:] == [None, None]
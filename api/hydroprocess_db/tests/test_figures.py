@@ -0,0 +1,32 @@
+import io
+from urllib.parse import urljoin
+
+import pytest
+from PIL import Image
+
+
+@pytest.mark.parametrize("path", ("/figures/citation/2", "/figures/perceptual_model/2"))
+def test_figure_redirects_to_a_relative_variant(client, seed, figures, path):
+    seed(3)
+
+    response = client.get(path, params={"width": 300, "format": "jpeg"}, follow_redirects=False)
+
+    assert response.status_code == 307
+    location = response.headers["Location"]
+    # relative, so that it holds whatever the host and prefix the api is served under
+    assert location.startswith("../variants/")
+    assert location.endswith("-400.jpg")
+    variant = client.get(urljoin(str(response.url), location))
+    assert variant.status_code == 200
+    assert variant.headers["Content-Type"] == "image/jpeg"
+    assert "immutable" in variant.headers["Cache-Control"]
+    with Image.open(io.BytesIO(variant.content)) as image:
+        assert image.size == (400, 200)
+
+
+def test_missing_figure(client, seed, figures):
+    seed(3)
+
+    assert client.get("/figures/citation/1", follow_redirects=False).status_code == 404
+    assert client.get("/figures/perceptual_model/4", follow_redirects=False).status_code == 404
+    assert client.get("/figures/variants/unknown.jpg").status_code == 422
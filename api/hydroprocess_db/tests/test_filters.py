@@ -0,0 +1,38 @@
+from app.models import ProcessTaxonomy
+from app.taxonomy import build_taxonomy_tree
+
+
+def _identifiers(nodes: list[dict]) -> list:
+    return [(node["id"], node["identifier"], _identifiers(node["children"])) for node in nodes]
+
+
+def test_process_taxonomy_tree(client, seed):
+    seed(3)
+
+    response = client.get("/filters/process_taxonomy_tree")
+
+    assert response.status_code == 200
+    tree = response.json()
+    assert _identifiers(tree) == [
+        (1, "Run", [(2, "Run.Sur", [(3, "Run.Sur.Ovl", [])])]),
+        (4, "Sub", []),
+    ]
+    assert tree[0]["title"] == "Runoff"
+    assert tree[0]["children"][0]["process_level"] == 2.0
+
+
+def test_taxonomy_tree_fills_the_missing_levels():
+    entries = [
+        ProcessTaxonomy(id=1, identifier="Human.Chan.Flow.Pumped", process="Pumping"),
+        ProcessTaxonomy(id=2, identifier="Human"),
+        ProcessTaxonomy(id=3, identifier="Human", process="Human activities"),
+    ]
+
+    tree = build_taxonomy_tree(entries)
+
+    assert _identifiers(tree) == [
+        (2, "Human", [(None, "Human.Chan", [(None, "Human.Chan.Flow", [(1, "Human.Chan.Flow.Pumped", [])])])]),
+        (3, "Human", []),
+    ]
+    # the levels without entry are titled after their identifier
+    assert tree[0]["children"][0]["title"] == "Chan"
@@ -0,0 +1,77 @@
+import io
+import json
+
+import pytest
+
+from app.cache import dataset_version
+from app.ingest import IngestError, ingest
+
+
+def _ingest(client, files: dict[str, str], replace: bool = False) -> dict:
+    sources = {filename: io.BytesIO(content.encode("utf-8")) for filename, content in files.items()}
+    return client.portal.call(lambda: ingest(sources, replace=replace))
+
+
+def test_ingest_upserts_and_publishes(client, seed):
+    seed(3)
+    version = dataset_version.value
+    locations = [
+        {"id": 4, "name": "Added", "country": "Country", "lat": 45.5, "lon": -100.0, "long_name": "Added, Country"}
+    ]
+
+    report = _ingest(
+        client,
+        {
+            "citations.csv": "id,citation\n1,Updated citation\n4,Added citation\n",
+            "locations.ndjson": "\n".join(json.dumps(location) for location in locations),
+            "perceptual_model.csv": "id,location_id,citation_id,spatialzone_id,temporalzone_id,model_type_id\n"
+            "4,4,4,1,1,1\n",
+        },
+    )
+
+    assert report["tables"]["citations"] == {**report["tables"]["citations"], "rows": 2, "upserted": 2, "deleted": 0}
+    assert dataset_version.value != version
+    assert client.get("/perceptual_model/1/citation").json()["citation"] == "Updated citation"
+    added = client.get("/perceptual_model/geojson/4").json()
+    # the point is built from the latitude and longitude
+    assert added["geometry"]["coordinates"] == [-100.0, 45.5]
+    assert len(client.get("/perceptual_model/").json()) == 4
+
+
+def test_ingest_replace_deletes_missing_rows(client, seed):
+    seed(3)
+
+    report = _ingest(
+        client,
+        {
+            "perceptual_model.csv": "id,location_id,citation_id,spatialzone_id,temporalzone_id\n2,2,2,1,1\n",
+            "link_process_perceptual.csv": "id,entry_id,process_id\n1,2,4\n",
+        },
+        replace=True,
+    )
+
+    assert report["tables"]["perceptual_model"]["deleted"] == 2
+    assert [pmodel["id"] for pmodel in client.get("/perceptual_model/").json()] == [2]
+    assert [process["id"] for process in client.get("/perceptual_model/2/process_taxonomies").json()] == [4]
+
+
+@pytest.mark.parametrize(
+    "files",
+    (
+        {"unknown.csv": "id\n1\n"},
+        {"citations.csv": "id,unknown\n1,x\n"},
+        # still referenced by the perceptual models
+        {"citations.csv": "id,citation\n1,Kept\n"},
+    ),
+)
+def test_failed_ingest_changes_nothing(client, seed, files):
+    seed(3)
+    version = dataset_version.value
+    listed = client.get("/perceptual_model/recursive").json()
+
+    with pytest.raises(IngestError):
+        _ingest(client, files, replace=True)
+
+    assert client.portal.call(dataset_version.refresh) is False
+    assert dataset_version.value == version
+    assert client.get("/perceptual_model/recursive").json() == listed
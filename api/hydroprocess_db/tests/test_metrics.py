@@ -0,0 +1,52 @@
+import copy
+
+import pytest
+from prometheus_client.parser import text_string_to_metric_families
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from app.db import engine
+
+
+def _samples(client) -> dict:
+    return {
+        (sample.name, sample.labels.get("route")): sample.value
+        for family in text_string_to_metric_families(client.get("/metrics").text)
+        for sample in family.samples
+        if sample.labels.get("method") == "GET"
+    }
+
+
+async def _fail_then_query() -> tuple[dict, dict]:
+    async with engine.connect() as connection:
+        before = copy.deepcopy(connection.info)
+        for _ in range(3):
+            with pytest.raises(DBAPIError):
+                await connection.execute(text("SELECT 1 / 0"))
+            await connection.rollback()
+        await connection.execute(text("SELECT 1"))
+        return before, copy.deepcopy(connection.info)
+
+
+def test_request_metrics(client, seed):
+    seed(3)
+    route = "/perceptual_model/{model_id}"
+    before = _samples(client)
+
+    client.get("/perceptual_model/2")
+    client.get("/perceptual_model/3")
+    after = _samples(client)
+
+    def delta(name: str) -> float:
+        return after[(name, route)] - before.get((name, route), 0)
+
+    assert delta("http_request_sql_queries_count") == 2
+    assert delta("http_request_sql_queries_sum") == 2
+    assert 0 < delta("http_request_sql_duration_seconds_sum") < delta("http_request_duration_seconds_sum")
+    assert delta("http_response_size_bytes_sum") == len(client.get("/perceptual_model/2").content) * 2
+
+
+def test_failed_statements_leave_no_timing_behind(client):
+    before, after = client.portal.call(_fail_then_query)
+
+    assert after == before
@@ -0,0 +1,365 @@
+import json
+
+import pytest
+from pydantic import TypeAdapter
+from sqlalchemy import text
+
+from app.db import async_session_maker, create_db_and_tables, engine, select_perceptual_models, view_version
+from app.models import GeoJsonFeature, GeoJsonFeatureCollection, WKBToGeoJSON
+from app.read_model import READ_MODEL, READ_MODEL_SQL
+from app.search import SEARCH_VIEW, SEARCH_VIEW_SQL
+from config import get_settings
+
+BULK_LISTINGS = ("/perceptual_model/", "/perceptual_model/recursive", "/perceptual_model/geojson")
+
+
+@pytest.mark.parametrize("path", BULK_LISTINGS)
+def test_bulk_listing_query_count_does_not_grow_with_models(client, seed, count_queries, path):
+    queries = []
+    for models in (10, 20):
+        seed(models)
+        with count_queries() as statements:
+            response = client.get(path)
+        assert response.status_code == 200
+        assert len(response.json()["features"] if path.endswith("geojson") else response.json()) == models
+        queries.append(len(statements))
+
+    assert queries[0] == queries[1]
+
+
+@pytest.mark.parametrize(
+    "without_point, orphans, features", ((0, 0, 12), (3, 2, 11)), ids=("located", "without_point_and_orphans")
+)
+def test_geojson_engines_render_the_same_document(client, seed, without_point, orphans, features):
+    seed(12, without_point=without_point, orphans=orphans)
+
+    python = client.get("/perceptual_model/geojson", params={"engine": "python"})
+    postgis = client.get("/perceptual_model/geojson", params={"engine": "postgis"})
+
+    assert python.status_code == postgis.status_code == 200
+    # the models without a point have no feature, the orphans have one without their missing relations
+    assert len(python.json()["features"]) == features
+    assert postgis.content == python.content
+
+
+def _search(client, **request) -> list[int]:
+    ids = []
+    cursor = None
+    while True:
+        page = client.post("/perceptual_model/search", json={**request, "cursor": cursor}).json()
+        ids += [feature["properties"]["id"] for feature in page["features"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+def test_search_pages_through_every_match(client, seed):
+    ids = seed(11)
+
+    assert _search(client, limit=4) == ids
+    assert _search(client, limit=11) == ids
+    assert _search(client, limit=3, spatialzone_ids=[2]) == [model_id for model_id in ids if model_id % 3 == 1]
+    # the models are laid out along a line, 0.5 degree of longitude and 0.25 of latitude apart
+    assert _search(client, bbox=[-118.6, 30.0, -116.9, 40.0]) == [3, 4, 5, 6]
+    assert _search(client, text="catchment 1", text_fields=["long_name"]) == [1, 10, 11]
+    assert _search(client, text="100%") == []
+
+
+def test_search_includes_the_process_descendants(client, seed):
+    seed(12)
+    features = client.get("/perceptual_model/geojson").json()["features"]
+
+    def linked_to(process_ids: set) -> list[int]:
+        return [
+            feature["properties"]["id"]
+            for feature in features
+            if process_ids & {process["id"] for process in feature["properties"]["process_taxonomies"]}
+        ]
+
+    # Run.Sur and Run.Sur.Ovl are below Run
+    assert _search(client, process_taxonomy_ids=[1]) == linked_to({1})
+    assert _search(client, process_taxonomy_ids=[1], include_descendants=True) == linked_to({1, 2, 3})
+    assert _search(client, process_taxonomy_ids=[4], include_descendants=True) == linked_to({4})
+
+
+def test_text_search_ranks_matches(client, seed):
+    seed(12)
+
+    hits = client.get("/perceptual_model/text_search", params={"q": "catchment 7"}).json()
+    assert [feature["properties"]["id"] for feature in hits["features"]] == [7]
+    assert hits["features"][0]["rank"] > 0
+
+    overland = client.get("/perceptual_model/text_search", params={"q": '"overland flow"'}).json()
+    assert sorted(feature["properties"]["id"] for feature in overland["features"]) == [2, 6, 9, 10]
+    ranks = [feature["rank"] for feature in overland["features"]]
+    assert ranks == sorted(ranks, reverse=True)
+
+    first = client.get("/perceptual_model/text_search", params={"q": '"overland flow"', "limit": 3}).json()
+    assert first["next_offset"] == 3
+    rest = client.get("/perceptual_model/text_search", params={"q": '"overland flow"', "offset": 3}).json()
+    assert rest["next_offset"] is None
+    assert first["features"] + rest["features"] == overland["features"]
+
+    assert (
+        client.get("/perceptual_model/text_search", params={"q": '"overland flow" -catchment'}).json()["features"] == []
+    )
+
+
+def _feature_ids(response) -> list[int]:
+    assert response.status_code == 200
+    return [feature["properties"]["id"] for feature in response.json()["features"]]
+
+
+def test_spatial_queries(client, seed):
+    seed(10)
+    # model 5 is located at (-117.5, 31.25), its neighbours lie about 55 km away
+    point = {"lon": -117.5, "lat": 31.25}
+
+    bbox = {"min_lon": -118.6, "min_lat": 30.0, "max_lon": -116.9, "max_lat": 40.0}
+    assert sorted(_feature_ids(client.get("/perceptual_model/within_bbox", params=bbox))) == [3, 4, 5, 6]
+
+    assert _feature_ids(client.get("/perceptual_model/within_radius", params={**point, "radius_km": 10})) == [5]
+    within = _feature_ids(client.get("/perceptual_model/within_radius", params={**point, "radius_km": 60}))
+    assert within[0] == 5
+    assert sorted(within) == [4, 5, 6]
+
+    nearest = _feature_ids(client.get("/perceptual_model/nearest", params={**point, "k": 3}))
+    assert nearest == within
+
+
+@pytest.mark.parametrize(
+    "bbox", ((-116.9, 30.0, -118.6, 40.0), (-118.6, 40.0, -116.9, 30.0)), ids=("longitudes", "latitudes")
+)
+def test_inverted_bbox_is_rejected(client, seed, bbox):
+    seed(3)
+    params = dict(zip(("min_lon", "min_lat", "max_lon", "max_lat"), bbox))
+
+    assert client.get("/perceptual_model/within_bbox", params=params).status_code == 422
+    assert client.post("/perceptual_model/search", json={"bbox": bbox}).status_code == 422
+
+
+def test_vector_tiles(client, seed):
+    seed(10)
+
+    # the models lie in the western US, in tile 2/0/1
+    tile = client.get("/perceptual_model/tiles/2/0/1.mvt")
+    assert tile.status_code == 200
+    assert tile.headers["Content-Type"] == "application/vnd.mapbox-vector-tile"
+    assert tile.content
+    assert (
+        client.get("/perceptual_model/tiles/2/0/1.mvt", headers={"If-None-Match": tile.headers["ETag"]}).status_code
+        == 304
+    )
+
+    empty = client.get("/perceptual_model/tiles/2/3/1.mvt")
+    assert empty.status_code == 200
+    assert empty.content == b""
+
+    assert client.get("/perceptual_model/tiles/2/4/1.mvt").status_code == 404
+
+
+@pytest.mark.parametrize(
+    "relation", ("location", "citation", "spatial_zone_type", "temporal_zone_type", "model_type", "process_taxonomies")
+)
+def test_model_relations(client, seed, relation):
+    seed(6)
+    nested = client.get("/perceptual_model/recursive/6").json()
+
+    response = client.get(f"/perceptual_model/6/{relation}")
+
+    assert response.status_code == 200
+    assert response.json() == nested[relation]
+    assert client.get(f"/perceptual_model/7/{relation}").status_code == 404
+
+
+def test_model_by_id(client, seed):
+    seed(6)
+    listed = client.get("/perceptual_model/").json()
+
+    assert client.get("/perceptual_model/4").json() == listed[3]
+    assert client.get("/perceptual_model/geojson/4").json()["properties"]["id"] == 4
+    for path in ("/perceptual_model/7", "/perceptual_model/recursive/7", "/perceptual_model/geojson/7"):
+        assert client.get(path).status_code == 404
+
+
+def test_batch_lookup(client, seed):
+    seed(6)
+    listed = {pmodel["id"]: pmodel for pmodel in client.get("/perceptual_model/").json()}
+
+    response = client.post(
+        "/perceptual_model/batch", json={"ids": [5, 9, 2, 5, 7], "relations": ["citation", "process_taxonomies"]}
+    )
+
+    assert response.status_code == 200
+    batch = response.json()
+    assert list(batch["models"]) == ["5", "2"]
+    assert batch["missing"] == [9, 7]
+    for model_id in (5, 2):
+        entry = batch["models"][str(model_id)]
+        nested = client.get(f"/perceptual_model/recursive/{model_id}").json()
+        assert entry["citation"] == nested["citation"]
+        assert entry["process_taxonomies"] == nested["process_taxonomies"]
+        # the relations not requested are left out
+        assert "location" not in entry
+        assert {key: entry[key] for key in listed[model_id]} == listed[model_id]
+
+
+@pytest.mark.parametrize("relations", ([], ["location", "model_type", "process_taxonomies"]))
+def test_batch_lookup_query_count_does_not_grow_with_ids(client, seed, count_queries, relations):
+    seed(20)
+    queries = []
+    for ids in (range(1, 5), range(1, 21)):
+        with count_queries() as statements:
+            response = client.post("/perceptual_model/batch", json={"ids": list(ids), "relations": relations})
+        assert len(response.json()["models"]) == len(ids)
+        queries.append(len(statements))
+
+    assert queries[0] == queries[1] == 1 + len(relations)
+
+
+async def _response_model_collection() -> dict:
+    """
+    The FeatureCollection of every perceptual model as the `GeoJsonFeatureCollection` response model dumps it.
+    """
+    async with async_session_maker() as session:
+        perceptual_models = (await session.exec(select_perceptual_models())).all()
+    collection = GeoJsonFeatureCollection(
+        type="FeatureCollection",
+        features=[
+            GeoJsonFeature(
+                type="Feature",
+                geometry=WKBToGeoJSON.from_WKBElement(pmodel.location.pt),
+                properties=pmodel.get_feature_properties(),
+            )
+            for pmodel in perceptual_models
+        ],
+    )
+    return TypeAdapter(GeoJsonFeatureCollection).dump_python(collection, mode="json")
+
+
+def test_geojson_matches_the_response_model_serialization(client, seed):
+    seed(12)
+
+    assert client.get("/perceptual_model/geojson").json() == client.portal.call(_response_model_collection)
+
+
+def _expand(compact: dict) -> tuple[list[dict], list[list[float]]]:
+    lookups = {table: {row["id"]: row for row in rows} for table, rows in compact["lookups"].items()}
+    columns = compact["models"]
+    pmodels = []
+    for index in range(len(columns["id"])):
+        pmodel = {name: values[index] for name, values in columns.items() if name != "process_taxonomy_ids"}
+        pmodel["process_taxonomies"] = [
+            lookups["process_taxonomy"][process_id] for process_id in columns["process_taxonomy_ids"][index]
+        ]
+        pmodel["location"] = lookups["locations"][pmodel["location_id"]]
+        pmodel["citation"] = lookups["citations"][pmodel["citation_id"]]
+        pmodel["spatial_zone_type"] = lookups["spatial_zone_type"][pmodel["spatialzone_id"]]
+        pmodel["temporal_zone_type"] = lookups["temporal_zone_type"][pmodel["temporalzone_id"]]
+        pmodel["model_type"] = lookups["model_type"][pmodel["model_type_id"]]
+        pmodels.append(pmodel)
+    coordinates = compact["coordinates"]
+    return pmodels, [coordinates[index : index + 2] for index in range(0, len(coordinates), 2)]
+
+
+def test_compact_format_holds_the_nested_models(client, seed):
+    seed(12)
+    nested = client.get("/perceptual_model/recursive").json()
+    features = client.get("/perceptual_model/geojson").json()["features"]
+
+    compact = client.get("/perceptual_model/recursive", params={"format": "compact"})
+    assert client.get("/perceptual_model/geojson", params={"format": "compact"}).content == compact.content
+    pmodels, coordinates = _expand(compact.json())
+
+    assert coordinates == [feature["geometry"]["coordinates"] for feature in features]
+    # the nested models carry their relations rather than their ids
+    references = ("id", "location_id", "citation_id", "spatialzone_id", "temporalzone_id", "model_type_id")
+    for pmodel, expected in zip(pmodels, nested, strict=True):
+        expected["location"].pop("pt")
+        assert {name: value for name, value in pmodel.items() if name not in references} == expected
+
+
+@pytest.mark.parametrize("path", BULK_LISTINGS)
+def test_ndjson_streams_the_listing(client, seed, monkeypatch, path):
+    seed(12)
+    monkeypatch.setattr(get_settings(), "stream_batch_size", 5)
+    listed = client.get(path).json()
+
+    response = client.get(path, params={"format": "ndjson"})
+
+    assert response.headers["Content-Type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in response.text.splitlines()] == (
+        listed["features"] if path.endswith("geojson") else listed
+    )
+
+
+def test_streamed_feature_collection_is_the_cached_document(client, seed, monkeypatch):
+    seed(12)
+    monkeypatch.setattr(get_settings(), "stream_batch_size", 5)
+
+    streamed = client.get("/perceptual_model/geojson", params={"stream": True})
+
+    assert streamed.content == client.get("/perceptual_model/geojson").content
+
+
+def test_models_without_point_are_left_out_of_the_collections(client, seed, monkeypatch):
+    seed(8, without_point=2)
+    monkeypatch.setattr(get_settings(), "stream_batch_size", 5)
+    located = [1, 2, 3, 4, 5, 6]
+
+    python = client.get("/perceptual_model/geojson", params={"engine": "python"})
+    postgis = client.get("/perceptual_model/geojson", params={"engine": "postgis"})
+
+    assert _feature_ids(python) == _feature_ids(postgis) == located
+    assert python.content == postgis.content
+    assert b"null,null" not in postgis.content
+    assert client.get("/perceptual_model/geojson", params={"stream": True}).content == python.content
+    ndjson = client.get("/perceptual_model/geojson", params={"format": "ndjson"})
+    assert [json.loads(line) for line in ndjson.text.splitlines()] == python.json()["features"]
+    assert client.get("/perceptual_model/geojson/7").status_code == 404
+    assert _search(client) == located
+
+    # every model is listed in the compact format, along with null coordinates when it has no point
+    pmodels, coordinates = _expand(client.get("/perceptual_model/geojson", params={"format": "compact"}).json())
+    assert [pmodel["id"] for pmodel in pmodels] == [*located, 7, 8]
+    assert coordinates[6:] == [[None, None], [None, None]]
+
+    point = {"lon": -117.0, "lat": 32.0}
+    assert sorted(_feature_ids(client.get("/perceptual_model/nearest", params={**point, "k": 10}))) == located
+    within = client.get("/perceptual_model/within_radius", params={**point, "radius_km": 1000})
+    assert sorted(_feature_ids(within)) == located
+    assert _feature_ids(client.get("/perceptual_model/text_search", params={"q": '"catchment 7"'})) == []
+    assert 7 not in _feature_ids(client.get("/perceptual_model/1/similar", params={"k": 20, "weighted": False}))
+
+
+def test_models_without_relations_are_kept(client, seed):
+    seed(6, orphans=2)
+
+    python = client.get("/perceptual_model/geojson", params={"engine": "python"})
+    postgis = client.get("/perceptual_model/geojson", params={"engine": "postgis"})
+
+    assert postgis.content == python.content
+    assert _feature_ids(postgis) == [1, 2, 3, 4, 5, 6, 7, 8]
+    orphan = postgis.json()["features"][-1]["properties"]
+    assert orphan["citation_id"] == 8
+    assert not {"citation", "spatial_zone_type", "temporal_zone_type"} & set(orphan)
+    assert _search(client, spatialzone_ids=[7, 8]) == [7, 8]
+
+
+async def _recreate_view(view: str, definition: str) -> str:
+    async with engine.begin() as connection:
+        await connection.execute(text(f"COMMENT ON MATERIALIZED VIEW {view} IS '{definition}'"))
+    await create_db_and_tables()
+    async with engine.connect() as connection:
+        return (await connection.execute(text(f"SELECT obj_description('{view}'::regclass, 'pg_class')"))).scalar_one()
+
+
+@pytest.mark.parametrize(
+    "view, definition", ((READ_MODEL, READ_MODEL_SQL), (SEARCH_VIEW, SEARCH_VIEW_SQL)), ids=("read", "search")
+)
+def test_view_is_recreated_when_its_definition_changes(client, seed, view, definition):
+    seed(3)
+
+    assert client.portal.call(_recreate_view, view, "a previous definition") == view_version(definition)
+    assert _search(client) == [1, 2, 3]
+    assert _feature_ids(client.get("/perceptual_model/text_search", params={"q": '"catchment 2"'})) == [2]
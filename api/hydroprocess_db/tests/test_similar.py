@@ -0,0 +1,59 @@
+import pytest
+
+import app.facet_index
+
+
+def _features(properties: dict) -> set:
+    return {
+        ("spatial_zone", properties["spatialzone_id"]),
+        ("temporal_zone", properties["temporalzone_id"]),
+        *(("process", process["id"]) for process in properties["process_taxonomies"]),
+    }
+
+
+def test_similar_models_are_ranked_by_similarity(client, seed):
+    seed(12)
+    models = {
+        feature["properties"]["id"]: _features(feature["properties"])
+        for feature in client.get("/perceptual_model/geojson").json()["features"]
+    }
+    # unweighted jaccard similarity of the zones and processes
+    expected = sorted(
+        (-len(models[3] & features) / len(models[3] | features), model_id)
+        for model_id, features in models.items()
+        if model_id != 3 and models[3] & features
+    )
+
+    response = client.get("/perceptual_model/3/similar", params={"k": 5, "weighted": False})
+
+    assert response.status_code == 200
+    similar = response.json()["features"]
+    assert [feature["properties"]["id"] for feature in similar] == [model_id for _, model_id in expected[:5]]
+    for feature, (similarity, _) in zip(similar, expected):
+        assert feature["similarity"] == pytest.approx(-similarity)
+        assert feature["score"] == feature["similarity"]
+        assert feature["distance_km"] > 0
+
+
+def test_similar_models_blend_in_the_distance(client, seed):
+    seed(12)
+
+    similar = client.get(
+        "/perceptual_model/3/similar", params={"k": 20, "distance_weight": 1, "distance_scale_km": 100}
+    ).json()["features"]
+
+    # every other model is ranked by proximity alone
+    ids = [feature["properties"]["id"] for feature in similar]
+    assert sorted(ids) == [1, 2, *range(4, 13)]
+    assert ids == [
+        feature["properties"]["id"] for feature in sorted(similar, key=lambda feature: feature["distance_km"])
+    ]
+
+
+def test_similar_models_errors(client, seed, monkeypatch):
+    seed(3)
+
+    assert client.get("/perceptual_model/4/similar").status_code == 404
+    assert client.get("/perceptual_model/3/similar", params={"k": 0}).status_code == 422
+    monkeypatch.setattr(app.facet_index, "_facet_index", None)
+    assert client.get("/perceptual_model/3/similar").status_code == 503
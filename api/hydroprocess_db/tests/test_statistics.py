@@ -0,0 +1,84 @@
+import pytest
+
+import app.facet_index
+
+FILTERS = (
+    {},
+    {"spatialzone_ids": [1]},
+    {"spatialzone_ids": [2, 3], "temporalzone_ids": [1]},
+    {"process_taxonomy_ids": [2, 4]},
+    {"spatialzone_ids": [1, 2], "process_taxonomy_ids": [1]},
+    {"process_taxonomy_ids": [1], "include_descendants": True},
+    {"temporalzone_ids": [2], "process_taxonomy_ids": [2, 4], "include_descendants": True},
+)
+# the descendants of each seeded process, Run > Run.Sur > Run.Sur.Ovl and Sub
+DESCENDANTS = {1: {1, 2, 3}, 2: {2, 3}, 3: {3}, 4: {4}}
+
+
+@pytest.fixture
+def without_facet_index(monkeypatch):
+    """
+    Answer the statistics from the db, as when the facet index is disabled.
+    """
+    monkeypatch.setattr(app.facet_index, "_facet_index", None)
+
+
+def _matches(pmodel: dict, filters: dict) -> bool:
+    process_ids = {process["id"] for process in pmodel["process_taxonomies"] or []}
+    requested = set(filters.get("process_taxonomy_ids") or [])
+    if filters.get("include_descendants"):
+        requested = set().union(*(DESCENDANTS[process_id] for process_id in requested))
+    return (
+        (not filters.get("spatialzone_ids") or pmodel["spatial_zone_type"]["id"] in filters["spatialzone_ids"])
+        and (not filters.get("temporalzone_ids") or pmodel["temporal_zone_type"]["id"] in filters["temporalzone_ids"])
+        and (not filters.get("process_taxonomy_ids") or bool(process_ids & requested))
+    )
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_model_type_count(client, seed, without_facet_index, filters):
+    seed(24)
+    pmodels = client.get("/perceptual_model/recursive").json()
+    expected = {"Figure": 0, "Text": 0}
+    for pmodel in pmodels:
+        if _matches(pmodel, filters):
+            expected[pmodel["model_type"]["name"]] += 1
+
+    response = client.post("/statistics/model_type_count", json=filters)
+
+    assert response.status_code == 200
+    assert response.json() == expected
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_facet_counts(client, seed, without_facet_index, filters):
+    seed(24)
+    matching = [pmodel for pmodel in client.get("/perceptual_model/recursive").json() if _matches(pmodel, filters)]
+
+    counts = client.post("/statistics/facet_counts", json=filters).json()
+
+    assert counts["total"] == len(matching)
+    spatial_zones = {facet["id"]: facet["count"] for facet in counts["spatial_zones"]}
+    assert sum(spatial_zones.values()) == len(matching)
+    for zone_id, count in spatial_zones.items():
+        assert count == sum(pmodel["spatial_zone_type"]["id"] == zone_id for pmodel in matching)
+    processes = {facet["id"]: facet["count"] for facet in counts["process_taxonomies"]}
+    for process_id, count in processes.items():
+        assert count == sum(
+            any(process["id"] == process_id for process in pmodel["process_taxonomies"]) for pmodel in matching
+        )
+
+
+def test_facet_index_counts_as_the_db(client, seed, monkeypatch):
+    # models without a point, and orphans whose citation and zones do not exist, are counted all the same
+    seed(10, without_point=2, orphans=2)
+    assert app.facet_index.current_facet_index() is not None
+    requests = [("/statistics/model_type_count", filters) for filters in FILTERS]
+    requests += [("/statistics/facet_counts", filters) for filters in FILTERS]
+
+    indexed = [client.post(path, json=filters).json() for path, filters in requests]
+    indexed_count = client.get("/statistics/model_count").json()
+    monkeypatch.setattr(app.facet_index, "_facet_index", None)
+
+    assert [client.post(path, json=filters).json() for path, filters in requests] == indexed
+    assert client.get("/statistics/model_count").json() == indexed_count == 12
@@ -0,0 +1,15 @@
+from config import get_settings
+
+
+def test_pool_stats(client, seed):
+    seed(3)
+    before = client.get("/system/pool").json()
+
+    client.get("/perceptual_model/3")
+    after = client.get("/system/pool").json()
+
+    assert after["size"] == get_settings().db_pool_size
+    assert after["checked_out"] == 0
+    assert after["checkouts"] == before["checkouts"] + 1
+    assert after["wait_seconds_buckets"]["+Inf"] == after["checkouts"]
+    assert after["timeouts"] == 0
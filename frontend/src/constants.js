@@ -9,6 +9,8 @@ export const ENDPOINTS = {
   perceptual_models: `${APP_API_URL}/perceptual_model`,
   model_type_count: `${APP_API_URL}/statistics/model_type_count`,
   process_taxonomies: `${APP_API_URL}/filters/process_taxonomies`,
+  process_taxonomy_tree: `${APP_API_URL}/filters/process_taxonomy_tree`,
+  citation_figure: `${APP_API_URL}/figures/citation`,
   spatial_zones: `${APP_API_URL}/filters/spatial_zones`,
   temporal_zones: `${APP_API_URL}/filters/temporal_zones`
 }
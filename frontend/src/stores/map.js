@@ -96,9 +96,12 @@ export const useMapStore = defineStore('map', () => {
         content += note + 'figure'
       } else {
         if (citationMatchingFileNames[feature.properties.citation.citation]) {
-          content += `<img src="${getImagePath(
-            citationMatchingFileNames[feature.properties.citation.citation]
-          )}" alt="Dynamic Image">`
+          content += `<img src="${getFigureUrl(props.citation.id, 400)}" srcset="${getFigureUrl(
+            props.citation.id,
+            400
+          )} 400w, ${getFigureUrl(props.citation.id, 800)} 800w" sizes="${
+            window.innerWidth < 600 ? 260 : 400
+          }px" alt="Dynamic Image">`
         } else {
           content += '<h5>No Figure</h5>'
         }
@@ -304,8 +307,9 @@ export const useMapStore = defineStore('map', () => {
     return [lat < 0 ? lat - 10 : lat + 10, lon < 0 ? lon - 10 : lon + 10]
   }
 
-  function getImagePath(filename) {
-    return new URL(`../assets/figure_model_images/${filename}`, import.meta.url).href
+  // resized variants served by the api, rather than the full size images
+  function getFigureUrl(citationId, width) {
+    return `${ENDPOINTS.citation_figure}/${citationId}?width=${width}`
   }
 
   return {
@@ -29,6 +29,12 @@ export const usePerceptualModelStore = defineStore('perceptual_model', () => {
     return process_taxonomies
   }
 
+  const fetchProcessTaxonomyTree = async () => {
+    const response = await fetch(ENDPOINTS.process_taxonomy_tree)
+    const process_taxonomy_tree = await response.json()
+    return process_taxonomy_tree
+  }
+
   const fetchSpatialZones = async () => {
     const response = await fetch(ENDPOINTS.spatial_zones)
     const spatial_zones = await response.json()
@@ -48,6 +54,7 @@ export const usePerceptualModelStore = defineStore('perceptual_model', () => {
     setSelectedPerceptualModel,
     fetchPerceptualModels,
     fetchProcessTaxonomies,
+    fetchProcessTaxonomyTree,
     fetchSpatialZones,
     fetchTemporalZones
   }